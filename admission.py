@@ -0,0 +1,161 @@
+"""
+Control de admisión del API de DoctoClique
+Cada clase de ruta (búsquedas puntuales, listados, escrituras, reportes, exportaciones, feed SSE)
+tiene su propio cupo de peticiones en curso y una cola acotada. Si la cola está llena, o la espera
+supera el timeout, la petición se rechaza enseguida con 503 y Retry-After, en vez de ocupar un hilo
+que necesita otra clase. Así una exportación grande no frena a las consultas interactivas
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+
+import metrics
+
+# Clase -> (en curso, en cola, segundos de espera máxima). Los cupos son por proceso: con gthread la
+# suma de listados, reportes y exportaciones (en curso + en cola) debe dejar hilos libres para el resto.
+# Una exportación ocupa su cupo mientras dura el stream: sin cola, la siguiente recibe 503 enseguida
+# y las agregaciones de reportes.html no esperan detrás de ella. Un cliente SSE ocupa un hilo mientras
+# está conectado: el cupo de stream limita cuántos hilos puede quedarse el feed
+DEFAULT_POOLS = {
+    'point': (16, 32, 1.0),
+    'list': (2, 2, 2.0),
+    'write': (8, 32, 2.0),
+    'report': (1, 1, 5.0),
+    'export': (1, 0, 5.0),
+    'stream': (2, 0, 1.0),
+}
+# DOCTOCLIQUE_ADMISSION_LIST=4:8:2.5 cambia el cupo de una clase (en curso:en cola:timeout)
+POOL_ENV = 'DOCTOCLIQUE_ADMISSION_{}'
+# '0' desactiva el control de admisión
+ADMISSION_ENV = 'DOCTOCLIQUE_ADMISSION'
+
+ACTIVE = 'doctoclique_admission_active'
+QUEUED = 'doctoclique_admission_queue_depth'
+REJECTED = 'doctoclique_admission_rejected_total'
+WAIT_SECONDS = 'doctoclique_admission_wait_seconds'
+metrics.REGISTRY.gauge(ACTIVE, 'Peticiones en curso por clase de ruta')
+metrics.REGISTRY.gauge(QUEUED, 'Peticiones esperando cupo por clase de ruta')
+metrics.REGISTRY.counter(REJECTED, 'Peticiones rechazadas con 503 por clase y motivo (queue_full, timeout)')
+metrics.REGISTRY.histogram(WAIT_SECONDS, 'Espera por cupo de las peticiones admitidas')
+
+
+class Rejected(Exception):
+    """No hubo cupo: la petición se responde con 503 y Retry-After"""
+
+    def __init__(self, pool, reason):
+        super().__init__(f'{pool.name}: {reason}')
+        self.pool = pool
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(pool.timeout))
+
+
+class AdmissionPool:
+    """Semáforo con cola acotada (FIFO) y timeout para una clase de ruta"""
+
+    def __init__(self, name, limit, queue_size, timeout):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._publish()
+
+    def acquire(self):
+        """Toma un cupo, esperando en la cola si hace falta; lanza Rejected"""
+        with self._condition:
+            if self._active < self.limit and self._waiting == 0:
+                self._active += 1
+                self._publish()
+                return
+            if self._waiting >= self.queue_size:
+                self._reject('queue_full')
+
+            started = time.monotonic()
+            deadline = started + self.timeout
+            self._waiting += 1
+            self._publish()
+            try:
+                while self._active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject('timeout')
+                    self._condition.wait(remaining)
+                self._active += 1
+            finally:
+                self._waiting -= 1
+                self._publish()
+        metrics.REGISTRY.observe(WAIT_SECONDS, {'pool': self.name}, time.monotonic() - started)
+
+    def release(self):
+        with self._condition:
+            self._active -= 1
+            self._publish()
+            # Los waiters despiertan en orden de llegada
+            self._condition.notify()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    @property
+    def active(self):
+        return self._active
+
+    @property
+    def waiting(self):
+        return self._waiting
+
+    def _reject(self, reason):
+        metrics.REGISTRY.inc(REJECTED, {'pool': self.name, 'reason': reason})
+        raise Rejected(self, reason)
+
+    def _publish(self):
+        metrics.REGISTRY.set(ACTIVE, {'pool': self.name}, self._active)
+        metrics.REGISTRY.set(QUEUED, {'pool': self.name}, self._waiting)
+
+
+def admission_enabled():
+    """False si no se limita la concurrencia (DOCTOCLIQUE_ADMISSION=0)"""
+    return os.environ.get(ADMISSION_ENV) != '0'
+
+
+def parse_pool_config(value):
+    """'en_curso:en_cola:espera' -> (int, int, float); ValueError si no tiene ese formato"""
+    try:
+        limit, queue_size, timeout = value.split(':')
+        limit, queue_size, timeout = int(limit), int(queue_size), float(timeout)
+    except ValueError:
+        raise ValueError('se esperaba en_curso:en_cola:espera, por ejemplo 4:8:2.5')
+    if limit < 1 or queue_size < 0 or not 0 < timeout < math.inf:
+        raise ValueError('en_curso debe ser al menos 1, en_cola no negativo y espera mayor que cero')
+    return limit, queue_size, timeout
+
+
+def _pool_config(name, default):
+    variable = POOL_ENV.format(name.upper())
+    value = os.environ.get(variable)
+    if not value:
+        return default
+    try:
+        return parse_pool_config(value)
+    except ValueError as e:
+        # Un valor mal escrito no debe impedir que arranque el worker: se avisa y se usa el cupo por defecto
+        metrics.log_event(
+            'admission_config_invalid', logging.WARNING,
+            variable=variable, value=value, error=str(e), default=':'.join(map(str, default))
+        )
+        return default
+
+
+def build_pools(config=None):
+    """Un AdmissionPool por clase, con los cupos por defecto o los del entorno"""
+    config = config or {name: _pool_config(name, default) for name, default in DEFAULT_POOLS.items()}
+    return {name: AdmissionPool(name, *values) for name, values in config.items()}
@@ -4,25 +4,235 @@ API Server para Sistema de Gestión Odontológica DoctoClique
 Servidor Flask con endpoints para todas las funcionalidades
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import sqlite3
+from werkzeug.exceptions import HTTPException
+import functools
 import json
+import logging
 import os
-from datetime import datetime, date
-import uuid
+import sqlite3
+from datetime import date
+
+from query_builder import build_list_query, QueryError
+import report_aggregates
+import report_jobs
+import migrations
+from db_pool import connect, get_pool, read_snapshot, write_transaction
+from stats_cache import StatsCache
+import events
+import batch_writes
+import batch_reads
+import availability
+import inventory
+import patient_search
+import patient_timeline
+import sync
+import metrics
+import response_cache
+import serializers
+import single_flight
+import admission
+import write_queue
+
+# Serializador JSON (orjson si está instalado, si no json de la biblioteca estándar)
+serializer = serializers.get_serializer()
+
+class SerializerJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask sobre serializers; suma su tiempo a las métricas de la petición"""
+    
+    def dumps(self, obj, **kwargs):
+        with metrics.timing_serialize():
+            if kwargs:
+                return super().dumps(obj, **kwargs)
+            return serializer.dumps(obj).decode('utf-8')
+    
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            # Modo debug: JSON indentado como siempre (no es un camino de rendimiento)
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        with metrics.timing_serialize():
+            # Con el salto de línea final de DefaultJSONProvider.response
+            body = serializer.dumps(obj) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = SerializerJSONProvider(app)
 CORS(app)
 
 # Configuración de la base de datos
 DATABASE = 'agenda.db'
 
+# Caché de /api/stats (contadores mantenidos por triggers)
+stats_cache_store = StatsCache()
+
+# Aviso a los clientes SSE de este proceso cuando se confirma una escritura
+event_broker = events.EventBroker()
+
+# Intervalos ocupados de la agenda por día (se sincroniza con change_events)
+availability_index = availability.AvailabilityIndex()
+
+# Versiones por tabla y cuerpos ya serializados de las respuestas GET
+table_versions = response_cache.TableVersions()
+response_store = response_cache.ResponseCache()
+# Una sola ejecución por petición idéntica en curso (mismas ruta, query y versiones)
+request_flights = single_flight.SingleFlight()
+
+# Despachador de la cola de reportes (pool de procesos; arranca con la primera petición)
+report_runner = report_jobs.JobRunner()
+
+# Hilo escritor: las escrituras concurrentes se confirman juntas (group commit)
+writer = write_queue.WriteQueue()
+
+# Cupos de concurrencia por clase de ruta (control de admisión)
+admission_pools = admission.build_pools()
+
+# Filas leídas del cursor por lote en las respuestas en streaming
+STREAM_BATCH_SIZE = 500
+
 def get_db_connection():
-    """Obtiene conexión a la base de datos"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Abre una conexión propia a la base de datos (scripts e inicialización)"""
+    return connect(DATABASE)
+
+def get_db():
+    """Conexión del pool asociada al contexto de la petición actual"""
+    if 'db' not in g:
+        g.db = get_pool(DATABASE).acquire()
+    return g.db
+
+def run_write(work):
+    """Ejecuta work(conn) en una transacción de escritura y devuelve su resultado"""
+    if not write_queue.group_commit_enabled():
+        with write_transaction(get_db()) as conn:
+            return work(conn)
+    writer.ensure_running(DATABASE)
+    return writer.submit(work)
+
+@app.before_request
+def start_metrics():
+    """Empieza a medir la petición (latencia, SQL y serialización)"""
+    g.metrics_token = metrics.begin_request()
+
+@app.after_request
+def record_metrics(response):
+    """Registra la petición por ruta (la regla de Flask, no la URL, para acotar las series)"""
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.end_request(token, route, request.method, response.status_code, request.path)
+    return response
+
+@app.before_request
+def start_report_runner():
+    """Arranca el despachador de reportes en este proceso (en cada worker, después del fork)"""
+    if report_jobs.runner_enabled():
+        report_runner.ensure_running(DATABASE)
+
+# === CONTROL DE ADMISIÓN ===
+# Rutas que no ocupan cupo: salud y métricas
+ADMISSION_EXEMPT = {'health', 'readiness', 'get_metrics', 'static'}
+# GET baratos que se atienden en el cupo de búsquedas puntuales aunque no lleven id en la ruta
+POINT_ENDPOINTS = {'search_patients', 'get_availability', 'get_stats', 'get_report_aggregates'}
+ADMISSION_KEY = 'doctoclique.admission'
+
+def admission_class():
+    """Clase de la petición en curso (point, list, write, report, export, stream) o None si no ocupa cupo"""
+    if request.method == 'OPTIONS' or request.url_rule is None or request.endpoint in ADMISSION_EXEMPT:
+        return None
+    if request.endpoint == 'get_events':
+        # Cada cliente SSE retiene un hilo mientras está conectado
+        return 'stream'
+    if wants_stream():
+        return 'export'
+    if request.endpoint == 'aggregate_report' and request.method == 'GET':
+        return 'report'
+    if request.endpoint == 'read_batch':
+        return 'list'
+    if request.method != 'GET':
+        return 'write'
+    if request.view_args or request.endpoint in POINT_ENDPOINTS:
+        return 'point'
+    return 'list'
+
+def admission_pool():
+    """Pool de admisión de la petición en curso o None si no ocupa cupo"""
+    name = admission_class() if admission.admission_enabled() else None
+    return admission_pools[name] if name else None
+
+def run_admitted(view, *args, **kwargs):
+    """Ejecuta la vista con un cupo de su clase (para las rutas con caché, que admit_request no admite)"""
+    pool = admission_pool()
+    if pool is None:
+        return app.make_response(view(*args, **kwargs))
+    pool.acquire()
+    try:
+        response = app.make_response(view(*args, **kwargs))
+    except BaseException:
+        pool.release()
+        raise
+    if response.is_streamed:
+        response.call_on_close(pool.release)
+    else:
+        pool.release()
+    return response
+
+@app.before_request
+def admit_request():
+    """Toma un cupo de la clase de la ruta (Rejected se responde con 503 y Retry-After)"""
+    view = app.view_functions.get(request.endpoint)
+    if getattr(view, 'admitted_on_miss', False) and request.method == 'GET' and not wants_stream():
+        # Las rutas con caché toman el cupo solo si ejecutan la consulta: 304, hits y peticiones
+        # coalescidas no ocupan cupo
+        return None
+    pool = admission_pool()
+    if pool is None:
+        return None
+    pool.acquire()
+    # En el environ y no en g: las consultas de /api/batch comparten g con la petición
+    request.environ[ADMISSION_KEY] = pool
+    return None
+
+@app.errorhandler(admission.Rejected)
+def reject_request(error):
+    """Clase de ruta saturada: 503 inmediato para que el cliente reintente más tarde"""
+    response = jsonify({'error': 'El servidor está ocupado; reintente en unos segundos', 'pool': error.pool.name})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+@app.after_request
+def hold_admission_for_stream(response):
+    """Un stream conserva su cupo hasta terminar de enviarse, no hasta que vuelve la vista"""
+    pool = request.environ.pop(ADMISSION_KEY, None)
+    if pool is not None:
+        if response.is_streamed:
+            response.call_on_close(pool.release)
+        else:
+            request.environ[ADMISSION_KEY] = pool
+    return response
+
+@app.teardown_request
+def release_admission(exception):
+    """Devuelve el cupo de la petición"""
+    pool = request.environ.pop(ADMISSION_KEY, None)
+    if pool is not None:
+        pool.release()
+
+@app.teardown_appcontext
+def release_db(exception):
+    """Devuelve la conexión de la petición al pool"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool(DATABASE).release(conn)
+
+def startup():
+    """Prepara el proceso: esquema y migraciones al día e índice de disponibilidad precargado"""
+    init_database()
+    conn = get_db_connection()
+    availability_index.rebuild(conn)
+    conn.close()
 
 def init_database():
     """Inicializa la base de datos con todas las tablas"""
@@ -169,127 +379,289 @@ def init_database():
     ''')
     
     conn.commit()
+    
+    # Índices y cambios de esquema versionados
+    migrations.migrate(conn)
+    events.prune(conn)
     conn.close()
 
+def list_resource(name, where=None, where_params=()):
+    """Responde un listado con paginación por cursor, proyección (fields) y filtro since"""
+    try:
+        query = build_list_query(name, request.args, where, where_params)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if wants_stream():
+        return Response(stream_rows(query), mimetype='application/x-ndjson')
+    
+    conn = get_db()
+    cursor = conn.execute(query.sql, query.params)
+    rows = cursor.fetchmany(query.limit + 1) if query.paginated else cursor.fetchall()
+    
+    # Las filas se codifican directo desde el cursor, sin armar un dict por fila
+    layout = serializers.RowLayout(query.columns)
+    with metrics.timing_serialize():
+        if not query.paginated:
+            body = serializer.encode_rows(layout, rows) + b'\n'
+        else:
+            page = rows[:query.limit]
+            next_after = query.next_cursor(tuple(page[-1])) if len(rows) > query.limit else None
+            # Mismos bytes que jsonify: claves items y next_after, salto de línea final
+            body = b''.join((
+                b'{"items":', serializer.encode_rows(layout, page),
+                b',"next_after":', serializer.dumps(next_after), b'}\n'
+            ))
+    return Response(body, mimetype='application/json')
+
+def wants_stream():
+    """Indica si el cliente pidió la respuesta en NDJSON (?stream=1 o Accept)"""
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+def stream_rows(query):
+    """Genera una línea JSON por fila, leyendo el cursor por lotes"""
+    layout = serializers.RowLayout(query.columns)
+    remaining = query.limit
+    pool = get_pool(DATABASE)
+    conn = pool.acquire()
+    try:
+        cursor = conn.execute(query.sql, query.params)
+        while remaining is None or remaining > 0:
+            batch = cursor.fetchmany(STREAM_BATCH_SIZE if remaining is None else min(STREAM_BATCH_SIZE, remaining))
+            if not batch:
+                break
+            if remaining is not None:
+                remaining -= len(batch)
+            yield serializer.encode_lines(layout, batch)
+    finally:
+        pool.release(conn)
+
+def cached_get(*tables):
+    """Cachea la respuesta GET según ruta, query y versión de las tablas que lee (ETag fuerte y 304)"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            # Dentro de /api/batch la consulta debe leer la instantánea del lote, no la caché
+            if request.method != 'GET' or wants_stream() or g.get('batch'):
+                return view(*args, **kwargs)
+            try:
+                versions = table_versions.current(DATABASE, tables)
+            except sqlite3.Error:
+                # Base sin migrar (antes de /api/init): se responde sin caché
+                return run_admitted(view, *args, **kwargs)
+            
+            key = response_cache.request_key(request.path, request.args)
+            etag = response_cache.make_etag(key, versions)
+            if response_cache.etag_matches(request.headers.get('If-None-Match'), etag):
+                response_cache.record('not_modified')
+                response = Response(status=304)
+            else:
+                entry = response_store.get(key, etag)
+                if entry is None:
+                    streamed = []
+                    
+                    def render():
+                        response = run_admitted(view, *args, **kwargs)
+                        if response.is_streamed:
+                            streamed.append(response)
+                            return None
+                        if response.status_code != 200:
+                            return response.status_code, response_cache.CachedResponse(
+                                etag, response.get_data(), response.mimetype
+                            )
+                        response_cache.record('miss')
+                        return 200, response_store.put(key, etag, response.get_data(), response.mimetype)
+                    
+                    # Las peticiones idénticas que lleguen mientras tanto esperan este mismo cuerpo
+                    result = request_flights.do(etag, render, request.url_rule.rule)
+                    if result is None:
+                        # Un stream no se comparte: quien esperaba ejecuta la vista por su cuenta
+                        return streamed[0] if streamed else run_admitted(view, *args, **kwargs)
+                    status, entry = result
+                    if status != 200:
+                        return Response(entry.body, status=status, mimetype=entry.mimetype)
+                else:
+                    response_cache.record('hit')
+                response = Response(entry.body, mimetype=entry.mimetype)
+            
+            response.headers['ETag'] = etag
+            # El navegador guarda la respuesta pero la revalida siempre (If-None-Match)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        # admit_request deja el cupo para render: solo lo toma quien ejecuta la consulta
+        wrapper.admitted_on_miss = True
+        return wrapper
+    return decorator
+
 # === PACIENTES ===
 @app.route('/api/patients', methods=['GET'])
+@cached_get('patients')
 def get_patients():
     """Obtiene todos los pacientes"""
-    conn = get_db_connection()
-    patients = conn.execute('SELECT * FROM patients ORDER BY name').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in patients])
+    return list_resource('patients')
 
 @app.route('/api/patients', methods=['POST'])
 def create_patient():
     """Crea un nuevo paciente"""
     data = request.get_json()
-    
-    conn = get_db_connection()
-    conn.execute('''
-        INSERT INTO patients (name, email, phone, dni, birth_date, gender, address, 
-                             blood_type, allergies, chronic_diseases, current_medications)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
+    params = (
         data['name'], data.get('email'), data.get('phone'), data.get('dni'),
         data.get('birth_date'), data.get('gender'), data.get('address'),
         data.get('blood_type'), data.get('allergies'), data.get('chronic_diseases'),
         data.get('current_medications')
-    ))
-    conn.commit()
-    patient_id = conn.lastrowid
-    conn.close()
+    )
+    
+    patient_id = run_write(lambda conn: conn.execute('''
+        INSERT INTO patients (name, email, phone, dni, birth_date, gender, address, 
+                             blood_type, allergies, chronic_diseases, current_medications)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', params).lastrowid)
     
     return jsonify({'id': patient_id, 'message': 'Paciente creado exitosamente'}), 201
 
+@app.route('/api/patients/search', methods=['GET'])
+@cached_get('patients')
+def search_patients():
+    """Busca pacientes por nombre, DNI, email, teléfono o dirección (prefijos, sin acentos)"""
+    try:
+        limit = int(request.args.get('limit', patient_search.DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'El parámetro "limit" debe ser un entero'}), 400
+    
+    try:
+        patients = patient_search.search_patients(get_db(), request.args.get('q'), max(limit, 1))
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(patients)
+
 @app.route('/api/patients/<int:patient_id>', methods=['GET'])
+@cached_get('patients')
 def get_patient(patient_id):
     """Obtiene un paciente específico"""
-    conn = get_db_connection()
+    conn = get_db()
     patient = conn.execute('SELECT * FROM patients WHERE id = ?', (patient_id,)).fetchone()
-    conn.close()
     
     if patient:
         return jsonify(dict(patient))
     return jsonify({'error': 'Paciente no encontrado'}), 404
 
+@app.route('/api/patients/<int:patient_id>/timeline', methods=['GET'])
+@cached_get(*patient_timeline.SOURCE_TABLES)
+def get_patient_timeline(patient_id):
+    """Ficha del paciente: citas, historias, facturas con pagos y exámenes en una sola respuesta"""
+    try:
+        timeline = patient_timeline.load_timeline(get_db(), patient_id, request.args)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if timeline is None:
+        return jsonify({'error': 'Paciente no encontrado'}), 404
+    return jsonify(timeline)
+
 @app.route('/api/patients/<int:patient_id>', methods=['PUT'])
 def update_patient(patient_id):
     """Actualiza un paciente"""
     data = request.get_json()
+    params = (
+        data['name'], data.get('email'), data.get('phone'), data.get('dni'),
+        data.get('birth_date'), data.get('gender'), data.get('address'),
+        data.get('blood_type'), data.get('allergies'), data.get('chronic_diseases'),
+        data.get('current_medications'), patient_id
+    )
     
-    conn = get_db_connection()
-    conn.execute('''
+    run_write(lambda conn: conn.execute('''
         UPDATE patients SET name = ?, email = ?, phone = ?, dni = ?, birth_date = ?,
                            gender = ?, address = ?, blood_type = ?, allergies = ?,
                            chronic_diseases = ?, current_medications = ?, updated_at = CURRENT_TIMESTAMP
         WHERE id = ?
-    ''', (
-        data['name'], data.get('email'), data.get('phone'), data.get('dni'),
-        data.get('birth_date'), data.get('gender'), data.get('address'),
-        data.get('blood_type'), data.get('allergies'), data.get('chronic_diseases'),
-        data.get('current_medications'), patient_id
-    ))
-    conn.commit()
-    conn.close()
+    ''', params))
     
     return jsonify({'message': 'Paciente actualizado exitosamente'})
 
 @app.route('/api/patients/<int:patient_id>', methods=['DELETE'])
 def delete_patient(patient_id):
     """Elimina un paciente"""
-    conn = get_db_connection()
-    conn.execute('DELETE FROM patients WHERE id = ?', (patient_id,))
-    conn.commit()
-    conn.close()
+    run_write(lambda conn: conn.execute('DELETE FROM patients WHERE id = ?', (patient_id,)))
     
     return jsonify({'message': 'Paciente eliminado exitosamente'})
 
 # === CITAS ===
 @app.route('/api/appointments', methods=['GET'])
+@cached_get('appointments', 'patients')
 def get_appointments():
     """Obtiene todas las citas"""
-    conn = get_db_connection()
-    appointments = conn.execute('''
-        SELECT a.*, p.name as patient_name 
-        FROM appointments a 
-        JOIN patients p ON a.patient_id = p.id 
-        ORDER BY a.date, a.time
-    ''').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in appointments])
+    return list_resource('appointments')
 
 @app.route('/api/appointments', methods=['POST'])
 def create_appointment():
-    """Crea una nueva cita"""
+    """Crea una nueva cita (rechaza horarios superpuestos con 409)"""
     data = request.get_json()
+    status = data.get('status', 'pending')
+    duration = data.get('duration') or availability.DEFAULT_DURATION
+    try:
+        availability.parse_slot(data.get('time'), duration)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO appointments (patient_id, date, time, type, status, notes)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (
-        data['patient_id'], data['date'], data['time'], 
-        data['type'], data.get('status', 'pending'), data.get('notes')
-    ))
-    appointment_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    def insert(conn):
+        # La verificación de superposición y la inserción van en la misma transacción de escritura
+        if status != 'cancelled':
+            conflict_id = availability.find_conflict(conn, data['date'], data['time'], duration)
+            if conflict_id:
+                return None, conflict_id
+        cursor = conn.execute('''
+            INSERT INTO appointments (patient_id, date, time, type, status, notes, duration)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            data['patient_id'], data['date'], data['time'], 
+            data['type'], status, data.get('notes'), duration
+        ))
+        return cursor.lastrowid, None
+    
+    appointment_id, conflict_id = run_write(insert)
+    if conflict_id:
+        return jsonify({'error': 'El horario se superpone con otra cita', 'conflict_id': conflict_id}), 409
     
     return jsonify({'id': appointment_id, 'message': 'Cita creada exitosamente'}), 201
 
+@app.route('/api/appointments/availability', methods=['GET'])
+def get_availability():
+    """Horarios libres por día para una cita de la duración indicada"""
+    try:
+        date_from = report_aggregates.parse_date(request.args.get('from') or date.today().isoformat(), 'from')
+        date_to = report_aggregates.parse_date(request.args.get('to') or date_from, 'to')
+        duration = int(request.args.get('duration', availability.DEFAULT_DURATION))
+        step = int(request.args.get('step', availability.SLOT_STEP))
+    except ValueError as e:
+        return jsonify({'error': str(e) if isinstance(e, QueryError) else 'duration y step deben ser enteros'}), 400
+    
+    opening = request.args.get('open', availability.OPENING_TIME)
+    closing = request.args.get('close', availability.CLOSING_TIME)
+    if availability.parse_time(opening) is None or availability.parse_time(closing) is None:
+        return jsonify({'error': 'open y close deben tener formato HH:MM'}), 400
+    if duration < 1 or step < 1:
+        return jsonify({'error': 'duration y step deben ser mayores que cero'}), 400
+    if date_to < date_from:
+        return jsonify({'error': '"to" no puede ser anterior a "from"'}), 400
+    if (date.fromisoformat(date_to) - date.fromisoformat(date_from)).days >= availability.MAX_RANGE_DAYS:
+        return jsonify({'error': f'El rango máximo es de {availability.MAX_RANGE_DAYS} días'}), 400
+    
+    days = availability_index.free_slots(get_db(), date_from, date_to, duration, opening, closing, step)
+    return jsonify({'from': date_from, 'to': date_to, 'duration': duration, 'days': days})
+
 @app.route('/api/appointments/<int:appointment_id>', methods=['GET'])
+@cached_get('appointments', 'patients')
 def get_appointment(appointment_id):
     """Obtiene una cita específica"""
-    conn = get_db_connection()
+    conn = get_db()
     appointment = conn.execute('''
         SELECT a.*, p.name as patient_name 
         FROM appointments a 
         JOIN patients p ON a.patient_id = p.id 
         WHERE a.id = ?
     ''', (appointment_id,)).fetchone()
-    conn.close()
     
     if appointment:
         return jsonify(dict(appointment))
@@ -297,79 +669,72 @@ def get_appointment(appointment_id):
 
 @app.route('/api/appointments/<int:appointment_id>', methods=['PUT'])
 def update_appointment(appointment_id):
-    """Actualiza una cita"""
+    """Actualiza una cita (rechaza horarios superpuestos con 409)"""
     data = request.get_json()
+    try:
+        availability.parse_slot(data.get('time'), data.get('duration'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    conn = get_db_connection()
-    conn.execute('''
-        UPDATE appointments SET patient_id = ?, date = ?, time = ?, type = ?, 
-                               status = ?, notes = ?, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (
-        data['patient_id'], data['date'], data['time'], data['type'],
-        data['status'], data.get('notes'), appointment_id
-    ))
-    conn.commit()
-    conn.close()
+    def update(conn):
+        current = conn.execute('SELECT duration FROM appointments WHERE id = ?', (appointment_id,)).fetchone()
+        duration = data.get('duration') or (current['duration'] if current else None) or availability.DEFAULT_DURATION
+        if data['status'] != 'cancelled':
+            conflict_id = availability.find_conflict(conn, data['date'], data['time'], duration, appointment_id)
+            if conflict_id:
+                return conflict_id
+        conn.execute('''
+            UPDATE appointments SET patient_id = ?, date = ?, time = ?, type = ?, 
+                                   status = ?, notes = ?, duration = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (
+            data['patient_id'], data['date'], data['time'], data['type'],
+            data['status'], data.get('notes'), duration, appointment_id
+        ))
+        return None
+    
+    conflict_id = run_write(update)
+    if conflict_id:
+        return jsonify({'error': 'El horario se superpone con otra cita', 'conflict_id': conflict_id}), 409
     
     return jsonify({'message': 'Cita actualizada exitosamente'})
 
 @app.route('/api/appointments/<int:appointment_id>', methods=['DELETE'])
 def delete_appointment(appointment_id):
     """Elimina una cita"""
-    conn = get_db_connection()
-    conn.execute('DELETE FROM appointments WHERE id = ?', (appointment_id,))
-    conn.commit()
-    conn.close()
+    run_write(lambda conn: conn.execute('DELETE FROM appointments WHERE id = ?', (appointment_id,)))
     
     return jsonify({'message': 'Cita eliminada exitosamente'})
 
 # === HISTORIAS CLÍNICAS ===
 @app.route('/api/clinical-histories', methods=['GET'])
+@cached_get('clinical_histories', 'patients')
 def get_clinical_histories():
     """Obtiene todas las historias clínicas"""
-    conn = get_db_connection()
-    histories = conn.execute('''
-        SELECT h.*, p.name as patient_name 
-        FROM clinical_histories h 
-        JOIN patients p ON h.patient_id = p.id 
-        ORDER BY h.created_at DESC
-    ''').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in histories])
+    return list_resource('clinical_histories')
 
 @app.route('/api/clinical-histories', methods=['POST'])
 def create_clinical_history():
     """Crea una nueva historia clínica"""
     data = request.get_json()
+    params = (
+        data['patient_id'], data.get('appointment_id'), data['reason'],
+        data.get('diagnosis'), data.get('treatment'), data.get('observations')
+    )
     
-    conn = get_db_connection()
-    conn.execute('''
+    history_id = run_write(lambda conn: conn.execute('''
         INSERT INTO clinical_histories (patient_id, appointment_id, reason, diagnosis, treatment, observations)
         VALUES (?, ?, ?, ?, ?, ?)
-    ''', (
-        data['patient_id'], data.get('appointment_id'), data['reason'],
-        data.get('diagnosis'), data.get('treatment'), data.get('observations')
-    ))
-    conn.commit()
-    history_id = conn.lastrowid
-    conn.close()
+    ''', params).lastrowid)
     
     return jsonify({'id': history_id, 'message': 'Historia clínica creada exitosamente'}), 201
 
 # === FACTURAS ===
 @app.route('/api/invoices', methods=['GET'])
+@cached_get('invoices', 'patients')
 def get_invoices():
     """Obtiene todas las facturas"""
-    conn = get_db_connection()
-    invoices = conn.execute('''
-        SELECT i.*, p.name as patient_name 
-        FROM invoices i 
-        JOIN patients p ON i.patient_id = p.id 
-        ORDER BY i.created_at DESC
-    ''').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in invoices])
+    return list_resource('invoices')
 
 @app.route('/api/invoices', methods=['POST'])
 def create_invoice():
@@ -377,196 +742,432 @@ def create_invoice():
     data = request.get_json()
     
     # Generar número de factura único
-    invoice_number = f"FAC-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
+    invoice_number = batch_writes.generate_invoice_number()
+    params = (
+        data['patient_id'], data.get('appointment_id'), invoice_number,
+        data['total_amount'], data.get('status', 'pending')
+    )
     
-    conn = get_db_connection()
-    conn.execute('''
+    invoice_id = run_write(lambda conn: conn.execute('''
         INSERT INTO invoices (patient_id, appointment_id, invoice_number, total_amount, status)
         VALUES (?, ?, ?, ?, ?)
-    ''', (
-        data['patient_id'], data.get('appointment_id'), invoice_number,
-        data['total_amount'], data.get('status', 'pending')
-    ))
-    conn.commit()
-    invoice_id = conn.lastrowid
-    conn.close()
+    ''', params).lastrowid)
     
     return jsonify({'id': invoice_id, 'invoice_number': invoice_number, 'message': 'Factura creada exitosamente'}), 201
 
 # === PAGOS ===
 @app.route('/api/payments', methods=['GET'])
+@cached_get('payments', 'invoices')
 def get_payments():
     """Obtiene todos los pagos"""
-    conn = get_db_connection()
-    payments = conn.execute('''
-        SELECT p.*, i.invoice_number 
-        FROM payments p 
-        JOIN invoices i ON p.invoice_id = i.id 
-        ORDER BY p.created_at DESC
-    ''').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in payments])
+    return list_resource('payments')
 
 @app.route('/api/payments', methods=['POST'])
 def create_payment():
     """Crea un nuevo pago"""
     data = request.get_json()
+    params = (
+        data['invoice_id'], data['amount'], data['payment_method'],
+        data.get('reference'), data.get('status', 'completed')
+    )
     
-    conn = get_db_connection()
-    conn.execute('''
+    payment_id = run_write(lambda conn: conn.execute('''
         INSERT INTO payments (invoice_id, amount, payment_method, reference, status)
         VALUES (?, ?, ?, ?, ?)
-    ''', (
-        data['invoice_id'], data['amount'], data['payment_method'],
-        data.get('reference'), data.get('status', 'completed')
-    ))
-    conn.commit()
-    payment_id = conn.lastrowid
-    conn.close()
+    ''', params).lastrowid)
     
     return jsonify({'id': payment_id, 'message': 'Pago registrado exitosamente'}), 201
 
 # === INVENTARIO ===
+def inventory_body():
+    """Cuerpo JSON de una escritura de inventario (debe ser un objeto)"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise inventory.InventoryError('Se esperaba un objeto JSON')
+    return data
+
+def inventory_error(error):
+    """Respuesta para un error de inventory (400, 404 o 409)"""
+    body = {'error': str(error)}
+    if isinstance(error, inventory.InsufficientStock):
+        body['current_stock'] = error.current_stock
+    return jsonify(body), error.status
+
 @app.route('/api/inventory', methods=['GET'])
+@app.route('/api/inventory/items', methods=['GET'])
+@cached_get('inventory', 'inventory_categories', 'inventory_suppliers')
 def get_inventory():
-    """Obtiene todos los items del inventario"""
-    conn = get_db_connection()
-    items = conn.execute('SELECT * FROM inventory ORDER BY name').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in items])
+    """Obtiene todos los items del inventario con su categoría y proveedor"""
+    return list_resource('inventory')
+
+@app.route('/api/inventory/low-stock', methods=['GET'])
+@cached_get('inventory', 'inventory_categories', 'inventory_suppliers')
+def get_low_stock():
+    """Items con stock en el mínimo o por debajo (índice parcial idx_inventory_low_stock)"""
+    return list_resource('inventory', inventory.LOW_STOCK_CONDITION)
 
 @app.route('/api/inventory', methods=['POST'])
+@app.route('/api/inventory/items', methods=['POST'])
 def create_inventory_item():
-    """Crea un nuevo item en el inventario"""
-    data = request.get_json()
-    
-    conn = get_db_connection()
-    conn.execute('''
-        INSERT INTO inventory (name, description, category, supplier, current_stock, min_stock, unit_price)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        data['name'], data.get('description'), data.get('category'), data.get('supplier'),
-        data.get('current_stock', 0), data.get('min_stock', 5), data.get('unit_price')
-    ))
-    conn.commit()
-    item_id = conn.lastrowid
-    conn.close()
+    """Crea un nuevo item en el inventario (el stock inicial se registra como entrada)"""
+    try:
+        data = inventory_body()
+        item_id = run_write(lambda conn: inventory.create_item(conn, data))
+    except inventory.InventoryError as e:
+        return inventory_error(e)
     
     return jsonify({'id': item_id, 'message': 'Item de inventario creado exitosamente'}), 201
 
 @app.route('/api/inventory/<int:item_id>', methods=['PUT'])
+@app.route('/api/inventory/items/<int:item_id>', methods=['PUT'])
 def update_inventory_item(item_id):
-    """Actualiza un item del inventario"""
-    data = request.get_json()
-    
-    conn = get_db_connection()
-    conn.execute('''
-        UPDATE inventory SET name = ?, description = ?, category = ?, supplier = ?,
-                            current_stock = ?, min_stock = ?, unit_price = ?, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (
-        data['name'], data.get('description'), data.get('category'), data.get('supplier'),
-        data.get('current_stock'), data.get('min_stock'), data.get('unit_price'), item_id
-    ))
-    conn.commit()
-    conn.close()
+    """Actualiza un item del inventario (un current_stock distinto se registra como ajuste)"""
+    try:
+        data = inventory_body()
+        run_write(lambda conn: inventory.update_item(conn, item_id, data))
+    except inventory.InventoryError as e:
+        return inventory_error(e)
     
     return jsonify({'message': 'Item de inventario actualizado exitosamente'})
 
+@app.route('/api/inventory/<int:item_id>', methods=['DELETE'])
+@app.route('/api/inventory/items/<int:item_id>', methods=['DELETE'])
+def delete_inventory_item(item_id):
+    """Elimina un item del inventario y sus movimientos"""
+    try:
+        run_write(lambda conn: inventory.delete_item(conn, item_id))
+    except inventory.InventoryError as e:
+        return inventory_error(e)
+    
+    return jsonify({'message': 'Item de inventario eliminado exitosamente'})
+
+@app.route('/api/inventory/movements', methods=['GET'])
+@cached_get('inventory_movements', 'inventory')
+def get_inventory_movements():
+    """Historial de movimientos, los más recientes primero (?item_id= filtra por item)"""
+    item_id = request.args.get('item_id')
+    if item_id is None:
+        return list_resource('inventory_movements')
+    try:
+        item_id = int(item_id)
+    except ValueError:
+        return jsonify({'error': 'El parámetro "item_id" debe ser un entero'}), 400
+    return list_resource('inventory_movements', 'm.inventory_id = ?', (item_id,))
+
+@app.route('/api/inventory/movements', methods=['POST'])
+def create_inventory_movement():
+    """Registra una entrada, salida o ajuste y actualiza el stock en la misma transacción"""
+    try:
+        data = inventory_body()
+        movement_id, stock = run_write(lambda conn: inventory.record_movement(conn, data))
+    except inventory.InventoryError as e:
+        return inventory_error(e)
+    
+    return jsonify({'id': movement_id, 'current_stock': stock, 'message': 'Movimiento registrado exitosamente'}), 201
+
+@app.route('/api/inventory/categories', methods=['GET'])
+@cached_get('inventory_categories', 'inventory')
+def get_inventory_categories():
+    """Obtiene las categorías con la cantidad de items de cada una"""
+    return list_resource('inventory_categories')
+
+@app.route('/api/inventory/categories', methods=['POST'])
+def create_inventory_category():
+    """Crea una categoría de inventario"""
+    try:
+        data = inventory_body()
+        category_id = run_write(lambda conn: inventory.create_category(conn, data))
+    except inventory.InventoryError as e:
+        return inventory_error(e)
+    
+    return jsonify({'id': category_id, 'message': 'Categoría creada exitosamente'}), 201
+
+@app.route('/api/inventory/suppliers', methods=['GET'])
+@cached_get('inventory_suppliers')
+def get_inventory_suppliers():
+    """Obtiene los proveedores"""
+    return list_resource('inventory_suppliers')
+
+@app.route('/api/inventory/suppliers', methods=['POST'])
+def create_inventory_supplier():
+    """Crea un proveedor"""
+    try:
+        data = inventory_body()
+        supplier_id = run_write(lambda conn: inventory.create_supplier(conn, data))
+    except inventory.InventoryError as e:
+        return inventory_error(e)
+    
+    return jsonify({'id': supplier_id, 'message': 'Proveedor creado exitosamente'}), 201
+
+@app.route('/api/inventory/initialize-products', methods=['POST'])
+def initialize_inventory_products():
+    """Carga los productos básicos de odontología que todavía no estén"""
+    created = run_write(inventory.initialize_products)
+    
+    return jsonify({'created': created, 'message': f'{created} productos básicos cargados'}), 201
+
 # === EXÁMENES ===
 @app.route('/api/exams', methods=['GET'])
+@cached_get('exams', 'patients')
 def get_exams():
     """Obtiene todos los exámenes"""
-    conn = get_db_connection()
-    exams = conn.execute('''
-        SELECT e.*, p.name as patient_name 
-        FROM exams e 
-        JOIN patients p ON e.patient_id = p.id 
-        ORDER BY e.created_at DESC
-    ''').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in exams])
+    return list_resource('exams')
 
 @app.route('/api/exams', methods=['POST'])
 def create_exam():
     """Crea un nuevo examen"""
     data = request.get_json()
+    params = (
+        data['patient_id'], data['exam_type'], data.get('laboratory'),
+        data.get('status', 'pending'), data.get('results'), data.get('notes')
+    )
     
-    conn = get_db_connection()
-    conn.execute('''
+    exam_id = run_write(lambda conn: conn.execute('''
         INSERT INTO exams (patient_id, exam_type, laboratory, status, results, notes)
         VALUES (?, ?, ?, ?, ?, ?)
-    ''', (
-        data['patient_id'], data['exam_type'], data.get('laboratory'),
-        data.get('status', 'pending'), data.get('results'), data.get('notes')
-    ))
-    conn.commit()
-    exam_id = conn.lastrowid
-    conn.close()
+    ''', params).lastrowid)
     
     return jsonify({'id': exam_id, 'message': 'Examen creado exitosamente'}), 201
 
 # === REPORTES ===
 @app.route('/api/reports', methods=['GET'])
+@cached_get('reports')
 def get_reports():
     """Obtiene todos los reportes"""
-    conn = get_db_connection()
-    reports = conn.execute('SELECT * FROM reports ORDER BY created_at DESC').fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in reports])
+    return list_resource('reports')
+
+def enqueue_report(data):
+    """Encola el cálculo de un reporte de agregaciones y responde 202 con el trabajo"""
+    try:
+        report_type, title, spec = report_jobs.build_job(data)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    job_id = run_write(lambda conn: report_jobs.enqueue(conn, report_type, title, spec))
+    report_runner.notify()
+    status_url = f'/api/reports/jobs/{job_id}'
+    return jsonify({
+        'job_id': job_id, 'status': 'queued', 'status_url': status_url,
+        'message': 'Reporte encolado'
+    }), 202, {'Location': status_url}
 
 @app.route('/api/reports', methods=['POST'])
 def create_report():
-    """Crea un nuevo reporte"""
+    """Crea un nuevo reporte, o encola su cálculo si se piden agregaciones (202)"""
     data = request.get_json()
     
-    conn = get_db_connection()
-    conn.execute('''
+    if 'aggregate' in data or 'aggregates' in data:
+        return enqueue_report(data)
+    
+    params = (data['report_type'], data['title'], json.dumps(data.get('data', {})))
+    report_id = run_write(lambda conn: conn.execute('''
         INSERT INTO reports (report_type, title, data)
         VALUES (?, ?, ?)
-    ''', (
-        data['report_type'], data['title'], json.dumps(data.get('data', {}))
-    ))
-    conn.commit()
-    report_id = conn.lastrowid
-    conn.close()
+    ''', params).lastrowid)
     
     return jsonify({'id': report_id, 'message': 'Reporte creado exitosamente'}), 201
 
+@app.route('/api/reports/jobs', methods=['GET'])
+def get_report_jobs():
+    """Trabajos de la cola de reportes, los más recientes primero"""
+    return list_resource('report_jobs')
+
+@app.route('/api/reports/jobs/<int:job_id>', methods=['GET'])
+def get_report_job(job_id):
+    """Estado y progreso de un trabajo de reporte (report_id cuando terminó)"""
+    job = report_jobs.get_job(get_db(), job_id)
+    
+    if job:
+        return jsonify(job)
+    return jsonify({'error': 'Trabajo no encontrado'}), 404
+
+@app.route('/api/reports/aggregate', methods=['GET'])
+def get_report_aggregates():
+    """Lista las agregaciones disponibles para reportes"""
+    return jsonify(report_aggregates.describe())
+
+@app.route('/api/reports/aggregate/<name>', methods=['GET', 'POST'])
+@cached_get(*report_aggregates.SOURCE_TABLES)
+def aggregate_report(name):
+    """Calcula una agregación en SQL (GET) o encola su cálculo para guardarla como reporte (POST, 202)"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Se esperaba un objeto JSON'}), 400
+        # Mismo camino que POST /api/reports con "aggregate": el cálculo no ocupa la petición
+        return enqueue_report(dict(data, aggregate=name))
+    
+    try:
+        _, result = report_aggregates.compute(get_db(), name, request.args)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
 # === ESTADÍSTICAS ===
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
-    """Obtiene estadísticas generales del sistema"""
-    conn = get_db_connection()
+    """Obtiene estadísticas generales del sistema (contadores en caché, con ETag)"""
+    stats, etag = stats_cache_store.get(get_db())
     
-    # Estadísticas de pacientes
-    total_patients = conn.execute('SELECT COUNT(*) as count FROM patients').fetchone()['count']
-    
-    # Estadísticas de citas
-    total_appointments = conn.execute('SELECT COUNT(*) as count FROM appointments').fetchone()['count']
-    today_appointments = conn.execute('''
-        SELECT COUNT(*) as count FROM appointments WHERE date = DATE('now')
-    ''').fetchone()['count']
+    response = jsonify(stats)
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+@app.after_request
+def after_write(response):
+    """Tras una escritura exitosa: descarta la caché de estadísticas y avisa al feed de eventos"""
+    # /api/batch es un POST de solo lectura
+    if request.method in ('POST', 'PUT', 'DELETE') and response.status_code < 400 and request.endpoint != 'read_batch':
+        stats_cache_store.invalidate()
+        event_broker.notify()
+    return response
+
+# === CARGA MASIVA ===
+@app.route('/api/<resource>/batch', methods=['POST'])
+def create_batch(resource):
+    """Inserta muchas filas (array JSON o NDJSON) en transacciones por bloques"""
+    spec = batch_writes.WRITE_SPECS.get(resource)
+    if spec is None:
+        return jsonify({'error': f'Recurso desconocido: {resource}'}), 404
     
-    # Estadísticas de facturas
-    total_invoices = conn.execute('SELECT COUNT(*) as count FROM invoices').fetchone()['count']
-    total_revenue = conn.execute('SELECT COALESCE(SUM(total_amount), 0) as total FROM invoices WHERE status = "paid"').fetchone()['total']
+    if request.mimetype == 'application/x-ndjson':
+        # Se lee el cuerpo línea a línea, sin cargarlo entero en memoria
+        items = batch_writes.iter_ndjson(request.stream)
+    else:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('items')
+        if not isinstance(data, list):
+            return jsonify({'error': 'Se esperaba un array JSON de filas'}), 400
+        if len(data) > batch_writes.MAX_JSON_BATCH:
+            return jsonify({'error': f'Máximo {batch_writes.MAX_JSON_BATCH} filas por lote JSON; use NDJSON'}), 413
+        items = data
     
-    conn.close()
+    inserted, failed, results = batch_writes.insert_batch(run_write, spec, items)
     
     return jsonify({
-        'patients': {
-            'total': total_patients
-        },
-        'appointments': {
-            'total': total_appointments,
-            'today': today_appointments
-        },
-        'invoices': {
-            'total': total_invoices,
-            'revenue': float(total_revenue)
-        }
-    })
+        'inserted': inserted,
+        'failed': failed,
+        'results': results,
+        'message': f'{inserted} filas insertadas, {failed} con errores'
+    }), 201 if failed == 0 else 207
+
+# === LECTURAS AGRUPADAS ===
+def run_batch_query(path, query_string):
+    """Ejecuta un GET del API dentro del lote; devuelve (status, cuerpo JSON)"""
+    with app.test_request_context(path, query_string=query_string):
+        if request.routing_exception is not None:
+            error = request.routing_exception
+            return getattr(error, 'code', 404), serializer.dumps({'error': f'Ruta no disponible: {path}'})
+        try:
+            response = app.make_response(app.view_functions[request.endpoint](**request.view_args))
+        except QueryError as e:
+            return 400, serializer.dumps({'error': str(e)})
+        except HTTPException as e:
+            return e.code, serializer.dumps({'error': e.description})
+        if response.is_streamed or response.mimetype != 'application/json':
+            # Streams y eventos abren su propia conexión: no entran en la instantánea del lote
+            response.close()
+            return 400, serializer.dumps({'error': f'La ruta {path} no se puede pedir en un lote'})
+        return response.status_code, response.get_data()
+
+@app.route('/api/batch', methods=['POST'])
+def read_batch():
+    """Varios GET del API en una sola petición, con una conexión y una misma instantánea"""
+    try:
+        queries = batch_reads.parse_queries(request.get_json(silent=True))
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    g.batch = True
+    results = []
+    try:
+        with read_snapshot(get_db()):
+            for query_id, path, query_string in queries:
+                status, body = run_batch_query(path, query_string)
+                results.append((query_id, status, body))
+    finally:
+        g.batch = False
+    
+    with metrics.timing_serialize():
+        body = batch_reads.encode_results(serializer.dumps, results)
+    return Response(body, mimetype='application/json')
+
+# === EVENTOS (SSE) ===
+@app.route('/api/events', methods=['GET'])
+def get_events():
+    """Feed de cambios en tiempo real (Server-Sent Events), reanudable con Last-Event-ID"""
+    after_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if after_id is not None:
+        try:
+            after_id = int(after_id)
+        except ValueError:
+            return jsonify({'error': 'Last-Event-ID inválido'}), 400
+    
+    tables = events.EVENT_TABLES
+    if request.args.get('tables'):
+        tables = tuple(t.strip() for t in request.args['tables'].split(',') if t.strip())
+        unknown = [t for t in tables if t not in events.EVENT_TABLES]
+        if unknown:
+            return jsonify({'error': f'Tabla desconocida: {unknown[0]}'}), 400
+    
+    pool = get_pool(DATABASE)
+    response = Response(
+        events.stream_events(pool.acquire, pool.release, event_broker, after_id, tables, app.json.dumps),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    # Evita que un proxy (nginx) acumule los eventos en su buffer
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# === SINCRONIZACIÓN ===
+@app.route('/api/sync', methods=['GET'])
+@cached_get(*response_cache.VERSIONED_TABLES)
+def get_sync():
+    """Cambios desde una secuencia (upserts y deletes por tabla) para mantener una réplica local"""
+    try:
+        tables = sync.parse_tables(request.args.get('tables'))
+        if request.args.get('since') is None:
+            # Sin since solo se informa el punto de partida: el cliente carga los listados y sigue desde aquí
+            return jsonify({'seq': sync.current_seq(get_db())})
+        since = sync.parse_seq(request.args['since'])
+        changes = sync.load_changes(get_db(), since, tables, request.args.get('limit'))
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except sync.HistoryPruned as e:
+        return jsonify({
+            'error': 'Los cambios pedidos ya no se conservan; recargue los listados completos',
+            'pruned_through': e.pruned_through
+        }), 410
+    return jsonify(changes)
+
+# === MÉTRICAS ===
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Latencias por ruta, tiempo de SQL/serialización y filas leídas (formato Prometheus)"""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.METRICS_CONTENT_TYPE)
+
+# === SALUD ===
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Liveness: el proceso atiende peticiones"""
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+@app.route('/api/ready', methods=['GET'])
+def readiness():
+    """Readiness: la base responde y el esquema está en la última versión (503 si no)"""
+    try:
+        conn = get_db()
+        conn.execute('SELECT 1').fetchone()
+        version = migrations.get_version(conn)
+    except sqlite3.Error as e:
+        return jsonify({'status': 'unavailable', 'error': str(e)}), 503
+    
+    if version < migrations.SCHEMA_VERSION:
+        return jsonify({
+            'status': 'migrating', 'schema_version': version, 'expected_version': migrations.SCHEMA_VERSION
+        }), 503
+    return jsonify({'status': 'ready', 'schema_version': version, 'pid': os.getpid()})
 
 # === RUTAS DE INICIALIZACIÓN ===
 @app.route('/api/init', methods=['POST'])
@@ -575,7 +1176,7 @@ def initialize_system():
     init_database()
     
     # Agregar algunos pacientes de ejemplo
-    conn = get_db_connection()
+    conn = get_db()
     
     sample_patients = [
         ('María González', 'maria@email.com', '+54 11 1234-5678', '12345678', '1990-05-15', 'Femenino', 'Av. Corrientes 1234', 'A+', 'Ninguna', 'Ninguna', 'Ninguno'),
@@ -590,7 +1191,6 @@ def initialize_system():
         ''', patient)
     
     conn.commit()
-    conn.close()
     
     return jsonify({'message': 'Sistema inicializado exitosamente con datos de ejemplo'})
 
@@ -599,8 +1199,10 @@ if __name__ == '__main__':
     print("📊 Endpoints disponibles:")
     print("   GET  /api/patients - Listar pacientes")
     print("   POST /api/patients - Crear paciente")
+    print("   GET  /api/patients/search?q= - Buscar pacientes")
     print("   GET  /api/appointments - Listar citas")
     print("   POST /api/appointments - Crear cita")
+    print("   GET  /api/appointments/availability - Horarios libres")
     print("   GET  /api/clinical-histories - Listar historias clínicas")
     print("   POST /api/clinical-histories - Crear historia clínica")
     print("   GET  /api/invoices - Listar facturas")
@@ -613,8 +1215,18 @@ if __name__ == '__main__':
     print("   POST /api/exams - Crear examen")
     print("   GET  /api/reports - Listar reportes")
     print("   POST /api/reports - Crear reporte")
+    print("   GET  /api/reports/aggregate/<recurso> - Agregaciones por periodo/estado/tipo")
+    print("   POST /api/reports/aggregate/<recurso> - Encolar agregación como reporte")
     print("   GET  /api/stats - Estadísticas generales")
+    print("   POST /api/<recurso>/batch - Carga masiva (JSON o NDJSON)")
+    print("   GET  /api/events - Feed de cambios en tiempo real (SSE)")
+    print("   GET  /metrics - Métricas en formato Prometheus")
+    print("   GET  /api/ready - Readiness (base de datos y esquema)")
     print("   POST /api/init - Inicializar sistema")
     print("🌐 Servidor ejecutándose en http://localhost:5001")
     
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    startup()
+    # Cada petición ya queda en el log estructurado: se omite la línea de acceso de Werkzeug
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    # El depurador interactivo ejecuta código desde el navegador: solo con DOCTOCLIQUE_DEBUG=1
+    app.run(host='0.0.0.0', port=5001, debug=os.environ.get('DOCTOCLIQUE_DEBUG') == '1')
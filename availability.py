@@ -0,0 +1,202 @@
+"""
+Disponibilidad de turnos de la agenda de DoctoClique
+Índice en memoria de los intervalos ocupados por día y detección de superposición de citas
+"""
+
+import bisect
+import threading
+from datetime import date, timedelta
+
+# Duración por defecto de una cita en minutos (columna appointments.duration)
+DEFAULT_DURATION = 30
+# Horario de atención y paso entre turnos ofrecidos
+OPENING_TIME = '08:00'
+CLOSING_TIME = '20:00'
+SLOT_STEP = 15
+# Días que se precargan al arrancar y máximo rango por consulta
+PRELOAD_DAYS = 60
+MAX_RANGE_DAYS = 31
+# Días que conserva el índice en memoria (los pasados se descartan siempre)
+MAX_CACHED_DAYS = 366
+
+
+def parse_time(value):
+    """'HH:MM' o 'HH:MM:SS' -> minutos desde medianoche (None si no es válido)"""
+    try:
+        parts = str(value).split(':')
+        hours, minutes = int(parts[0]), int(parts[1])
+    except (ValueError, IndexError):
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def format_time(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def _interval(time_value, duration):
+    start = parse_time(time_value)
+    if start is None:
+        return None
+    return start, start + (duration or DEFAULT_DURATION)
+
+
+def parse_slot(time_value, duration):
+    """(inicio, fin) en minutos de una cita nueva; ValueError si la hora o la duración no son válidas"""
+    start = parse_time(time_value)
+    if start is None:
+        raise ValueError('La hora debe tener formato HH:MM')
+    duration = duration or DEFAULT_DURATION
+    if isinstance(duration, bool) or not isinstance(duration, int) or duration < 1:
+        raise ValueError('La duración debe ser un número entero de minutos')
+    return start, start + duration
+
+
+def find_conflict(conn, day, time_value, duration, exclude_id=None):
+    """Cita del mismo día que se superpone con el intervalo dado (consulta directa a la base)"""
+    interval = parse_slot(time_value, duration)
+    rows = conn.execute('''
+        SELECT id, time, duration FROM appointments
+        WHERE date = ? AND status != 'cancelled' AND id != ?
+    ''', (day, exclude_id or 0)).fetchall()
+    for appointment_id, other_time, other_duration in rows:
+        other = _interval(other_time, other_duration)
+        if other and other[0] < interval[1] and interval[0] < other[1]:
+            return appointment_id
+    return None
+
+
+class AvailabilityIndex:
+    """Intervalos ocupados por día, cargados bajo demanda y actualizados con change_events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # fecha -> lista ordenada de (inicio, fin, id)
+        self._days = {}
+        # id de cita -> fecha, para poder quitarla al moverla o borrarla
+        self._dates = {}
+        # None hasta la primera carga
+        self._last_event = None
+
+    def rebuild(self, conn, days=PRELOAD_DAYS):
+        """Descarta el índice y precarga los próximos días"""
+        with self._lock:
+            self._rebuild(conn, days)
+
+    def _rebuild(self, conn, days=PRELOAD_DAYS):
+        # Se lee el último evento antes de cargar: lo que cambie después se reaplica en sync
+        self._last_event = conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM change_events WHERE table_name = 'appointments'"
+        ).fetchone()[0]
+        self._days = {}
+        self._dates = {}
+        today = date.today()
+        self._load_range(conn, today.isoformat(), (today + timedelta(days=days)).isoformat())
+
+    def _load_range(self, conn, date_from, date_to):
+        rows = conn.execute('''
+            SELECT id, date, time, duration FROM appointments
+            WHERE date >= ? AND date <= ? AND status != 'cancelled'
+        ''', (date_from, date_to)).fetchall()
+        # Los días ya cargados se mantienen con lo que tienen (sync los tiene al día)
+        new_days = set()
+        for current in _days_between(date.fromisoformat(date_from), date.fromisoformat(date_to)):
+            if current.isoformat() not in self._days:
+                self._days[current.isoformat()] = []
+                new_days.add(current.isoformat())
+        for appointment_id, day, time_value, duration in rows:
+            if day in new_days:
+                self._add(appointment_id, day, time_value, duration)
+
+    def _add(self, appointment_id, day, time_value, duration):
+        interval = _interval(time_value, duration)
+        if interval is None or day not in self._days:
+            return
+        bisect.insort(self._days[day], (interval[0], interval[1], appointment_id))
+        self._dates[appointment_id] = day
+
+    def _remove(self, appointment_id):
+        day = self._dates.pop(appointment_id, None)
+        if day is not None:
+            self._days[day] = [entry for entry in self._days[day] if entry[2] != appointment_id]
+
+    def _evict(self, keep):
+        """Descarta los días pasados y, pasado MAX_CACHED_DAYS, los más lejanos (salvo los de keep)"""
+        today = date.today().isoformat()
+        future = sorted(day for day in self._days if day >= today)
+        stale = [day for day in self._days if day < today]
+        if len(future) > MAX_CACHED_DAYS:
+            extra = [day for day in reversed(future) if day not in keep]
+            stale += extra[:len(future) - MAX_CACHED_DAYS]
+        for day in stale:
+            for _, _, appointment_id in self._days.pop(day):
+                self._dates.pop(appointment_id, None)
+
+    def sync(self, conn):
+        """Aplica los cambios de citas registrados desde la última sincronización"""
+        with self._lock:
+            if self._last_event is None:
+                self._rebuild(conn)
+                return
+            rows = conn.execute('''
+                SELECT id, operation, row_id FROM change_events
+                WHERE table_name = 'appointments' AND id > ?
+                ORDER BY id
+            ''', (self._last_event,)).fetchall()
+            for event_id, operation, row_id in rows:
+                self._remove(row_id)
+                if operation != 'delete':
+                    row = conn.execute(
+                        'SELECT date, time, duration, status FROM appointments WHERE id = ?', (row_id,)
+                    ).fetchone()
+                    if row and row[3] != 'cancelled':
+                        self._add(row_id, row[0], row[1], row[2])
+                self._last_event = event_id
+
+    def busy(self, conn, date_from, date_to):
+        """Intervalos ocupados de cada día del rango (carga los días que falten)"""
+        self.sync(conn)
+        with self._lock:
+            start = date.fromisoformat(date_from)
+            end = date.fromisoformat(date_to)
+            missing = [d for d in _days_between(start, end) if d.isoformat() not in self._days]
+            if missing:
+                self._load_range(conn, missing[0].isoformat(), missing[-1].isoformat())
+            busy = {d.isoformat(): list(self._days[d.isoformat()]) for d in _days_between(start, end)}
+            self._evict(busy)
+            return busy
+
+    def free_slots(self, conn, date_from, date_to, duration,
+                   opening=OPENING_TIME, closing=CLOSING_TIME, step=SLOT_STEP):
+        """Horarios de inicio libres para una cita de la duración dada, por día"""
+        open_minute = parse_time(opening)
+        close_minute = parse_time(closing)
+        days = []
+        for day, intervals in self.busy(conn, date_from, date_to).items():
+            slots = []
+            start = open_minute
+            position = 0
+            while start + duration <= close_minute:
+                end = start + duration
+                # Los intervalos están ordenados por inicio: se saltean los que terminan antes
+                while position < len(intervals) and intervals[position][1] <= start:
+                    position += 1
+                overlaps = any(
+                    other_start < end and start < other_end
+                    for other_start, other_end, _ in intervals[position:]
+                    if other_start < end
+                )
+                if not overlaps:
+                    slots.append(format_time(start))
+                start += step
+            days.append({'date': day, 'slots': slots})
+        return days
+
+
+def _days_between(start, end):
+    current = start
+    while current <= end:
+        yield current
+        current += timedelta(days=1)
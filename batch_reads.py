@@ -0,0 +1,60 @@
+"""
+Lecturas agrupadas (POST /api/batch): varios GET del API en una sola petición
+Los paneles piden al cargar todos sus listados juntos; el servidor los responde con una conexión y
+una misma instantánea de la base, así que los datos son coherentes entre sí
+"""
+
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from query_builder import QueryError
+
+# Sub-consultas como máximo por petición
+MAX_BATCH_QUERIES = 20
+
+
+def parse_queries(data):
+    """
+    Valida el cuerpo y devuelve [(id, ruta, query string)]; lanza QueryError.
+
+    data es una lista (o {"queries": [...]}) de objetos {"id", "path", "params"}: path es una ruta
+    GET de /api (puede traer su query string) y params un objeto con parámetros adicionales
+    """
+    if isinstance(data, dict):
+        data = data.get('queries')
+    if not isinstance(data, list) or not data:
+        raise QueryError('Se esperaba una lista no vacía de consultas')
+    if len(data) > MAX_BATCH_QUERIES:
+        raise QueryError(f'Máximo {MAX_BATCH_QUERIES} consultas por lote')
+
+    queries = []
+    for index, item in enumerate(data):
+        if isinstance(item, str):
+            item = {'path': item}
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            raise QueryError(f'La consulta {index} debe tener "path"')
+        url = urlsplit(item['path'])
+        if url.scheme or url.netloc or not url.path.startswith('/api/'):
+            raise QueryError(f'Ruta no permitida: {item["path"]}')
+        params = item.get('params') or {}
+        if not isinstance(params, dict):
+            raise QueryError(f'"params" de la consulta {index} debe ser un objeto')
+        args = parse_qsl(url.query, keep_blank_values=True)
+        args += [(key, '' if value is None else str(value)) for key, value in params.items()]
+        queries.append((item.get('id', index), url.path, urlencode(args)))
+    return queries
+
+
+def encode_results(dumps, results):
+    """
+    Cuerpo de la respuesta a partir de [(id, status, cuerpo JSON)].
+
+    Los cuerpos ya vienen serializados por cada ruta y se insertan tal cual, sin volver a decodificarlos
+    """
+    # Claves en orden alfabético, igual que el resto de las respuestas. El salto de línea final de
+    # cada cuerpo queda afuera; el del lote va al final, como en jsonify
+    parts = [
+        b'{"body":' + ((body or b'').rstrip(b'\n') or b'null') + b',"id":' + dumps(query_id)
+        + b',"status":' + str(status).encode() + b'}'
+        for query_id, status, body in results
+    ]
+    return b'{"results":[' + b','.join(parts) + b']}\n'
@@ -0,0 +1,230 @@
+"""
+Inserción masiva para el API de DoctoClique
+Valida filas (JSON o NDJSON), las inserta con executemany por bloques (cada bloque es una
+escritura del hilo escritor) y devuelve el resultado de cada fila
+"""
+
+import json
+import sqlite3
+import uuid
+from datetime import datetime
+
+import inventory
+from availability import DEFAULT_DURATION, find_conflict, parse_slot
+
+# Filas por transacción
+BATCH_CHUNK_SIZE = 1000
+# Máximo de filas aceptadas en un lote JSON (NDJSON no tiene límite: se procesa por bloques)
+MAX_JSON_BATCH = 50000
+
+REQUIRED = object()
+
+# Rango de INTEGER en SQLite
+MIN_INTEGER = -2 ** 63
+MAX_INTEGER = 2 ** 63 - 1
+
+
+def _check_value(name, value):
+    """Un campo debe ser texto, número, booleano o null (un objeto o lista no se puede guardar)"""
+    if isinstance(value, (dict, list)):
+        raise ValueError(f'El campo "{name}" debe ser texto o número')
+    if isinstance(value, int) and not MIN_INTEGER <= value <= MAX_INTEGER:
+        raise ValueError(f'El campo "{name}" está fuera de rango')
+
+
+def generate_invoice_number():
+    """Número de factura único (mismo formato que create_invoice)"""
+    return f"FAC-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
+
+
+def appointment_conflict(conn, row):
+    """Misma regla que POST /api/appointments: hora válida y, si no está cancelada, sin superposición"""
+    try:
+        parse_slot(row['time'], row['duration'])
+    except ValueError as e:
+        return {'error': str(e)}
+    if row['status'] == 'cancelled':
+        return None
+    conflict_id = find_conflict(conn, row['date'], row['time'], row['duration'])
+    if conflict_id:
+        return {'error': 'El horario se superpone con otra cita', 'conflict_id': conflict_id}
+    return None
+
+
+class WriteSpec:
+    """Columnas insertables de una tabla con su valor por defecto (REQUIRED si es obligatoria)"""
+
+    def __init__(self, table, columns, check=None):
+        self.table = table
+        self.columns = columns
+        # check(conn, fila) -> error de la fila o None; se evalúa fila a fila con el lock de escritura tomado
+        self.check = check
+        names = ', '.join(name for name, _ in columns)
+        placeholders = ', '.join('?' for _ in columns)
+        self.sql = f'INSERT INTO {table} ({names}) VALUES ({placeholders})'
+
+    def to_params(self, item):
+        """Convierte un objeto JSON en la tupla de parámetros, o lanza ValueError"""
+        if not isinstance(item, dict):
+            raise ValueError('Cada fila debe ser un objeto JSON')
+        params = []
+        for name, default in self.columns:
+            value = item.get(name)
+            _check_value(name, value)
+            if value is None:
+                if default is REQUIRED:
+                    raise ValueError(f'Falta el campo obligatorio: {name}')
+                value = default() if callable(default) else default
+            params.append(value)
+        return tuple(params)
+
+
+class CreateSpec:
+    """Filas que se crean con la función del módulo del recurso (su validación y sus efectos, fila a fila)"""
+
+    def __init__(self, create):
+        # create(conn, fila) -> id; los errores de la fila son ValueError
+        self.create = create
+
+    def to_params(self, item):
+        if not isinstance(item, dict):
+            raise ValueError('Cada fila debe ser un objeto JSON')
+        for name, value in item.items():
+            _check_value(name, value)
+        return item
+
+
+# Nombre en la URL -> especificación de inserción
+WRITE_SPECS = {
+    'patients': WriteSpec('patients', [
+        ('name', REQUIRED), ('email', None), ('phone', None), ('dni', None),
+        ('birth_date', None), ('gender', None), ('address', None), ('blood_type', None),
+        ('allergies', None), ('chronic_diseases', None), ('current_medications', None),
+    ]),
+    'appointments': WriteSpec('appointments', [
+        ('patient_id', REQUIRED), ('date', REQUIRED), ('time', REQUIRED), ('type', REQUIRED),
+        ('status', 'pending'), ('notes', None), ('duration', DEFAULT_DURATION),
+    ], check=appointment_conflict),
+    'clinical-histories': WriteSpec('clinical_histories', [
+        ('patient_id', REQUIRED), ('appointment_id', None), ('reason', REQUIRED),
+        ('diagnosis', None), ('treatment', None), ('observations', None),
+    ]),
+    'invoices': WriteSpec('invoices', [
+        ('patient_id', REQUIRED), ('appointment_id', None),
+        ('invoice_number', generate_invoice_number), ('total_amount', REQUIRED),
+        ('status', 'pending'),
+    ]),
+    'payments': WriteSpec('payments', [
+        ('invoice_id', REQUIRED), ('amount', REQUIRED), ('payment_method', REQUIRED),
+        ('reference', None), ('status', 'completed'),
+    ]),
+    # Como POST /api/inventory: el stock inicial entra como movimiento 'entrada' y categoría y
+    # proveedor se resuelven a sus tablas
+    'inventory': CreateSpec(inventory._create_item),
+    'exams': WriteSpec('exams', [
+        ('patient_id', REQUIRED), ('exam_type', REQUIRED), ('laboratory', None),
+        ('status', 'pending'), ('results', None), ('notes', None),
+    ]),
+}
+
+
+def iter_ndjson(lines):
+    """Decodifica NDJSON línea a línea; las líneas inválidas se devuelven como ValueError"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield ValueError('JSON inválido')
+
+
+def _insert_rows(conn, spec, chunk):
+    """Inserta el bloque fila por fila, con el error de cada fila que falle"""
+    names = [name for name, _ in spec.columns]
+    results = []
+    for index, params in chunk:
+        failure = spec.check(conn, dict(zip(names, params))) if spec.check else None
+        if failure:
+            results.append({'index': index, **failure})
+            continue
+        try:
+            # Un error de restricción solo deshace esta sentencia
+            cursor = conn.execute(spec.sql, params)
+            results.append({'index': index, 'id': cursor.lastrowid})
+        except sqlite3.IntegrityError as e:
+            results.append({'index': index, 'error': str(e)})
+    return results
+
+
+def _create_rows(conn, spec, chunk):
+    """Crea las filas del bloque; cada una en su SAVEPOINT, así un error solo deshace la suya"""
+    results = []
+    for index, item in chunk:
+        conn.execute('SAVEPOINT batch_row')
+        try:
+            results.append({'index': index, 'id': spec.create(conn, item)})
+        except ValueError as e:
+            conn.execute('ROLLBACK TO batch_row')
+            results.append({'index': index, 'error': str(e)})
+        conn.execute('RELEASE batch_row')
+    return results
+
+
+def _insert_chunk(conn, spec, chunk):
+    """Inserta un bloque de (índice, parámetros) en la transacción abierta y devuelve los resultados"""
+    if isinstance(spec, CreateSpec):
+        return _create_rows(conn, spec, chunk)
+    if spec.check:
+        # Cada fila se valida contra lo ya insertado (incluidas las anteriores del mismo bloque)
+        return _insert_rows(conn, spec, chunk)
+    conn.execute('SAVEPOINT batch_chunk')
+    try:
+        # Con el lock de escritura tomado, los ids nuevos son exactamente los mayores al máximo actual
+        before = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {spec.table}').fetchone()[0]
+        conn.executemany(spec.sql, [params for _, params in chunk])
+        ids = [row[0] for row in conn.execute(
+            f'SELECT id FROM {spec.table} WHERE id > ? ORDER BY id', (before,)
+        )]
+        conn.execute('RELEASE batch_chunk')
+        return [{'index': index, 'id': row_id} for (index, _), row_id in zip(chunk, ids)]
+    except sqlite3.Error as e:
+        # Se deshace solo el bloque: la transacción puede traer otras escrituras del lote del escritor
+        conn.execute('ROLLBACK TO batch_chunk')
+        conn.execute('RELEASE batch_chunk')
+        if not isinstance(e, sqlite3.IntegrityError):
+            raise
+
+    # Alguna fila viola una restricción: se insertan una por una para informar cuál
+    return _insert_rows(conn, spec, chunk)
+
+
+def insert_batch(run_write, spec, items, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Valida e inserta las filas por bloques; devuelve (insertadas, fallidas, resultados).
+    run_write(work) ejecuta work(conn) en una transacción de escritura y la confirma (cada bloque
+    pasa por el escritor único del API, como cualquier otra escritura)
+    """
+    results = []
+    chunk = []
+
+    def flush(chunk):
+        results.extend(run_write(lambda conn: _insert_chunk(conn, spec, chunk)))
+
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, Exception):
+                raise item
+            chunk.append((index, spec.to_params(item)))
+        except ValueError as e:
+            results.append({'index': index, 'error': str(e)})
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    results.sort(key=lambda result: result['index'])
+    failed = sum(1 for result in results if 'error' in result)
+    return len(results) - failed, failed, results
@@ -0,0 +1,780 @@
+#!/usr/bin/env python3
+"""
+Benchmark del API de DoctoClique
+Genera una base de datos de prueba determinística y reproduce mezclas de tráfico de recepción
+contra api_server.py (en el mismo proceso o por HTTP, por ejemplo contra gunicorn); guarda
+throughput y percentiles por endpoint en un JSON para comparar entre commits
+
+    python3 benchmark.py generate --db bench.db --patients 5000 --appointments 50000
+    python3 benchmark.py run --db bench.db --requests 5000 --concurrency 8 --output base.json
+    python3 benchmark.py run --url http://127.0.0.1:8000 --output nuevo.json
+    python3 benchmark.py compare base.json nuevo.json
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import unicodedata
+from datetime import date, datetime, timedelta
+from http.client import HTTPConnection
+from urllib.parse import urlparse
+
+# Valores por defecto del generador
+DEFAULT_SEED = 42
+DEFAULT_PATIENTS = 2000
+DEFAULT_APPOINTMENTS = 20000
+# Días hacia adelante con turnos ya agendados
+FUTURE_DAYS = 30
+# Turnos que se intentan agendar por día hábil (se cortan al cierre)
+DAILY_QUOTA = (10, 22)
+# Filas por transacción al insertar
+INSERT_CHUNK = 5000
+
+FEMALE_NAMES = [
+    'María', 'Ana', 'Lucía', 'Sofía', 'Valentina', 'Camila', 'Martina', 'Julieta', 'Florencia',
+    'Paula', 'Carolina', 'Laura', 'Gabriela', 'Natalia', 'Daniela', 'Agustina', 'Victoria',
+    'Mercedes', 'Silvia', 'Patricia', 'Rocío', 'Inés', 'Belén', 'Andrea', 'Mónica'
+]
+MALE_NAMES = [
+    'Carlos', 'Juan', 'José', 'Luis', 'Martín', 'Diego', 'Pablo', 'Jorge', 'Andrés', 'Matías',
+    'Nicolás', 'Facundo', 'Sebastián', 'Gonzalo', 'Ricardo', 'Fernando', 'Alejandro', 'Tomás',
+    'Joaquín', 'Hernán', 'Raúl', 'Miguel', 'Santiago', 'Federico', 'Héctor'
+]
+LAST_NAMES = [
+    'González', 'Rodríguez', 'Gómez', 'Fernández', 'López', 'Díaz', 'Martínez', 'Pérez',
+    'García', 'Sánchez', 'Romero', 'Sosa', 'Álvarez', 'Torres', 'Ruiz', 'Ramírez', 'Flores',
+    'Benítez', 'Acosta', 'Medina', 'Herrera', 'Suárez', 'Aguirre', 'Giménez', 'Gutiérrez',
+    'Pereyra', 'Rojas', 'Molina', 'Castro', 'Ortiz', 'Silva', 'Núñez', 'Luna', 'Juárez',
+    'Cabrera', 'Ríos', 'Morales', 'Godoy', 'Moreno', 'Ferreyra'
+]
+STREETS = [
+    'Av. Corrientes', 'Av. Santa Fe', 'Av. Córdoba', 'Av. Rivadavia', 'Av. Cabildo',
+    'Av. Belgrano', 'Av. San Martín', 'Lavalle', 'Tucumán', 'Uruguay', 'Paraguay', 'Mitre',
+    'Sarmiento', 'Moreno', 'Alsina', 'Las Heras', 'Pueyrredón', 'Callao'
+]
+EMAIL_DOMAINS = [('gmail.com', 60), ('hotmail.com', 20), ('yahoo.com.ar', 10), ('outlook.com', 10)]
+# Distribución aproximada de grupos sanguíneos en Argentina
+BLOOD_TYPES = [
+    ('O+', 50), ('A+', 30), ('B+', 9), ('O-', 5), ('AB+', 2.5), ('A-', 2.5), ('B-', 0.7), ('AB-', 0.3)
+]
+ALLERGIES = [('Ninguna', 85), ('Penicilina', 6), ('Látex', 3), ('Ibuprofeno', 3), ('Lidocaína', 1), ('Amoxicilina', 2)]
+# Enfermedad crónica -> medicación habitual
+CHRONIC = [
+    ('Ninguna', 'Ninguno', 78), ('Hipertensión', 'Enalapril', 9), ('Diabetes', 'Metformina', 5),
+    ('Asma', 'Salbutamol', 4), ('Hipotiroidismo', 'Levotiroxina', 4)
+]
+
+# Tipos de cita (valores de agenda_original.html) con su peso y rango de precio
+APPOINTMENT_TYPES = [
+    ('consulta', 35, (15000, 25000)), ('limpieza', 25, (20000, 35000)),
+    ('revision', 20, (8000, 12000)), ('tratamiento', 15, (40000, 180000)),
+    ('urgencia', 5, (25000, 60000))
+]
+DURATIONS = [(30, 55), (15, 10), (45, 20), (60, 15)]
+GAPS = [(0, 50), (15, 30), (30, 15), (60, 5)]
+REASONS = {
+    'consulta': ['Dolor de muelas', 'Sensibilidad al frío', 'Control general', 'Sangrado de encías'],
+    'limpieza': ['Limpieza semestral', 'Sarro', 'Manchas en los dientes'],
+    'revision': ['Control post tratamiento', 'Revisión de ortodoncia', 'Control de implante'],
+    'tratamiento': ['Conducto', 'Extracción', 'Implante', 'Corona', 'Ortodoncia'],
+    'urgencia': ['Dolor agudo', 'Fractura dental', 'Absceso', 'Traumatismo'],
+}
+DIAGNOSES = ['Caries', 'Gingivitis', 'Periodontitis', 'Pulpitis', 'Maloclusión', 'Bruxismo', 'Sin hallazgos']
+TREATMENTS = ['Obturación', 'Tartrectomía', 'Endodoncia', 'Exodoncia', 'Placa de descanso', 'Seguimiento']
+PAYMENT_METHODS = [('efectivo', 35), ('tarjeta', 30), ('transferencia', 25), ('pago_movil', 7), ('binance', 3)]
+EXAM_TYPES = [('radiografia', 60), ('laboratorio', 15), ('tomografia', 15), ('biopsia', 5), ('otro', 5)]
+LABORATORIES = ['Diagnóstico Maipú', 'Laboratorio Central', 'Rx Dental Sur', 'Imágenes Norte']
+# (nombre, categoría, proveedor, consumo semanal medio, precio)
+PRODUCTS = [
+    ('Guantes de látex (caja x100)', 'Descartables', 'Medix', 6, 9500),
+    ('Guantes de nitrilo (caja x100)', 'Descartables', 'Medix', 4, 12000),
+    ('Barbijos (caja x50)', 'Descartables', 'Medix', 3, 6000),
+    ('Baberos descartables (x500)', 'Descartables', 'Dental Sur', 1, 15000),
+    ('Eyectores de saliva (x100)', 'Descartables', 'Dental Sur', 2, 4500),
+    ('Anestesia lidocaína 2% (x50)', 'Anestesia', 'Farmadental', 1.5, 38000),
+    ('Anestesia articaína 4% (x50)', 'Anestesia', 'Farmadental', 1, 52000),
+    ('Agujas cortas 30G (x100)', 'Anestesia', 'Farmadental', 1, 11000),
+    ('Resina compuesta A2', 'Restauración', 'Odontomarket', 2, 27000),
+    ('Resina compuesta A3', 'Restauración', 'Odontomarket', 1.5, 27000),
+    ('Ácido grabador', 'Restauración', 'Odontomarket', 1, 8000),
+    ('Adhesivo universal', 'Restauración', 'Odontomarket', 0.5, 45000),
+    ('Ionómero de vidrio', 'Restauración', 'Odontomarket', 0.5, 33000),
+    ('Limas K (x6)', 'Endodoncia', 'Endo Store', 2, 9800),
+    ('Conos de gutapercha', 'Endodoncia', 'Endo Store', 1, 14000),
+    ('Hipoclorito de sodio 1L', 'Endodoncia', 'Endo Store', 1, 3500),
+    ('Pasta profiláctica', 'Profilaxis', 'Dental Sur', 1, 7200),
+    ('Flúor gel', 'Profilaxis', 'Dental Sur', 0.7, 6800),
+    ('Cepillos profilácticos (x100)', 'Profilaxis', 'Dental Sur', 0.5, 12500),
+    ('Hilo de sutura 4-0', 'Cirugía', 'Medix', 1, 16000),
+    ('Esponjas hemostáticas', 'Cirugía', 'Medix', 0.5, 21000),
+    ('Alginato 450g', 'Impresión', 'Odontomarket', 1, 11500),
+    ('Silicona de adición', 'Impresión', 'Odontomarket', 0.4, 58000),
+    ('Bolsas de esterilización (x200)', 'Esterilización', 'Medix', 2, 8800),
+    ('Indicadores biológicos', 'Esterilización', 'Medix', 0.3, 24000),
+    ('Películas radiográficas (x150)', 'Radiología', 'Rx Dental Sur', 0.5, 69000),
+]
+
+
+def _weighted(rng, choices):
+    """Elige de una lista de tuplas cuyo segundo elemento es el peso"""
+    return rng.choices(choices, weights=[c[1] for c in choices])[0]
+
+
+def _timestamp(moment):
+    # Mismo formato que CURRENT_TIMESTAMP de SQLite
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _ascii(text):
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+
+
+def _insert(conn, sql, rows):
+    """Inserta con executemany en transacciones de INSERT_CHUNK filas; devuelve los ids"""
+    ids = []
+    table = sql.split()[2]
+    for start in range(0, len(rows), INSERT_CHUNK):
+        chunk = rows[start:start + INSERT_CHUNK]
+        conn.execute('BEGIN IMMEDIATE')
+        before = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0]
+        conn.executemany(sql, chunk)
+        ids.extend(row[0] for row in conn.execute(f'SELECT id FROM {table} WHERE id > ? ORDER BY id', (before,)))
+        conn.commit()
+    return ids
+
+
+# === GENERADOR DE DATOS ===
+class DataGenerator:
+    """Datos de una clínica con distribuciones realistas; misma semilla => misma base"""
+
+    def __init__(self, seed=DEFAULT_SEED, today=None):
+        self.rng = random.Random(seed)
+        self.today = today or date.today()
+        self.now = datetime.combine(self.today, datetime.min.time()) + timedelta(hours=20)
+
+    def patients(self, count, first_registration):
+        rng = self.rng
+        span = max((self.today - first_registration).days, 1)
+        rows = []
+        for i in range(count):
+            female = rng.random() < 0.55
+            first = rng.choice(FEMALE_NAMES if female else MALE_NAMES)
+            last = rng.choice(LAST_NAMES)
+            if rng.random() < 0.3:
+                last += ' ' + rng.choice(LAST_NAMES)
+            email = None
+            if rng.random() < 0.85:
+                domain = _weighted(rng, EMAIL_DOMAINS)[0]
+                email = f'{_ascii(first)}.{_ascii(last.split()[0])}{rng.randint(1, 999)}@{domain}'
+            # Permutación de un rango de 30 millones: DNIs únicos sin guardar los usados
+            dni = str(20_000_000 + (i * 7_919_311) % 30_000_000)
+            age = int(rng.triangular(3, 90, 38))
+            birth = self.today - timedelta(days=age * 365 + rng.randint(0, 364))
+            chronic, medication, _ = rng.choices(CHRONIC, weights=[c[2] for c in CHRONIC])[0]
+            registered = self.now - timedelta(days=span * rng.random() ** 0.7, seconds=rng.randint(0, 36000))
+            rows.append((
+                f'{first} {last}', email, f'+54 11 {rng.randint(2000, 6999)}-{rng.randint(0, 9999):04d}',
+                dni, birth.isoformat(), 'Femenino' if female else 'Masculino',
+                f'{rng.choice(STREETS)} {rng.randint(100, 9999)}', _weighted(rng, BLOOD_TYPES)[0],
+                _weighted(rng, ALLERGIES)[0], chronic, medication,
+                _timestamp(registered), _timestamp(registered)
+            ))
+        return rows
+
+    def _business_days(self):
+        """Días hábiles hacia atrás desde FUTURE_DAYS adelante (los sábados, medio día)"""
+        current = self.today + timedelta(days=FUTURE_DAYS)
+        while True:
+            if current.weekday() < 6:
+                yield current
+            current -= timedelta(days=1)
+
+    def appointments(self, count, patient_ids):
+        """Agenda sin superposiciones; los pacientes frecuentes concentran más turnos"""
+        rng = self.rng
+        rows = []
+        days = self._business_days()
+        while len(rows) < count:
+            day = next(days)
+            closing = 13 * 60 if day.weekday() == 5 else 20 * 60
+            quota = rng.randint(*DAILY_QUOTA)
+            minute = 8 * 60 + _weighted(rng, GAPS)[0]
+            scheduled = 0
+            while scheduled < quota and len(rows) < count:
+                duration = _weighted(rng, DURATIONS)[0]
+                if minute + duration > closing:
+                    break
+                kind = rng.choices(APPOINTMENT_TYPES, weights=[t[1] for t in APPOINTMENT_TYPES])[0][0]
+                if day > self.today:
+                    status = rng.choices(['pending', 'confirmed', 'cancelled'], [70, 25, 5])[0]
+                else:
+                    status = rng.choices(['completed', 'cancelled', 'pending'], [82, 12, 6])[0]
+                patient_id = patient_ids[int(len(patient_ids) * rng.random() ** 2)]
+                booked = datetime.combine(day, datetime.min.time()) - timedelta(
+                    days=rng.randint(1, 21), minutes=rng.randint(0, 600))
+                booked = min(booked, self.now)
+                rows.append((
+                    patient_id, day.isoformat(), f'{minute // 60:02d}:{minute % 60:02d}', kind,
+                    status, None, duration, _timestamp(booked), _timestamp(booked)
+                ))
+                scheduled += 1
+                minute += duration + _weighted(rng, GAPS)[0]
+        rows.sort(key=lambda row: row[7])
+        return rows
+
+    def clinical_records(self, appointments):
+        """Historias, facturas, pagos y exámenes de los turnos atendidos"""
+        rng = self.rng
+        histories, invoices, exams = [], [], []
+        for appointment_id, row in appointments:
+            patient_id, day, time_value, kind, status = row[:5]
+            if status != 'completed':
+                continue
+            attended = datetime.fromisoformat(f'{day} {time_value}') + timedelta(minutes=row[6])
+            if rng.random() < 0.7:
+                histories.append((
+                    patient_id, appointment_id, rng.choice(REASONS[kind]), rng.choice(DIAGNOSES),
+                    rng.choice(TREATMENTS), None, _timestamp(attended), _timestamp(attended)
+                ))
+            if kind != 'revision' or rng.random() < 0.3:
+                low, high = dict((t[0], t[2]) for t in APPOINTMENT_TYPES)[kind]
+                # Lognormal recortada: muchos montos bajos y pocos tratamientos caros
+                amount = min(high, low * math.exp(abs(rng.gauss(0, 0.5))))
+                age = (self.today - attended.date()).days
+                weights = [90, 5, 5] if age > 30 else [60, 15, 25]
+                invoice_status = rng.choices(['paid', 'partial', 'pending'], weights)[0]
+                invoices.append((
+                    patient_id, appointment_id, f'FAC-{attended:%Y%m%d}-{len(invoices) + 1:06X}',
+                    round(amount, -2), invoice_status, _timestamp(attended), _timestamp(attended)
+                ))
+            if rng.random() < 0.08:
+                exam_status = 'completed' if (self.today - attended.date()).days > 10 else rng.choice(['pending', 'sent'])
+                exams.append((
+                    patient_id, _weighted(rng, EXAM_TYPES)[0], rng.choice(LABORATORIES), exam_status,
+                    'Sin particularidades' if exam_status == 'completed' else None, None,
+                    _timestamp(attended), _timestamp(attended)
+                ))
+        return histories, invoices, exams
+
+    def payments(self, invoices):
+        rng = self.rng
+        rows = []
+        for invoice_id, row in invoices:
+            amount, status, created = row[3], row[4], datetime.fromisoformat(row[5])
+            if status == 'pending':
+                continue
+            if status == 'partial':
+                parts = [round(amount * rng.uniform(0.3, 0.7), -2)]
+            elif rng.random() < 0.15:
+                first = round(amount * rng.uniform(0.3, 0.7), -2)
+                parts = [first, amount - first]
+            else:
+                parts = [amount]
+            paid_at = created
+            for part in parts:
+                paid_at = min(paid_at + timedelta(days=rng.choice([0, 0, 0, 1, 3, 7])), self.now)
+                rows.append((
+                    invoice_id, part, _weighted(rng, PAYMENT_METHODS)[0], None, 'completed', _timestamp(paid_at)
+                ))
+        rows.sort(key=lambda row: row[5])
+        return rows
+
+    def inventory(self, first_day):
+        """Productos y sus movimientos: consumo semanal y reposición al bajar del mínimo"""
+        rng = self.rng
+        items, movements = [], []
+        weeks = max((self.today - first_day).days // 7, 1)
+        for index, (name, category, supplier, weekly, price) in enumerate(PRODUCTS, start=1):
+            min_stock = max(2, math.ceil(weekly * 2))
+            stock = min_stock * 3
+            start = datetime.combine(first_day, datetime.min.time()) + timedelta(hours=9)
+            movements.append((index, 'entrada', stock, 'Stock inicial', _timestamp(start)))
+            for week in range(weeks):
+                moment = start + timedelta(weeks=week, days=rng.randint(0, 5), hours=rng.randint(0, 9))
+                used = min(stock, max(0, round(rng.gauss(weekly, weekly / 3))))
+                if used:
+                    stock -= used
+                    movements.append((index, 'salida', used, 'Consumo semanal', _timestamp(moment)))
+                if stock < min_stock:
+                    restock = min_stock * 3 - stock
+                    stock += restock
+                    movements.append((index, 'entrada', restock, f'Compra a {supplier}',
+                                      _timestamp(moment + timedelta(days=1))))
+            items.append((name, None, category, supplier, stock, min_stock, price))
+        movements.sort(key=lambda row: row[4])
+        return items, movements
+
+
+def generate(db_path, patients=DEFAULT_PATIENTS, appointments=DEFAULT_APPOINTMENTS, seed=DEFAULT_SEED):
+    """Crea el esquema en db_path y lo llena con datos generados; devuelve las filas por tabla"""
+    import api_server
+
+    api_server.DATABASE = db_path
+    api_server.init_database()
+    conn = api_server.get_db_connection()
+    generator = DataGenerator(seed)
+
+    appointment_rows = generator.appointments(appointments, list(range(1, patients + 1)))
+    first_day = date.fromisoformat(min(row[1] for row in appointment_rows)) if appointment_rows else generator.today
+    patient_rows = generator.patients(patients, first_day - timedelta(days=30))
+    # Los pacientes se insertan por fecha de alta para que los ids sigan el orden de registro
+    patient_rows.sort(key=lambda row: row[11])
+    patient_ids = _insert(conn, '''
+        INSERT INTO patients (name, email, phone, dni, birth_date, gender, address, blood_type,
+                              allergies, chronic_diseases, current_medications, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', patient_rows)
+    # Las citas se generaron con ids 1..N: se traducen a los ids reales
+    appointment_rows = [(patient_ids[row[0] - 1],) + row[1:] for row in appointment_rows]
+    appointment_ids = _insert(conn, '''
+        INSERT INTO appointments (patient_id, date, time, type, status, notes, duration, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', appointment_rows)
+
+    histories, invoices, exams = generator.clinical_records(list(zip(appointment_ids, appointment_rows)))
+    _insert(conn, '''
+        INSERT INTO clinical_histories (patient_id, appointment_id, reason, diagnosis, treatment,
+                                        observations, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', histories)
+    invoices.sort(key=lambda row: row[5])
+    invoice_ids = _insert(conn, '''
+        INSERT INTO invoices (patient_id, appointment_id, invoice_number, total_amount, status, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', invoices)
+    payments = generator.payments(list(zip(invoice_ids, invoices)))
+    _insert(conn, '''
+        INSERT INTO payments (invoice_id, amount, payment_method, reference, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', payments)
+    _insert(conn, '''
+        INSERT INTO exams (patient_id, exam_type, laboratory, status, results, notes, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', exams)
+    items, movements = generator.inventory(first_day)
+    item_ids = _insert(conn, '''
+        INSERT INTO inventory (name, description, category, supplier, current_stock, min_stock, unit_price)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', items)
+    movements = [(item_ids[row[0] - 1],) + row[1:] for row in movements]
+    _insert(conn, '''
+        INSERT INTO inventory_movements (inventory_id, movement_type, quantity, reason, created_at, movement_date)
+        VALUES (?1, ?2, ?3, ?4, ?5, DATE(?5))
+    ''', movements)
+
+    conn.execute('ANALYZE')
+    conn.close()
+    return {
+        'patients': len(patient_ids), 'appointments': len(appointment_ids),
+        'clinical_histories': len(histories), 'invoices': len(invoice_ids),
+        'payments': len(payments), 'exams': len(exams),
+        'inventory': len(item_ids), 'inventory_movements': len(movements),
+    }
+
+
+# === CARGA DE TRABAJO ===
+class Workload:
+    """Parámetros de las peticiones tomados de la base (ids, nombres y fechas existentes)"""
+
+    def __init__(self, max_patient_id, name_prefixes, first_day, today=None):
+        self.max_patient_id = max(max_patient_id, 1)
+        self.name_prefixes = name_prefixes or ['mar']
+        self.first_day = first_day or date.today()
+        self.today = today or date.today()
+
+    @classmethod
+    def from_database(cls, db_path):
+        import sqlite3
+        conn = sqlite3.connect(db_path)
+        try:
+            max_patient_id = conn.execute('SELECT COALESCE(MAX(id), 1) FROM patients').fetchone()[0]
+            names = [row[0] for row in conn.execute('SELECT name FROM patients ORDER BY id LIMIT 500')]
+            first_day = conn.execute('SELECT MIN(date) FROM appointments').fetchone()[0]
+        finally:
+            conn.close()
+        prefixes = sorted({_ascii(part)[:4] for name in names for part in name.split() if len(part) >= 4})
+        return cls(max_patient_id, prefixes, date.fromisoformat(first_day) if first_day else None)
+
+    def patient_id(self, rng):
+        return 1 + int(self.max_patient_id * rng.random() ** 2)
+
+    def future_day(self, rng, days=FUTURE_DAYS):
+        return (self.today + timedelta(days=rng.randint(0, days))).isoformat()
+
+
+def _list_patients(w, rng):
+    return 'GET', '/api/patients?limit=50', None
+
+
+def _search_patients(w, rng):
+    # Lo que se escribe en el buscador: un prefijo de 2 a 4 letras
+    return 'GET', f'/api/patients/search?q={rng.choice(w.name_prefixes)[:rng.randint(2, 4)]}', None
+
+
+def _get_patient(w, rng):
+    return 'GET', f'/api/patients/{w.patient_id(rng)}', None
+
+
+def _list_appointments(w, rng):
+    return 'GET', f'/api/appointments?limit=100&since={(w.today - timedelta(days=7)).isoformat()}', None
+
+
+def _availability(w, rng):
+    day = w.future_day(rng, 14)
+    return 'GET', f'/api/appointments/availability?from={day}&to={day}&duration=30', None
+
+
+def _create_appointment(w, rng):
+    minute = rng.randrange(8 * 60, 19 * 60, 15)
+    body = {
+        'patient_id': w.patient_id(rng), 'date': w.future_day(rng), 'time': f'{minute // 60:02d}:{minute % 60:02d}',
+        'type': rng.choices([t[0] for t in APPOINTMENT_TYPES], [t[1] for t in APPOINTMENT_TYPES])[0],
+        'duration': _weighted(rng, DURATIONS)[0]
+    }
+    return 'POST', '/api/appointments', body
+
+
+def _create_patient(w, rng):
+    female = rng.random() < 0.55
+    first = rng.choice(FEMALE_NAMES if female else MALE_NAMES)
+    body = {
+        'name': f'{first} {rng.choice(LAST_NAMES)}', 'phone': f'+54 11 {rng.randint(2000, 6999)}-{rng.randint(0, 9999):04d}',
+        'gender': 'Femenino' if female else 'Masculino', 'blood_type': _weighted(rng, BLOOD_TYPES)[0]
+    }
+    return 'POST', '/api/patients', body
+
+
+def _list_invoices(w, rng):
+    return 'GET', '/api/invoices?limit=50', None
+
+
+def _stats(w, rng):
+    return 'GET', '/api/stats', None
+
+
+def _report_summary(w, rng):
+    start = max(w.first_day, w.today - timedelta(days=rng.choice([30, 90, 365])))
+    return 'GET', f'/api/reports/aggregate/summary?from={start.isoformat()}&to={w.today.isoformat()}&bucket=month', None
+
+
+def _report_revenue(w, rng):
+    return 'GET', f'/api/reports/aggregate/invoices?bucket={rng.choice(["week", "month"])}&group_by=status', None
+
+
+def _export_appointments(w, rng):
+    return 'GET', '/api/appointments?stream=1', None
+
+
+# Mezclas de tráfico: (nombre del endpoint, peso, constructor de la petición)
+MIXES = {
+    # Recepción: buscar pacientes, ver la agenda, dar turnos y cargar pacientes nuevos
+    'front-desk': [
+        ('search_patients', 25, _search_patients),
+        ('availability', 15, _availability),
+        ('get_patient', 15, _get_patient),
+        ('list_appointments', 12, _list_appointments),
+        ('stats', 10, _stats),
+        ('list_patients', 8, _list_patients),
+        ('create_appointment', 8, _create_appointment),
+        ('list_invoices', 4, _list_invoices),
+        ('create_patient', 3, _create_patient),
+    ],
+    # Administración revisando reportes y exportando
+    'reports': [
+        ('report_summary', 40, _report_summary),
+        ('report_revenue', 30, _report_revenue),
+        ('stats', 20, _stats),
+        ('export_appointments', 10, _export_appointments),
+    ],
+    'read-only': [
+        ('search_patients', 30, _search_patients),
+        ('get_patient', 25, _get_patient),
+        ('availability', 20, _availability),
+        ('list_appointments', 15, _list_appointments),
+        ('stats', 10, _stats),
+    ],
+}
+
+
+class InProcessClient:
+    """Cliente de prueba de Flask: mide el API sin red ni servidor"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body):
+        response = self.client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class HTTPClient:
+    """Conexión keep-alive a un servidor (api_server.py o gunicorn)"""
+
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.base = parsed.path.rstrip('/')
+        self.conn = None
+
+    def request(self, method, path, body):
+        if self.conn is None:
+            self.conn = HTTPConnection(self.host, self.port, timeout=30)
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.conn.request(method, self.base + path, payload, headers)
+            response = self.conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, ConnectionError):
+            self.close()
+            raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def _percentile(sorted_values, q):
+    """Percentil por rango más cercano sobre valores ya ordenados"""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(q * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def _summarize(samples, elapsed):
+    latencies = sorted(latency for latency, _ in samples)
+    statuses = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'count': len(samples),
+        'errors': sum(1 for _, status in samples if status == 'error' or status >= 500),
+        'statuses': statuses,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'p50_ms': _ms(_percentile(latencies, 0.50)),
+        'p95_ms': _ms(_percentile(latencies, 0.95)),
+        'p99_ms': _ms(_percentile(latencies, 0.99)),
+        'max_ms': _ms(latencies[-1] if latencies else None),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def run(make_client, workload, mix='front-desk', requests=2000, concurrency=4, seed=DEFAULT_SEED, warmup=100):
+    """Reproduce la mezcla con `concurrency` hilos; devuelve el resumen por endpoint"""
+    entries = MIXES[mix]
+    names = [entry[0] for entry in entries]
+    weights = [entry[1] for entry in entries]
+    builders = {entry[0]: entry[2] for entry in entries}
+
+    # Plan fijo por hilo: misma semilla => mismas peticiones en el mismo orden
+    plans = []
+    for worker in range(concurrency):
+        rng = random.Random(seed * 1000 + worker)
+        share = requests // concurrency + (1 if worker < requests % concurrency else 0)
+        plan = []
+        for _ in range(share):
+            name = rng.choices(names, weights)[0]
+            plan.append((name,) + builders[name](workload, rng))
+        plans.append(plan)
+
+    # Calentamiento (cachés de SQLite y del API) fuera de la medición
+    client = make_client()
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        name = rng.choices(names, weights)[0]
+        method, path, body = builders[name](workload, rng)
+        if method == 'GET':
+            try:
+                client.request(method, path, body)
+            except OSError:
+                pass
+    client.close()
+
+    samples = {name: [] for name in names}
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(plan):
+        client = make_client()
+        local = []
+        barrier.wait()
+        for name, method, path, body in plan:
+            started = time.perf_counter()
+            try:
+                status = client.request(method, path, body)
+            except OSError:
+                status = 'error'
+            local.append((name, time.perf_counter() - started, status))
+        client.close()
+        with lock:
+            for name, latency, status in local:
+                samples[name].append((latency, status))
+
+    threads = [threading.Thread(target=worker, args=(plan,)) for plan in plans]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    everything = [sample for values in samples.values() for sample in values]
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'total': _summarize(everything, elapsed),
+        'endpoints': {name: _summarize(values, elapsed) for name, values in samples.items() if values},
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, threshold=10.0):
+    """Líneas con la variación por endpoint y lista de endpoints cuyo p95 empeoró más del umbral"""
+    lines = [f'{"endpoint":<22} {"p50 ms":>16} {"p95 ms":>16} {"p99 ms":>16} {"req/s":>16}']
+    regressions = []
+    names = ['total'] + sorted(set(baseline['endpoints']) | set(current['endpoints']))
+    for name in names:
+        before = baseline['total'] if name == 'total' else baseline['endpoints'].get(name)
+        after = current['total'] if name == 'total' else current['endpoints'].get(name)
+        if not before or not after:
+            lines.append(f'{name:<22} (solo en {"la base" if before else "la medición nueva"})')
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+            old, new = before.get(key), after.get(key)
+            change = (new - old) / old * 100 if old and new is not None else None
+            cells.append(f'{new}' + (f' ({change:+.0f}%)' if change is not None else ''))
+            if key == 'p95_ms' and change is not None and change > threshold:
+                regressions.append(name)
+        lines.append(f'{name:<22} ' + ' '.join(f'{cell:>16}' for cell in cells))
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del API de DoctoClique')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    gen = commands.add_parser('generate', help='Genera una base de datos de prueba')
+    gen.add_argument('--db', default='bench.db')
+    gen.add_argument('--patients', type=int, default=DEFAULT_PATIENTS)
+    gen.add_argument('--appointments', type=int, default=DEFAULT_APPOINTMENTS)
+    gen.add_argument('--seed', type=int, default=DEFAULT_SEED)
+
+    bench = commands.add_parser('run', help='Reproduce una mezcla de tráfico y guarda los resultados')
+    bench.add_argument('--db', default='bench.db', help='Base usada en el modo en proceso (y para armar la carga)')
+    bench.add_argument('--url', help='Servidor a medir (p. ej. http://127.0.0.1:8000); sin --url, en proceso')
+    bench.add_argument('--mix', choices=sorted(MIXES), default='front-desk')
+    bench.add_argument('--requests', type=int, default=2000)
+    bench.add_argument('--concurrency', type=int, default=4)
+    bench.add_argument('--warmup', type=int, default=100)
+    bench.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    bench.add_argument('--output', help='Archivo JSON donde guardar los resultados')
+
+    cmp_parser = commands.add_parser('compare', help='Compara dos resultados guardados')
+    cmp_parser.add_argument('baseline')
+    cmp_parser.add_argument('current')
+    cmp_parser.add_argument('--threshold', type=float, default=10.0, help='Empeoramiento de p95 tolerado en %%')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        if os.path.exists(args.db):
+            print(f'❌ {args.db} ya existe: el generador solo escribe en una base nueva')
+            sys.exit(1)
+        started = time.perf_counter()
+        counts = generate(args.db, args.patients, args.appointments, args.seed)
+        print(f'✅ {args.db} generada en {time.perf_counter() - started:.1f}s')
+        for table, count in counts.items():
+            print(f'   {table}: {count}')
+        return
+
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        lines, regressions = compare(baseline, current, args.threshold)
+        print(f'Base: {baseline.get("commit")}  Nueva: {current.get("commit")}')
+        print('\n'.join(lines))
+        if regressions:
+            print(f'❌ p95 empeoró más de {args.threshold:.0f}% en: {", ".join(regressions)}')
+            sys.exit(1)
+        return
+
+    if not os.path.exists(args.db):
+        print(f'❌ No existe {args.db}; genérela con: python3 benchmark.py generate --db {args.db}')
+        sys.exit(1)
+    workload = Workload.from_database(args.db)
+    if args.url:
+        target = args.url
+        make_client = lambda: HTTPClient(args.url)
+    else:
+        import api_server
+        import metrics
+        api_server.DATABASE = os.path.abspath(args.db)
+        # Una línea de log por petición taparía los resultados en la terminal
+        metrics.get_logger().setLevel(logging.WARNING)
+        conn = api_server.get_db_connection()
+        api_server.availability_index.rebuild(conn)
+        conn.close()
+        target = 'in-process'
+        make_client = lambda: InProcessClient(api_server.app)
+
+    result = run(make_client, workload, args.mix, args.requests, args.concurrency, args.seed, args.warmup)
+    result = dict({
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'target': target,
+        'mix': args.mix,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'seed': args.seed,
+    }, **result)
+
+    total = result['total']
+    print(f'{target} · {args.mix} · {args.requests} peticiones · {args.concurrency} hilos')
+    print(f'{total["throughput_rps"]} req/s  p50 {total["p50_ms"]} ms  p95 {total["p95_ms"]} ms  '
+          f'p99 {total["p99_ms"]} ms  errores {total["errors"]}')
+    for name, summary in sorted(result['endpoints'].items(), key=lambda item: -item[1]['count']):
+        print(f'   {name:<22} {summary["count"]:>6}  p50 {summary["p50_ms"]:>8} ms  '
+              f'p95 {summary["p95_ms"]:>8} ms  p99 {summary["p99_ms"]:>8} ms')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f'💾 Resultados guardados en {args.output}')
+
+
+if __name__ == '__main__':
+    main()
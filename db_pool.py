@@ -0,0 +1,180 @@
+"""
+Pool de conexiones SQLite para el API de DoctoClique
+Las conexiones se abren una sola vez con PRAGMAs de rendimiento y se reutilizan entre peticiones
+"""
+
+import contextlib
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+
+import metrics
+
+# PRAGMAs aplicados a cada conexión nueva
+PRAGMAS = [
+    # WAL: los lectores no bloquean al escritor ni al revés (persistente en el archivo)
+    ('journal_mode', 'WAL'),
+    # Con WAL, NORMAL solo sincroniza en los checkpoints y sigue siendo consistente
+    ('synchronous', 'NORMAL'),
+    # Negativo = KiB; ~32 MB de caché de páginas por conexión
+    ('cache_size', '-32000'),
+    # 256 MB del archivo mapeado en memoria
+    ('mmap_size', '268435456'),
+    ('temp_store', 'MEMORY'),
+    # Espera al lock de escritura en vez de fallar con "database is locked"
+    ('busy_timeout', '5000'),
+]
+
+# Conexiones ociosas que se conservan por proceso
+POOL_SIZE = 16
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor que suma el tiempo de SQL y las filas leídas a la petición en curso"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.add_sql(time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.add_sql(time.perf_counter() - started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        metrics.add_sql(time.perf_counter() - started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        metrics.add_sql(time.perf_counter() - started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        metrics.add_sql(time.perf_counter() - started, len(rows))
+        return rows
+
+
+class TimedConnection(sqlite3.Connection):
+    """Conexión cuyos atajos execute/executemany usan TimedCursor"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connect(database):
+    """Abre una conexión nueva con los PRAGMAs del pool"""
+    conn = sqlite3.connect(database, check_same_thread=False, factory=TimedConnection)
+    conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+def connect_readonly(database):
+    """Conexión de solo lectura (mode=ro): no puede escribir ni tomar el lock de escritura"""
+    uri = pathlib.Path(database).resolve().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=TimedConnection)
+    conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS:
+        # journal_mode ya quedó en WAL en el archivo y synchronous solo afecta a las escrituras
+        if name not in ('journal_mode', 'synchronous'):
+            conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+@contextlib.contextmanager
+def read_snapshot(conn):
+    """Todas las lecturas dentro del bloque ven la misma instantánea (anidable: reusa la transacción abierta)"""
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute('BEGIN')
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+
+
+@contextlib.contextmanager
+def write_transaction(conn):
+    """Transacción de escritura (BEGIN IMMEDIATE); dentro de una ya abierta (lote del escritor) se suma a ella"""
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+class ConnectionPool:
+    """Pool de conexiones reutilizables para una base de datos y un proceso"""
+
+    def __init__(self, database, size=POOL_SIZE):
+        self.database = database
+        self.size = size
+        # Tras un fork (gunicorn --preload) las conexiones del padre no se comparten
+        self.pid = os.getpid()
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Entrega una conexión ociosa o abre una nueva si no hay"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return connect(self.database)
+
+    def release(self, conn):
+        """Devuelve la conexión al pool descartando cualquier transacción a medias"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """Cierra todas las conexiones ociosas"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(database):
+    """Pool del proceso actual para la base de datos indicada"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.database != database or _pool.pid != os.getpid():
+            if _pool is not None and _pool.pid == os.getpid():
+                _pool.close()
+            _pool = ConnectionPool(database)
+        return _pool
@@ -0,0 +1,144 @@
+"""
+Feed de cambios en tiempo real (Server-Sent Events) para los paneles de DoctoClique
+Los triggers de la migración 3 anotan cada escritura en change_events; aquí se leen y se envían
+"""
+
+import json
+import threading
+import time
+
+from query_builder import LIST_RESOURCES, build_list_query
+
+# Tablas publicadas en el feed
+EVENT_TABLES = (
+    'patients', 'appointments', 'clinical_histories', 'invoices',
+    'payments', 'inventory', 'exams',
+    'inventory_movements', 'inventory_categories', 'inventory_suppliers'
+)
+
+# Cada cuánto se revisa change_events si nadie avisó (escrituras de otros procesos)
+POLL_INTERVAL = 1.0
+# Comentario SSE para mantener viva la conexión a través de proxies
+HEARTBEAT_INTERVAL = 15.0
+# Eventos leídos por consulta
+EVENT_BATCH_SIZE = 100
+# Días que se conservan los eventos (un cliente más atrasado debe recargar todo)
+EVENT_RETENTION_DAYS = 7
+
+
+class EventBroker:
+    """Despierta a los clientes SSE de este proceso cuando hubo una escritura"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._generation = 0
+
+    def notify(self):
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    def wait(self, generation, timeout):
+        """Espera hasta que cambie la generación o venza el timeout; devuelve la actual"""
+        with self._condition:
+            if self._generation == generation:
+                self._condition.wait(timeout)
+            return self._generation
+
+    @property
+    def generation(self):
+        with self._condition:
+            return self._generation
+
+
+def last_event_id(conn):
+    """Id del evento más reciente (los clientes nuevos empiezan desde aquí)"""
+    return conn.execute('SELECT COALESCE(MAX(id), 0) FROM change_events').fetchone()[0]
+
+
+def fetch_events(conn, after_id, tables=EVENT_TABLES, limit=EVENT_BATCH_SIZE):
+    """Eventos posteriores a after_id, con la fila actual para inserts y updates"""
+    placeholders = ', '.join('?' for _ in tables)
+    rows = conn.execute(f'''
+        SELECT id, table_name, operation, row_id, created_at
+        FROM change_events
+        WHERE id > ? AND table_name IN ({placeholders})
+        ORDER BY id
+        LIMIT ?
+    ''', (after_id, *tables, limit)).fetchall()
+
+    events = []
+    for event_id, table, operation, row_id, created_at in rows:
+        event = {
+            'id': event_id, 'table': table, 'operation': operation,
+            'row_id': row_id, 'created_at': created_at, 'row': None
+        }
+        if operation != 'delete':
+            event['row'] = fetch_row(conn, table, row_id)
+        events.append(event)
+    return events
+
+
+def fetch_row(conn, table, row_id):
+    """Estado actual de una fila con las mismas columnas que su listado"""
+    resource = LIST_RESOURCES[table]
+    query = build_list_query(table, {}, f'{resource.alias}.id = ?', (row_id,))
+    row = conn.execute(query.sql, query.params).fetchone()
+    if row is None:
+        return None
+    return dict(zip(query.columns, tuple(row)[:len(query.columns)]))
+
+
+def prune(conn, days=EVENT_RETENTION_DAYS):
+    """Borra los eventos más viejos que la retención (conserva el último de cada tabla)"""
+    # El último id por tabla es la versión que usa response_cache: nunca debe retroceder
+    condition = '''
+        created_at < DATETIME('now', ?)
+        AND id NOT IN (SELECT MAX(id) FROM change_events GROUP BY table_name)
+    '''
+    params = (f'-{int(days)} days',)
+    pruned = conn.execute(f'SELECT MAX(id) FROM change_events WHERE {condition}', params).fetchone()[0]
+    if pruned is not None:
+        # /api/sync rechaza a los clientes que quedaron detrás de lo borrado
+        conn.execute('''
+            INSERT INTO change_log_state (name, value) VALUES ('pruned_through', ?)
+            ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value)
+        ''', (pruned,))
+        conn.execute(f'DELETE FROM change_events WHERE {condition}', params)
+    conn.commit()
+
+
+def format_event(event, dumps=json.dumps):
+    """Serializa un evento en el formato de texto de SSE"""
+    return f"id: {event['id']}\nevent: {event['table']}\ndata: {dumps(event)}\n\n"
+
+
+def stream_events(acquire, release, broker, after_id, tables=EVENT_TABLES, dumps=json.dumps):
+    """Generador SSE: envía los eventos pendientes y espera los siguientes"""
+    def read(query, *args):
+        # La conexión se toma del pool solo para cada lectura: un cliente esperando no retiene ninguna
+        conn = acquire()
+        try:
+            return query(conn, *args)
+        finally:
+            release(conn)
+
+    # Le indica al navegador cuánto esperar antes de reconectar
+    yield 'retry: 3000\n\n'
+    if after_id is None:
+        after_id = read(last_event_id)
+    last_sent = time.monotonic()
+    generation = broker.generation
+    while True:
+        events = read(fetch_events, after_id, tables)
+        for event in events:
+            after_id = event['id']
+            yield format_event(event, dumps)
+        if events:
+            last_sent = time.monotonic()
+            if len(events) == EVENT_BATCH_SIZE:
+                continue
+        elif time.monotonic() - last_sent >= HEARTBEAT_INTERVAL:
+            yield ': keep-alive\n\n'
+            last_sent = time.monotonic()
+        generation = broker.wait(generation, POLL_INTERVAL)
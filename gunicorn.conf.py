@@ -0,0 +1,66 @@
+"""
+Configuración de gunicorn para el API de DoctoClique
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Variables de entorno:
+  DOCTOCLIQUE_BIND          dirección de escucha (0.0.0.0:5001)
+  DOCTOCLIQUE_WORKER_CLASS  gthread (por defecto), sync o gevent
+  DOCTOCLIQUE_WORKERS       procesos (por defecto según la clase y los núcleos)
+  DOCTOCLIQUE_THREADS       hilos por proceso con gthread
+  DOCTOCLIQUE_DATABASE      ruta de la base SQLite (la lee wsgi.py)
+  DOCTOCLIQUE_REPORT_RUNNER '0' por defecto: los reportes los calcula `python3 report_jobs.py` aparte
+"""
+
+import multiprocessing
+import os
+
+cores = multiprocessing.cpu_count()
+
+bind = os.environ.get('DOCTOCLIQUE_BIND', '0.0.0.0:5001')
+worker_class = os.environ.get('DOCTOCLIQUE_WORKER_CLASS', 'gthread')
+
+if worker_class == 'sync':
+    # Un proceso por petición en curso: cada cliente SSE ocupa un worker entero
+    default_workers = cores * 2 + 1
+    default_threads = 1
+elif worker_class == 'gevent':
+    # Se parchea antes de cargar la app (preload) para que locks y sockets cooperen
+    from gevent import monkey
+    monkey.patch_all()
+    default_workers = cores
+    default_threads = 1
+    worker_connections = 1000
+else:
+    # SQLite admite un solo escritor: más procesos no escalan las escrituras, los hilos sí esperan I/O
+    default_workers = cores + 1
+    default_threads = 8
+
+workers = int(os.environ.get('DOCTOCLIQUE_WORKERS', default_workers))
+threads = int(os.environ.get('DOCTOCLIQUE_THREADS', default_threads))
+
+# La app y el esquema (migraciones, índice de disponibilidad) se cargan una vez en el master
+preload_app = True
+
+# Recarga sin cortar: ante HUP o al reciclar, los workers terminan lo que atienden
+graceful_timeout = 30
+timeout = 60
+keepalive = 5
+# Reciclar workers de a poco evita que crezca la memoria sin reiniciar todos a la vez
+max_requests = 10000
+max_requests_jitter = 1000
+
+# Cada petición ya queda en el log estructurado (metrics.py); solo se conservan los errores
+accesslog = None
+errorlog = '-'
+loglevel = 'info'
+
+
+def when_ready(server):
+    import metrics
+    metrics.log_event('gunicorn_ready', bind=bind, worker_class=worker_class, workers=workers, threads=threads)
+
+
+def post_fork(server, worker):
+    # El pool de conexiones y el hilo del log se recrean solos al detectar el nuevo pid
+    import metrics
+    metrics.log_event('worker_started', pid=worker.pid)
@@ -0,0 +1,292 @@
+"""
+Inventario de DoctoClique: artículos, categorías, proveedores y movimientos de stock
+El stock solo cambia a través de movimientos: cada uno actualiza current_stock y se anota en
+inventory_movements dentro de la misma transacción, así dos salidas simultáneas no se pisan
+"""
+
+import sqlite3
+from datetime import date, datetime
+
+from db_pool import write_transaction
+
+# Tipo de movimiento -> signo sobre el stock (los ajustes llevan el signo en la cantidad)
+MOVEMENT_TYPES = {'entrada': 1, 'salida': -1, 'ajuste': None}
+
+# Misma condición que el índice parcial idx_inventory_low_stock (migración 7)
+LOW_STOCK_CONDITION = 'inv.current_stock <= inv.min_stock'
+
+# Productos que carga /api/inventory/initialize-products:
+# (código, nombre, categoría, proveedor, stock inicial, stock mínimo, precio)
+BASIC_PRODUCTS = [
+    ('DES-001', 'Guantes de látex (caja x100)', 'Descartables', 'Medix', 20, 10, 9500),
+    ('DES-002', 'Guantes de nitrilo (caja x100)', 'Descartables', 'Medix', 15, 8, 12000),
+    ('DES-003', 'Barbijos (caja x50)', 'Descartables', 'Medix', 12, 6, 6000),
+    ('DES-004', 'Baberos descartables (x500)', 'Descartables', 'Dental Sur', 4, 2, 15000),
+    ('DES-005', 'Eyectores de saliva (x100)', 'Descartables', 'Dental Sur', 8, 4, 4500),
+    ('ANE-001', 'Anestesia lidocaína 2% (x50)', 'Anestesia', 'Farmadental', 6, 3, 38000),
+    ('ANE-002', 'Anestesia articaína 4% (x50)', 'Anestesia', 'Farmadental', 4, 2, 52000),
+    ('ANE-003', 'Agujas cortas 30G (x100)', 'Anestesia', 'Farmadental', 6, 3, 11000),
+    ('RES-001', 'Resina compuesta A2', 'Restauración', 'Odontomarket', 8, 4, 27000),
+    ('RES-002', 'Resina compuesta A3', 'Restauración', 'Odontomarket', 6, 3, 27000),
+    ('RES-003', 'Ácido grabador', 'Restauración', 'Odontomarket', 4, 2, 8000),
+    ('RES-004', 'Adhesivo universal', 'Restauración', 'Odontomarket', 3, 2, 45000),
+    ('RES-005', 'Ionómero de vidrio', 'Restauración', 'Odontomarket', 3, 2, 33000),
+    ('END-001', 'Limas K (x6)', 'Endodoncia', 'Endo Store', 8, 4, 9800),
+    ('END-002', 'Conos de gutapercha', 'Endodoncia', 'Endo Store', 4, 2, 14000),
+    ('END-003', 'Hipoclorito de sodio 1L', 'Endodoncia', 'Endo Store', 4, 2, 3500),
+    ('PRO-001', 'Pasta profiláctica', 'Profilaxis', 'Dental Sur', 4, 2, 7200),
+    ('PRO-002', 'Flúor gel', 'Profilaxis', 'Dental Sur', 3, 2, 6800),
+    ('CIR-001', 'Hilo de sutura 4-0', 'Cirugía', 'Medix', 4, 2, 16000),
+    ('IMP-001', 'Alginato 450g', 'Impresión', 'Odontomarket', 4, 2, 11500),
+]
+
+
+class InventoryError(ValueError):
+    """Operación de inventario inválida; status es el código HTTP con que se responde"""
+
+    status = 400
+
+
+class NotFound(InventoryError):
+    status = 404
+
+
+class Conflict(InventoryError):
+    status = 409
+
+
+class InsufficientStock(Conflict):
+    """Una salida o ajuste dejaría el stock en negativo"""
+
+    def __init__(self, current_stock):
+        super().__init__('Stock insuficiente para el movimiento')
+        self.current_stock = current_stock
+
+
+def _integer(value, name, minimum=None):
+    """Entero de un campo del cuerpo (acepta '3' de los formularios) o InventoryError"""
+    try:
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError(value)
+        number = int(value)
+    except (TypeError, ValueError):
+        raise InventoryError(f'El campo "{name}" debe ser un entero')
+    if minimum is not None and number < minimum:
+        raise InventoryError(f'El campo "{name}" debe ser mayor o igual a {minimum}')
+    return number
+
+
+def _optional(data, name):
+    """Valor del campo, con '' (select vacío del formulario) como ausente"""
+    value = data.get(name)
+    return None if value == '' else value
+
+
+def _parse_date(value):
+    if not value:
+        return date.today().isoformat()
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+    except (TypeError, ValueError):
+        raise InventoryError('El campo "movement_date" debe tener formato YYYY-MM-DD')
+
+
+# Tablas de categorías y proveedores -> (campo del id, mensaje si no existe, mensaje si se repite)
+NAMED_TABLES = {
+    'inventory_categories': ('category_id', 'Categoría no encontrada', 'Ya existe una categoría con ese nombre'),
+    'inventory_suppliers': ('supplier_id', 'Proveedor no encontrado', 'Ya existe un proveedor con ese nombre'),
+}
+
+
+def _named_id(conn, table, row_id, name):
+    """(id, nombre) de una categoría o proveedor, por id o por nombre (se crea si no existe)"""
+    id_field, not_found, _ = NAMED_TABLES[table]
+    if row_id is not None:
+        row = conn.execute(f'SELECT id, name FROM {table} WHERE id = ?', (_integer(row_id, id_field),)).fetchone()
+        if row is None:
+            raise NotFound(not_found)
+        return row[0], row[1]
+    if not name:
+        return None, None
+    conn.execute(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', (name,))
+    return conn.execute(f'SELECT id FROM {table} WHERE name = ?', (name,)).fetchone()[0], name
+
+
+def _apply_movement(conn, item_id, movement_type, quantity, reason, movement_date):
+    """Mueve el stock y anota el movimiento; debe llamarse con el lock de escritura tomado"""
+    delta = quantity if movement_type == 'ajuste' else MOVEMENT_TYPES[movement_type] * quantity
+    # La condición y la suma van en el mismo UPDATE: no hay lectura previa que pueda quedar vieja
+    row = conn.execute('''
+        UPDATE inventory SET current_stock = current_stock + ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND current_stock + ? >= 0
+        RETURNING current_stock
+    ''', (delta, item_id, delta)).fetchall()
+    if not row:
+        current = conn.execute('SELECT current_stock FROM inventory WHERE id = ?', (item_id,)).fetchone()
+        if current is None:
+            raise NotFound('Item de inventario no encontrado')
+        raise InsufficientStock(current[0])
+    stock_after = row[0][0]
+    cursor = conn.execute('''
+        INSERT INTO inventory_movements (inventory_id, movement_type, quantity, reason, movement_date, stock_after)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (item_id, movement_type, quantity, reason, movement_date, stock_after))
+    return cursor.lastrowid, stock_after
+
+
+def _transaction(conn, operation, *args):
+    with write_transaction(conn):
+        return operation(conn, *args)
+
+
+def record_movement(conn, data):
+    """Registra una entrada, salida o ajuste; devuelve (id del movimiento, stock resultante)"""
+    item_id = _integer(data.get('item_id', data.get('inventory_id')), 'item_id')
+    movement_type = data.get('movement_type')
+    if movement_type not in MOVEMENT_TYPES:
+        raise InventoryError('El campo "movement_type" debe ser entrada, salida o ajuste')
+    if movement_type == 'ajuste':
+        quantity = _integer(data.get('quantity'), 'quantity')
+        if quantity == 0:
+            raise InventoryError('Un ajuste debe tener cantidad distinta de cero')
+    else:
+        quantity = _integer(data.get('quantity'), 'quantity', minimum=1)
+    movement_date = _parse_date(data.get('movement_date'))
+    return _transaction(
+        conn, _apply_movement, item_id, movement_type, quantity, data.get('reason'), movement_date
+    )
+
+
+def _create_item(conn, data):
+    if not data.get('name'):
+        raise InventoryError('Falta el campo obligatorio: name')
+    category_id, category = _named_id(
+        conn, 'inventory_categories', _optional(data, 'category_id'), _optional(data, 'category')
+    )
+    supplier_id, supplier = _named_id(
+        conn, 'inventory_suppliers', _optional(data, 'supplier_id'), _optional(data, 'supplier')
+    )
+    stock = _integer(data.get('current_stock') or 0, 'current_stock', minimum=0)
+    min_stock = data.get('min_stock')
+    try:
+        # El item nace sin stock: el inicial entra como movimiento para que el historial cuadre
+        cursor = conn.execute('''
+            INSERT INTO inventory (code, name, description, category, category_id, supplier, supplier_id,
+                                   current_stock, min_stock, unit_price)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+        ''', (
+            _optional(data, 'code'), data['name'], data.get('description'), category, category_id,
+            supplier, supplier_id, 5 if min_stock is None else _integer(min_stock, 'min_stock', minimum=0),
+            data.get('unit_price')
+        ))
+    except sqlite3.IntegrityError:
+        raise Conflict(f'Ya existe un item con el código {data.get("code")}')
+    item_id = cursor.lastrowid
+    if stock:
+        _apply_movement(conn, item_id, 'entrada', stock, 'Stock inicial', date.today().isoformat())
+    return item_id
+
+
+def create_item(conn, data):
+    """Crea un item (categoría y proveedor por id o por nombre); devuelve su id"""
+    return _transaction(conn, _create_item, data)
+
+
+# Columnas que se actualizan tal cual vienen en el cuerpo del PUT
+ITEM_FIELDS = ('code', 'name', 'description', 'min_stock', 'unit_price')
+
+
+def _update_item(conn, item_id, data):
+    row = conn.execute('SELECT current_stock FROM inventory WHERE id = ?', (item_id,)).fetchone()
+    if row is None:
+        raise NotFound('Item de inventario no encontrado')
+
+    assignments = []
+    params = []
+    for field in ITEM_FIELDS:
+        if field in data:
+            assignments.append(f'{field} = ?')
+            params.append(_optional(data, field))
+    for table, id_field, name_field in (
+        ('inventory_categories', 'category_id', 'category'),
+        ('inventory_suppliers', 'supplier_id', 'supplier'),
+    ):
+        if id_field in data or name_field in data:
+            related_id, name = _named_id(conn, table, _optional(data, id_field), _optional(data, name_field))
+            assignments += [f'{id_field} = ?', f'{name_field} = ?']
+            params += [related_id, name]
+    if assignments:
+        try:
+            conn.execute(
+                f'UPDATE inventory SET {", ".join(assignments)}, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                params + [item_id]
+            )
+        except sqlite3.IntegrityError:
+            raise Conflict(f'Ya existe un item con el código {data.get("code")}')
+
+    # Un current_stock explícito es un recuento físico: se anota como ajuste por la diferencia
+    if data.get('current_stock') is not None:
+        stock = _integer(data['current_stock'], 'current_stock', minimum=0)
+        if stock != row[0]:
+            _apply_movement(conn, item_id, 'ajuste', stock - row[0], 'Ajuste de stock', date.today().isoformat())
+
+
+def update_item(conn, item_id, data):
+    """Actualiza los datos del item; el stock solo cambia mediante un ajuste registrado"""
+    _transaction(conn, _update_item, item_id, data)
+
+
+def _delete_item(conn, item_id):
+    conn.execute('DELETE FROM inventory_movements WHERE inventory_id = ?', (item_id,))
+    if conn.execute('DELETE FROM inventory WHERE id = ?', (item_id,)).rowcount == 0:
+        raise NotFound('Item de inventario no encontrado')
+
+
+def delete_item(conn, item_id):
+    """Elimina el item junto con su historial de movimientos"""
+    _transaction(conn, _delete_item, item_id)
+
+
+def _create_named(conn, table, columns, data):
+    if not data.get('name'):
+        raise InventoryError('Falta el campo obligatorio: name')
+    placeholders = ', '.join('?' for _ in columns)
+    try:
+        cursor = conn.execute(
+            f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders})',
+            [data.get(column) for column in columns]
+        )
+    except sqlite3.IntegrityError:
+        raise Conflict(NAMED_TABLES[table][2])
+    return cursor.lastrowid
+
+
+def create_category(conn, data):
+    return _transaction(conn, _create_named, 'inventory_categories', ('name', 'description'), data)
+
+
+def create_supplier(conn, data):
+    return _transaction(
+        conn, _create_named, 'inventory_suppliers', ('name', 'contact', 'phone', 'email', 'address'), data
+    )
+
+
+def _initialize_products(conn):
+    existing = set()
+    for code, name in conn.execute('SELECT code, name FROM inventory'):
+        existing.update((code, name))
+    created = 0
+    for code, name, category, supplier, stock, min_stock, price in BASIC_PRODUCTS:
+        if code in existing or name in existing:
+            continue
+        _create_item(conn, {
+            'code': code, 'name': name, 'category': category, 'supplier': supplier,
+            'current_stock': stock, 'min_stock': min_stock, 'unit_price': price
+        })
+        created += 1
+    return created
+
+
+def initialize_products(conn):
+    """Carga los productos básicos que falten (por código o nombre); devuelve cuántos creó"""
+    return _transaction(conn, _initialize_products)
@@ -0,0 +1,309 @@
+"""
+Instrumentación de los servidores de DoctoClique
+Histogramas de latencia por ruta, tiempo de SQL y de serialización por petición, y log
+estructurado (JSON por línea) escrito en segundo plano; todo se publica en /metrics
+con el formato de texto de Prometheus
+"""
+
+import atexit
+import bisect
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites superiores (segundos) de los buckets de latencia
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+# Límites superiores de los buckets de filas leídas por respuesta
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+# Percentiles que se publican por ruta
+QUANTILES = (0.5, 0.95, 0.99)
+
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos (mismo modelo que Prometheus)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Un contador por bucket más el de +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimación del percentil interpolando dentro del bucket (como histogram_quantile)"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Registry:
+    """Métricas de un proceso: histogramas y contadores con etiquetas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # nombre -> (tipo, ayuda, buckets)
+        self._meta = {}
+        # nombre -> {etiquetas (tupla ordenada): Histogram | float}
+        self._series = {}
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self._meta[name] = ('histogram', help_text, buckets)
+        self._series.setdefault(name, {})
+
+    def counter(self, name, help_text):
+        self._meta[name] = ('counter', help_text, None)
+        self._series.setdefault(name, {})
+
+    def gauge(self, name, help_text):
+        self._meta[name] = ('gauge', help_text, None)
+        self._series.setdefault(name, {})
+
+    def observe(self, name, labels, value):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self._meta[name][2])
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series[name]
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, labels, value):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[name][key] = value
+
+    def quantiles(self, name, labels, quantiles=QUANTILES):
+        """{percentil: segundos} de una serie (None si no hay observaciones)"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = self._series[name].get(key)
+            if histogram is None:
+                return {q: None for q in quantiles}
+            return {q: histogram.quantile(q) for q in quantiles}
+
+    def render(self):
+        """Texto de exposición de Prometheus (versión 0.0.4)"""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, buckets) in self._meta.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                series = self._series[name]
+                for key in sorted(series):
+                    value = series[key]
+                    if kind != 'histogram':
+                        lines.append(f'{name}{_labels(key)} {_number(value)}')
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets, value.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_labels(key, le=_number(bound))} {cumulative}')
+                    lines.append(f'{name}_bucket{_labels(key, le="+Inf")} {value.count}')
+                    lines.append(f'{name}_sum{_labels(key)} {_number(value.sum)}')
+                    lines.append(f'{name}_count{_labels(key)} {value.count}')
+                if kind == 'histogram' and name == REQUEST_SECONDS:
+                    lines.extend(self._render_quantiles(name, series))
+        return '\n'.join(lines) + '\n'
+
+    def _render_quantiles(self, name, series):
+        # p50/p95/p99 estimados, como summary aparte para consultarlos sin PromQL
+        summary = f'{name.removesuffix("_seconds")}_quantile_seconds'
+        lines = [
+            f'# HELP {summary} Percentiles de latencia estimados a partir del histograma',
+            f'# TYPE {summary} summary'
+        ]
+        for key in sorted(series):
+            histogram = series[key]
+            for q in QUANTILES:
+                lines.append(f'{summary}{_labels(key, quantile=str(q))} {_number(histogram.quantile(q))}')
+            lines.append(f'{summary}_sum{_labels(key)} {_number(histogram.sum)}')
+            lines.append(f'{summary}_count{_labels(key)} {histogram.count}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(key, **extra):
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+# Nombres de las métricas de peticiones (comunes a api_server.py y serve_replica.py)
+REQUEST_SECONDS = 'doctoclique_request_duration_seconds'
+SQL_SECONDS = 'doctoclique_request_sql_seconds'
+SERIALIZE_SECONDS = 'doctoclique_request_serialize_seconds'
+ROWS = 'doctoclique_request_rows'
+REQUESTS = 'doctoclique_requests_total'
+
+REGISTRY = Registry()
+REGISTRY.histogram(REQUEST_SECONDS, 'Duración de la petición hasta entregar la respuesta')
+REGISTRY.histogram(SQL_SECONDS, 'Tiempo en SQLite (execute y fetch) por petición')
+REGISTRY.histogram(SERIALIZE_SECONDS, 'Tiempo serializando JSON por petición')
+REGISTRY.histogram(ROWS, 'Filas leídas de SQLite por petición', ROW_BUCKETS)
+REGISTRY.counter(REQUESTS, 'Peticiones atendidas por ruta, método y estado')
+
+
+class RequestStats:
+    """Tiempos acumulados durante una petición"""
+
+    __slots__ = ('started', 'sql', 'serialize', 'rows')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql = 0.0
+        self.serialize = 0.0
+        self.rows = 0
+
+
+# Petición en curso del hilo (o greenlet) actual
+_current = contextvars.ContextVar('doctoclique_request_stats', default=None)
+
+
+def begin_request():
+    """Empieza a medir una petición; devuelve el token para end_request"""
+    return _current.set(RequestStats())
+
+
+def current_request():
+    return _current.get()
+
+
+def end_request(token, route, method, status, path=None):
+    """Registra la petición en los histogramas y en el log estructurado"""
+    stats = _current.get()
+    _current.reset(token)
+    if stats is None:
+        return
+    duration = time.perf_counter() - stats.started
+    labels = {'route': route, 'method': method}
+    REGISTRY.observe(REQUEST_SECONDS, labels, duration)
+    REGISTRY.inc(REQUESTS, dict(labels, status=str(status)))
+    if stats.sql or stats.rows:
+        REGISTRY.observe(SQL_SECONDS, labels, stats.sql)
+        REGISTRY.observe(ROWS, labels, stats.rows)
+    if stats.serialize:
+        REGISTRY.observe(SERIALIZE_SECONDS, labels, stats.serialize)
+    log_event(
+        'request', method=method, route=route, path=path, status=status,
+        duration_ms=round(duration * 1000, 3), sql_ms=round(stats.sql * 1000, 3),
+        serialize_ms=round(stats.serialize * 1000, 3), rows=stats.rows
+    )
+
+
+def add_sql(seconds, rows=0):
+    stats = _current.get()
+    if stats is not None:
+        stats.sql += seconds
+        stats.rows += rows
+
+
+@contextmanager
+def timing_serialize():
+    """Suma al tiempo de serialización de la petición lo que tarde el bloque"""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serialize += time.perf_counter() - started
+
+
+# === LOG ESTRUCTURADO ===
+class JSONFormatter(logging.Formatter):
+    """Una línea JSON por registro con los campos pasados en extra={'fields': ...}"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_logger = None
+_listener = None
+# Proceso que creó el hilo escritor (tras un fork de gunicorn el hilo no existe en el hijo)
+_logger_pid = None
+_logger_lock = threading.Lock()
+
+
+def get_logger(stream=None):
+    """Logger 'doctoclique': los registros se encolan y un hilo aparte los escribe"""
+    global _logger, _listener, _logger_pid
+    with _logger_lock:
+        if _logger is not None and _logger_pid == os.getpid():
+            return _logger
+        level = _logger.level if _logger is not None else logging.INFO
+        if _logger is not None:
+            for old_handler in list(_logger.handlers):
+                _logger.removeHandler(old_handler)
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(JSONFormatter())
+        log_queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+        _listener.start()
+        # Se vacía la cola al salir para no perder las últimas líneas
+        atexit.register(_listener.stop)
+        logger = logging.getLogger('doctoclique')
+        logger.setLevel(level)
+        logger.propagate = False
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        _logger = logger
+        _logger_pid = os.getpid()
+        return _logger
+
+
+def log_event(event, level=logging.INFO, **fields):
+    """Encola un registro estructurado (no bloquea la petición escribiendo en disco)"""
+    get_logger().log(level, event, extra={'fields': fields})
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Migraciones versionadas del esquema de agenda.db
+La versión aplicada se guarda en PRAGMA user_version
+
+Uso:
+    python3 migrations.py                 # aplica las migraciones pendientes
+    python3 migrations.py --explain       # además verifica que ninguna consulta haga SCAN
+"""
+
+import argparse
+import sqlite3
+import sys
+
+from query_builder import LIST_RESOURCES, build_list_query, encode_cursor
+import inventory
+import patient_timeline
+import report_aggregates
+import report_jobs
+import response_cache
+import stats_cache
+import sync
+
+def _change_triggers(table):
+    """Triggers que anotan en change_events cada insert/update/delete de la tabla"""
+    statements = []
+    for operation, row in (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')):
+        statements.append(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_events_{table}_{operation}
+            AFTER {operation.upper()} ON {table} BEGIN
+                INSERT INTO change_events (table_name, operation, row_id)
+                VALUES ('{table}', '{operation}', {row}.id);
+            END''')
+    return statements
+
+
+# Cada migración es (versión, descripción, sentencias). Nunca se edita una migración
+# ya publicada: los cambios nuevos van en una versión nueva al final de la lista.
+MIGRATIONS = [
+    (1, 'Índices secundarios para JOINs, ordenamientos y filtros por fecha', [
+        'CREATE INDEX IF NOT EXISTS idx_patients_name ON patients (name)',
+        'CREATE INDEX IF NOT EXISTS idx_patients_created_at ON patients (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_appointments_date_time ON appointments (date, time)',
+        'CREATE INDEX IF NOT EXISTS idx_appointments_patient_id ON appointments (patient_id, date, time)',
+        'CREATE INDEX IF NOT EXISTS idx_clinical_histories_created_at ON clinical_histories (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_clinical_histories_patient_id ON clinical_histories (patient_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_invoices_created_at ON invoices (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_invoices_patient_id ON invoices (patient_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_invoices_status ON invoices (status, total_amount)',
+        'CREATE INDEX IF NOT EXISTS idx_payments_created_at ON payments (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_payments_invoice_id ON payments (invoice_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_name ON inventory (name)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_movements_inventory_id ON inventory_movements (inventory_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_exams_created_at ON exams (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_exams_patient_id ON exams (patient_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports (created_at)',
+    ]),
+    (2, 'Contadores del dashboard mantenidos por triggers', [
+        '''CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value REAL NOT NULL DEFAULT 0
+        )''',
+        '''CREATE TABLE IF NOT EXISTS stats_appointments_by_date (
+            date DATE PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        )''',
+        # Carga inicial con los datos existentes
+        '''INSERT OR REPLACE INTO stats_counters (name, value)
+           SELECT 'patients', COUNT(*) FROM patients''',
+        '''INSERT OR REPLACE INTO stats_counters (name, value)
+           SELECT 'appointments', COUNT(*) FROM appointments''',
+        '''INSERT OR REPLACE INTO stats_counters (name, value)
+           SELECT 'invoices', COUNT(*) FROM invoices''',
+        '''INSERT OR REPLACE INTO stats_counters (name, value)
+           SELECT 'revenue', COALESCE(SUM(total_amount), 0) FROM invoices
+           WHERE status = 'paid' ''',
+        '''INSERT OR REPLACE INTO stats_appointments_by_date (date, count)
+           SELECT date, COUNT(*) FROM appointments GROUP BY date''',
+        # Pacientes
+        '''CREATE TRIGGER IF NOT EXISTS trg_stats_patients_insert AFTER INSERT ON patients BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'patients';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_stats_patients_delete AFTER DELETE ON patients BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'patients';
+        END''',
+        # Citas (total y por fecha)
+        '''CREATE TRIGGER IF NOT EXISTS trg_stats_appointments_insert AFTER INSERT ON appointments BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'appointments';
+            INSERT INTO stats_appointments_by_date (date, count) VALUES (NEW.date, 1)
+                ON CONFLICT (date) DO UPDATE SET count = count + 1;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_stats_appointments_delete AFTER DELETE ON appointments BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'appointments';
+            UPDATE stats_appointments_by_date SET count = count - 1 WHERE date = OLD.date;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_stats_appointments_date AFTER UPDATE OF date ON appointments
+        WHEN OLD.date IS NOT NEW.date BEGIN
+            UPDATE stats_appointments_by_date SET count = count - 1 WHERE date = OLD.date;
+            INSERT INTO stats_appointments_by_date (date, count) VALUES (NEW.date, 1)
+                ON CONFLICT (date) DO UPDATE SET count = count + 1;
+        END''',
+        # Facturas (total e ingresos cobrados)
+        '''CREATE TRIGGER IF NOT EXISTS trg_stats_invoices_insert AFTER INSERT ON invoices BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'invoices';
+            UPDATE stats_counters SET value = value + NEW.total_amount
+                WHERE name = 'revenue' AND NEW.status = 'paid';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_stats_invoices_delete AFTER DELETE ON invoices BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'invoices';
+            UPDATE stats_counters SET value = value - OLD.total_amount
+                WHERE name = 'revenue' AND OLD.status = 'paid';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_stats_invoices_update AFTER UPDATE OF status, total_amount ON invoices BEGIN
+            UPDATE stats_counters SET value = value
+                - (CASE WHEN OLD.status = 'paid' THEN OLD.total_amount ELSE 0 END)
+                + (CASE WHEN NEW.status = 'paid' THEN NEW.total_amount ELSE 0 END)
+                WHERE name = 'revenue';
+        END''',
+    ]),
+    (3, 'Registro de cambios para el feed de eventos (SSE)', [
+        '''CREATE TABLE IF NOT EXISTS change_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            operation TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_change_events_created_at ON change_events (created_at)',
+    ] + [
+        statement
+        for table in ('patients', 'appointments', 'clinical_histories', 'invoices',
+                      'payments', 'inventory', 'exams')
+        for statement in _change_triggers(table)
+    ]),
+    (4, 'Duración de las citas para calcular disponibilidad', [
+        'ALTER TABLE appointments ADD COLUMN duration INTEGER DEFAULT 30',
+    ]),
+    (5, 'Búsqueda de pacientes con FTS5 (sin distinguir acentos)', [
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5 (
+            name, dni, email, phone, address,
+            content = 'patients', content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )''',
+        "INSERT INTO patients_fts (patients_fts) VALUES ('rebuild')",
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_fts_insert AFTER INSERT ON patients BEGIN
+            INSERT INTO patients_fts (rowid, name, dni, email, phone, address)
+            VALUES (NEW.id, NEW.name, NEW.dni, NEW.email, NEW.phone, NEW.address);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_fts_delete AFTER DELETE ON patients BEGIN
+            INSERT INTO patients_fts (patients_fts, rowid, name, dni, email, phone, address)
+            VALUES ('delete', OLD.id, OLD.name, OLD.dni, OLD.email, OLD.phone, OLD.address);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_patients_fts_update
+        AFTER UPDATE OF name, dni, email, phone, address ON patients BEGIN
+            INSERT INTO patients_fts (patients_fts, rowid, name, dni, email, phone, address)
+            VALUES ('delete', OLD.id, OLD.name, OLD.dni, OLD.email, OLD.phone, OLD.address);
+            INSERT INTO patients_fts (rowid, name, dni, email, phone, address)
+            VALUES (NEW.id, NEW.name, NEW.dni, NEW.email, NEW.phone, NEW.address);
+        END''',
+    ]),
+    (6, 'Versiones por tabla para la caché de respuestas (reportes en change_events)', [
+        'CREATE INDEX IF NOT EXISTS idx_change_events_table ON change_events (table_name, id)',
+    ] + _change_triggers('reports')),
+    (7, 'Inventario: categorías, proveedores, movimientos con saldo e índice de stock bajo', [
+        '''CREATE TABLE IF NOT EXISTS inventory_categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        '''CREATE TABLE IF NOT EXISTS inventory_suppliers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            contact TEXT,
+            phone TEXT,
+            email TEXT,
+            address TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        'ALTER TABLE inventory ADD COLUMN code TEXT',
+        'ALTER TABLE inventory ADD COLUMN category_id INTEGER REFERENCES inventory_categories (id)',
+        'ALTER TABLE inventory ADD COLUMN supplier_id INTEGER REFERENCES inventory_suppliers (id)',
+        'ALTER TABLE inventory_movements ADD COLUMN movement_date DATE',
+        # Stock del item después del movimiento (NULL en los movimientos anteriores)
+        'ALTER TABLE inventory_movements ADD COLUMN stock_after INTEGER',
+        # Las categorías y proveedores en texto pasan a sus tablas
+        '''INSERT OR IGNORE INTO inventory_categories (name)
+           SELECT DISTINCT category FROM inventory WHERE category IS NOT NULL AND category != '' ''',
+        '''INSERT OR IGNORE INTO inventory_suppliers (name)
+           SELECT DISTINCT supplier FROM inventory WHERE supplier IS NOT NULL AND supplier != '' ''',
+        '''UPDATE inventory SET
+            category_id = (SELECT id FROM inventory_categories c WHERE c.name = inventory.category),
+            supplier_id = (SELECT id FROM inventory_suppliers s WHERE s.name = inventory.supplier),
+            code = COALESCE(code, printf('INV-%04d', id))''',
+        'UPDATE inventory_movements SET movement_date = DATE(created_at) WHERE movement_date IS NULL',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_code ON inventory (code)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_category_id ON inventory (category_id)',
+        # Parcial: solo contiene los items en stock bajo, así que listarlos no recorre el inventario
+        '''CREATE INDEX IF NOT EXISTS idx_inventory_low_stock ON inventory (name)
+           WHERE current_stock <= min_stock''',
+        # Sin estadísticas el planificador supone que el índice parcial es tan grande como la tabla
+        'ANALYZE inventory',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_movements_created_at ON inventory_movements (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_movements_date ON inventory_movements (movement_date)',
+    ] + [
+        statement
+        for table in ('inventory_movements', 'inventory_categories', 'inventory_suppliers')
+        for statement in _change_triggers(table)
+    ]),
+    (8, 'Cola persistente de reportes en segundo plano', [
+        '''CREATE TABLE IF NOT EXISTS report_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_type TEXT NOT NULL,
+            title TEXT NOT NULL,
+            spec TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress REAL NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            claim TEXT,
+            report_id INTEGER,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            heartbeat_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            FOREIGN KEY (report_id) REFERENCES reports (id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_report_jobs_status ON report_jobs (status, id)',
+        'CREATE INDEX IF NOT EXISTS idx_report_jobs_created_at ON report_jobs (created_at)',
+    ]),
+    (9, 'Horizonte de la retención de change_events para la sincronización incremental', [
+        '''CREATE TABLE IF NOT EXISTS change_log_state (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )''',
+    ]),
+    (10, 'Índices por fecha de modificación para los listados con since', [
+        'CREATE INDEX IF NOT EXISTS idx_patients_updated_at ON patients (updated_at)',
+        'CREATE INDEX IF NOT EXISTS idx_appointments_updated_at ON appointments (updated_at)',
+        'CREATE INDEX IF NOT EXISTS idx_clinical_histories_updated_at ON clinical_histories (updated_at)',
+        'CREATE INDEX IF NOT EXISTS idx_invoices_updated_at ON invoices (updated_at)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_updated_at ON inventory (updated_at)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_movements_created_at ON inventory_movements (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_categories_updated_at ON inventory_categories (updated_at)',
+        'CREATE INDEX IF NOT EXISTS idx_inventory_suppliers_updated_at ON inventory_suppliers (updated_at)',
+        'CREATE INDEX IF NOT EXISTS idx_exams_updated_at ON exams (updated_at)',
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    """Versión del esquema aplicada a la base de datos"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Aplica en orden las migraciones pendientes, cada una en su propia transacción"""
+    current = get_version(conn)
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            conn.execute('BEGIN')
+            for statement in statements:
+                conn.execute(statement)
+            # PRAGMA no admite parámetros; version es un entero de esta lista
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            conn.execute('ROLLBACK')
+            raise
+        applied.append((version, description))
+    return applied
+
+
+# Lo que find_scans acepta en el plan de una consulta además de SEARCH
+# Recorrer un índice en el orden del listado: la primera página (LIMIT) o el listado completo
+ORDERED_SCAN = 'ordered_scan'
+# Ordenar en memoria filas ya elegidas por un índice (since: solo las modificadas)
+SORT = 'sort'
+# Recorrer una tabla de tamaño fijo (una fila por contador)
+SMALL_TABLE = 'small_table'
+
+
+def explain_queries():
+    """
+    Consultas publicadas por el API cuyo plan debe usar índices: (nombre, sql, parámetros, permitido).
+
+    permitido es el conjunto de excepciones a "solo SEARCH" que acepta cada consulta.
+    """
+    queries = []
+    for name, resource in LIST_RESOURCES.items():
+        full = build_list_query(name, {})
+        queries.append((f'{name} (listado completo)', full.sql, full.params, {ORDERED_SCAN}))
+        first_page = build_list_query(name, {'limit': '50'})
+        queries.append((f'{name} (primera página)', first_page.sql, first_page.params, {ORDERED_SCAN}))
+        cursor = encode_cursor([None] * len(resource.order))
+        next_page = build_list_query(name, {'limit': '50', 'after': cursor})
+        queries.append((f'{name} (página siguiente)', next_page.sql, next_page.params, set()))
+        changed = build_list_query(name, {'since': '2024-01-01'})
+        queries.append((f'{name} (since)', changed.sql, changed.params, {SORT}))
+        changed_page = build_list_query(name, {'since': '2024-01-01', 'limit': '50', 'after': cursor})
+        queries.append((f'{name} (since, página siguiente)', changed_page.sql, changed_page.params, {SORT}))
+
+    for name in ('appointments', 'clinical_histories', 'invoices', 'exams'):
+        resource = LIST_RESOURCES[name]
+        query = build_list_query(name, {'limit': '50'}, f'{resource.alias}.patient_id = ?', (1,))
+        queries.append((f'{name} por paciente', query.sql, query.params, set()))
+
+    movements = build_list_query('inventory_movements', {'limit': '50'}, 'm.inventory_id = ?', (1,))
+    queries.append(('inventory_movements por item', movements.sql, movements.params, set()))
+    low_stock = build_list_query('inventory', {'limit': '50'}, inventory.LOW_STOCK_CONDITION)
+    # El índice parcial solo contiene los items con stock bajo: recorrerlo no recorre la tabla
+    queries.append(('inventory con stock bajo', low_stock.sql, low_stock.params, {ORDERED_SCAN}))
+
+    payments = build_list_query('payments', {'limit': '50'}, 'p.invoice_id = ?', (1,))
+    queries.append(('payments por factura', payments.sql, payments.params, set()))
+    queries.append((
+        'ficha del paciente: pagos de las facturas',
+        f'SELECT invoice_id, {", ".join(patient_timeline.PAYMENT_COLUMNS)} FROM payments '
+        'WHERE invoice_id IN (?, ?) ORDER BY invoice_id, created_at, id',
+        (1, 2), set()
+    ))
+
+    queries.append(('cola de reportes: tomar el próximo trabajo', report_jobs.CLAIM_SQL, ('claim',), set()))
+    queries.append((
+        'sincronización: cambios desde una secuencia',
+        sync.CHANGES_SQL.format(placeholders='?, ?'), (0, 'patients', 'appointments', 101), set()
+    ))
+    queries.append((
+        'caché de respuestas: versión de una tabla', response_cache.VERSION_SQL, ('patients',), set()
+    ))
+    # stats_counters tiene una fila por contador: recorrerla entera es O(1)
+    queries.append(('stats: citas de hoy', stats_cache.TODAY_SQL, (), {SMALL_TABLE}))
+    queries.append((
+        'disponibilidad: citas del día',
+        "SELECT id, time, duration FROM appointments WHERE date = ? AND status != 'cancelled' AND id != ?",
+        ('2024-01-01', 0), set()
+    ))
+
+    for name, aggregate in report_aggregates.AGGREGATES.items():
+        conditions, params = report_aggregates.date_range_condition(
+            aggregate, {'from': '2024-01-01', 'to': '2024-12-31'}
+        )
+        sql = f'SELECT COUNT(*) FROM {aggregate.table} WHERE ' + ' AND '.join(conditions)
+        queries.append((f'agregación {name} por rango de fechas', sql, params, set()))
+    return queries
+
+
+def _plan_problem(detail, allowed):
+    """True si una línea del plan no es aceptable para la consulta"""
+    if detail.startswith('SCAN'):
+        # SCAN ... USING INDEX también recorre todo el índice: solo vale si la consulta lo permite
+        if ' USING ' in detail and 'INDEX' in detail:
+            return ORDERED_SCAN not in allowed
+        return SMALL_TABLE not in allowed
+    if 'USE TEMP B-TREE FOR ORDER BY' in detail:
+        return SORT not in allowed
+    return False
+
+
+def find_scans(conn):
+    """Devuelve las consultas cuyo plan recorre una tabla o un índice entero, u ordena en memoria"""
+    problems = []
+    for name, sql, params, allowed in explain_queries():
+        plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        for row in plan:
+            detail = row[-1]
+            if _plan_problem(detail, allowed):
+                problems.append((name, detail))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migraciones del esquema de agenda.db')
+    parser.add_argument('--db', default='agenda.db', help='ruta de la base de datos')
+    parser.add_argument('--explain', action='store_true',
+                        help='falla si alguna consulta publicada hace un SCAN completo')
+    options = parser.parse_args()
+
+    # Se importa aquí para crear las tablas base sin arrancar el servidor
+    import api_server
+    api_server.DATABASE = options.db
+    api_server.init_database()
+
+    conn = sqlite3.connect(options.db, isolation_level=None)
+    print(f"📦 Esquema en versión {get_version(conn)} (última: {SCHEMA_VERSION})")
+
+    if options.explain:
+        problems = find_scans(conn)
+        if problems:
+            print("❌ Consultas sin índice:")
+            for name, detail in problems:
+                print(f"   {name}: {detail}")
+            conn.close()
+            sys.exit(1)
+        print("✅ Todas las consultas usan índices")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+// Carga agrupada de los paneles (facturacion, historias y examenes)
+// Varias colecciones del API en una sola petición a POST /api/batch, todas leídas de la misma
+// instantánea de la base: el panel no mezcla, por ejemplo, facturas nuevas con pacientes viejos.
+
+const BATCH_URL = 'http://localhost:5001/api/batch';
+
+// Pide las colecciones (nombres como en la URL: 'patients', 'clinical-histories', ...) y devuelve
+// un objeto { colección: filas }. Falla si el lote o alguna de sus consultas no responde 200.
+async function fetchBatch(collections) {
+    const response = await fetch(BATCH_URL, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(collections.map(name => ({ id: name, path: `/api/${name}` })))
+    });
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+    }
+    const { results } = await response.json();
+    const data = {};
+    results.forEach(result => {
+        if (result.status !== 200) {
+            throw new Error(`${result.id}: HTTP ${result.status}`);
+        }
+        data[result.id] = result.body;
+    });
+    return data;
+}
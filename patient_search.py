@@ -0,0 +1,43 @@
+"""
+Búsqueda de pacientes por nombre, DNI, email, teléfono o dirección
+Usa la tabla FTS5 patients_fts (migración 5): prefijos, sin distinguir acentos, ordenada por relevancia
+"""
+
+import re
+
+from query_builder import QueryError
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Columnas devueltas (suficientes para un autocompletado)
+SEARCH_COLUMNS = ['id', 'name', 'dni', 'email', 'phone']
+
+# Peso de cada columna de patients_fts en bm25 (name, dni, email, phone, address)
+COLUMN_WEIGHTS = (10.0, 8.0, 3.0, 3.0, 1.0)
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match(text):
+    """Convierte el texto del usuario en una expresión MATCH: todas las palabras, como prefijo"""
+    tokens = _TOKEN.findall(text or '')
+    if not tokens:
+        raise QueryError('El parámetro "q" no contiene términos de búsqueda')
+    # Entre comillas para que ningún término se interprete como operador de FTS5
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_patients(conn, text, limit=DEFAULT_LIMIT):
+    """Pacientes que coinciden con el texto, los más relevantes primero"""
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    columns = ', '.join(f'p.{column}' for column in SEARCH_COLUMNS)
+    rows = conn.execute(f'''
+        SELECT {columns}
+        FROM patients_fts
+        JOIN patients p ON p.id = patients_fts.rowid
+        WHERE patients_fts MATCH ?
+        ORDER BY bm25(patients_fts, {weights})
+        LIMIT ?
+    ''', (build_match(text), min(limit, MAX_LIMIT))).fetchall()
+    return [dict(zip(SEARCH_COLUMNS, tuple(row))) for row in rows]
@@ -0,0 +1,96 @@
+"""
+Ficha de un paciente en una sola respuesta (/api/patients/<id>/timeline)
+Citas, historias clínicas, facturas con sus pagos y exámenes del paciente, cada sección
+paginada por cursor sobre los índices (patient_id, ...) y leída de una misma instantánea
+"""
+
+from db_pool import read_snapshot
+from query_builder import DEFAULT_PAGE_SIZE, LIST_RESOURCES, QueryError, build_list_query
+
+# Secciones de la ficha en el orden de la respuesta (nombre del listado de query_builder)
+SECTIONS = ('appointments', 'clinical_histories', 'invoices', 'exams')
+
+# Todas las tablas que lee la ficha (para la caché de respuestas)
+SOURCE_TABLES = ('patients',) + SECTIONS + ('payments',)
+
+# Columnas de los pagos anidados en cada factura
+PAYMENT_COLUMNS = ['id', 'amount', 'payment_method', 'reference', 'status', 'created_at']
+
+
+def _section_fields(name):
+    # patient_name se repetiría en cada fila: el paciente ya viene en la respuesta
+    return ','.join(column for column in LIST_RESOURCES[name].columns if column != 'patient_name')
+
+
+def parse_sections(value):
+    """'appointments,exams' -> tupla de secciones (todas si no se indica)"""
+    if not value:
+        return SECTIONS
+    sections = []
+    for section in value.split(','):
+        section = section.strip()
+        if not section:
+            continue
+        if section not in SECTIONS:
+            raise QueryError(f'Sección desconocida: {section}')
+        if section not in sections:
+            sections.append(section)
+    if not sections:
+        raise QueryError('El parámetro "sections" está vacío')
+    return tuple(sections)
+
+
+def _read_section(conn, name, patient_id, limit, after):
+    args = {'fields': _section_fields(name), 'limit': limit}
+    if after:
+        args['after'] = after
+    resource = LIST_RESOURCES[name]
+    query = build_list_query(name, args, f'{resource.alias}.patient_id = ?', (patient_id,))
+    rows = conn.execute(query.sql, query.params).fetchmany(query.limit + 1)
+    page = rows[:query.limit]
+    next_after = query.next_cursor(tuple(page[-1])) if len(rows) > query.limit else None
+    items = [dict(zip(query.columns, row)) for row in page]
+    return {'items': items, 'next_after': next_after}
+
+
+def _attach_payments(conn, invoices):
+    """Agrega a cada factura la lista de sus pagos (una sola consulta para toda la página)"""
+    by_invoice = {invoice['id']: invoice for invoice in invoices}
+    for invoice in invoices:
+        invoice['payments'] = []
+    if not by_invoice:
+        return
+    placeholders = ', '.join('?' for _ in by_invoice)
+    columns = ', '.join(PAYMENT_COLUMNS)
+    rows = conn.execute(f'''
+        SELECT invoice_id, {columns} FROM payments
+        WHERE invoice_id IN ({placeholders})
+        ORDER BY invoice_id, created_at, id
+    ''', tuple(by_invoice)).fetchall()
+    for row in rows:
+        by_invoice[row[0]]['payments'].append(dict(zip(PAYMENT_COLUMNS, tuple(row)[1:])))
+
+
+def load_timeline(conn, patient_id, args):
+    """
+    Ficha del paciente o None si no existe.
+
+    Parámetros soportados en args:
+      sections          secciones a devolver, separadas por comas (todas por defecto)
+      limit             filas por sección (50 por defecto, máximo 500)
+      <sección>_after   cursor next_after de esa sección para pedir su página siguiente
+    """
+    sections = parse_sections(args.get('sections'))
+    limit = args.get('limit') or str(DEFAULT_PAGE_SIZE)
+
+    # Todas las secciones salen de la misma instantánea aunque otro proceso escriba en medio
+    with read_snapshot(conn):
+        patient = conn.execute('SELECT * FROM patients WHERE id = ?', (patient_id,)).fetchone()
+        if patient is None:
+            return None
+        timeline = {'patient': dict(patient)}
+        for name in sections:
+            timeline[name] = _read_section(conn, name, patient_id, limit, args.get(f'{name}_after'))
+        if 'invoices' in timeline:
+            _attach_payments(conn, timeline['invoices']['items'])
+        return timeline
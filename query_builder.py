@@ -0,0 +1,286 @@
+"""
+Constructor de consultas de listado para el API de DoctoClique
+Paginación por cursor (keyset), proyección de columnas y filtro por fecha de cambio
+"""
+
+import base64
+import json
+
+# Tamaño de página por defecto y máximo cuando se pide paginación
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class QueryError(ValueError):
+    """Parámetros de listado inválidos (se responde con 400)"""
+
+
+class ListResource:
+    """Describe cómo listar un recurso: columnas expuestas, JOINs y orden"""
+
+    def __init__(self, table, alias, columns, order, joins='', changed_column='updated_at'):
+        self.table = table
+        self.alias = alias
+        # Nombre expuesto -> expresión SQL
+        self.columns = columns
+        # Lista de (nombre expuesto, 'ASC' | 'DESC'); siempre termina en el id
+        self.order = order
+        self.joins = joins
+        self.changed_column = changed_column
+
+    def column_names(self):
+        return list(self.columns)
+
+
+def _table_columns(alias, names):
+    return {name: f'{alias}.{name}' for name in names}
+
+
+PATIENT_COLUMNS = [
+    'id', 'name', 'email', 'phone', 'dni', 'birth_date', 'gender', 'address',
+    'blood_type', 'allergies', 'chronic_diseases', 'current_medications',
+    'created_at', 'updated_at'
+]
+APPOINTMENT_COLUMNS = [
+    'id', 'patient_id', 'date', 'time', 'duration', 'type', 'status', 'notes',
+    'created_at', 'updated_at'
+]
+CLINICAL_HISTORY_COLUMNS = [
+    'id', 'patient_id', 'appointment_id', 'reason', 'diagnosis', 'treatment',
+    'observations', 'created_at', 'updated_at'
+]
+INVOICE_COLUMNS = [
+    'id', 'patient_id', 'appointment_id', 'invoice_number', 'total_amount',
+    'status', 'created_at', 'updated_at'
+]
+PAYMENT_COLUMNS = [
+    'id', 'invoice_id', 'amount', 'payment_method', 'reference', 'status', 'created_at'
+]
+INVENTORY_COLUMNS = [
+    'id', 'code', 'name', 'description', 'category', 'category_id', 'supplier', 'supplier_id',
+    'current_stock', 'min_stock', 'unit_price', 'created_at', 'updated_at'
+]
+INVENTORY_MOVEMENT_COLUMNS = [
+    'id', 'inventory_id', 'movement_type', 'quantity', 'stock_after', 'movement_date',
+    'reason', 'created_at'
+]
+INVENTORY_CATEGORY_COLUMNS = ['id', 'name', 'description', 'created_at', 'updated_at']
+INVENTORY_SUPPLIER_COLUMNS = [
+    'id', 'name', 'contact', 'phone', 'email', 'address', 'created_at', 'updated_at'
+]
+EXAM_COLUMNS = [
+    'id', 'patient_id', 'exam_type', 'laboratory', 'status', 'results', 'notes',
+    'created_at', 'updated_at'
+]
+REPORT_COLUMNS = ['id', 'report_type', 'title', 'data', 'created_at']
+REPORT_JOB_COLUMNS = [
+    'id', 'report_type', 'title', 'status', 'progress', 'attempts', 'report_id', 'error',
+    'created_at', 'started_at', 'finished_at'
+]
+
+NEWEST_FIRST = [('created_at', 'DESC'), ('id', 'DESC')]
+
+LIST_RESOURCES = {
+    'patients': ListResource(
+        'patients', 'p', _table_columns('p', PATIENT_COLUMNS),
+        [('name', 'ASC'), ('id', 'ASC')]
+    ),
+    'appointments': ListResource(
+        'appointments', 'a',
+        dict(_table_columns('a', APPOINTMENT_COLUMNS), patient_name='p.name'),
+        [('date', 'ASC'), ('time', 'ASC'), ('id', 'ASC')],
+        joins='JOIN patients p ON a.patient_id = p.id'
+    ),
+    'clinical_histories': ListResource(
+        'clinical_histories', 'h',
+        dict(_table_columns('h', CLINICAL_HISTORY_COLUMNS), patient_name='p.name'),
+        NEWEST_FIRST,
+        joins='JOIN patients p ON h.patient_id = p.id'
+    ),
+    'invoices': ListResource(
+        'invoices', 'i',
+        dict(_table_columns('i', INVOICE_COLUMNS), patient_name='p.name'),
+        NEWEST_FIRST,
+        joins='JOIN patients p ON i.patient_id = p.id'
+    ),
+    'payments': ListResource(
+        'payments', 'p',
+        dict(_table_columns('p', PAYMENT_COLUMNS), invoice_number='i.invoice_number'),
+        NEWEST_FIRST,
+        joins='JOIN invoices i ON p.invoice_id = i.id',
+        changed_column='created_at'
+    ),
+    'inventory': ListResource(
+        'inventory', 'inv',
+        dict(
+            _table_columns('inv', INVENTORY_COLUMNS),
+            # Los items anteriores a la migración 7 pueden tener solo el nombre en texto
+            category_name='COALESCE(c.name, inv.category)',
+            supplier_name='COALESCE(s.name, inv.supplier)'
+        ),
+        [('name', 'ASC'), ('id', 'ASC')],
+        joins='LEFT JOIN inventory_categories c ON inv.category_id = c.id '
+              'LEFT JOIN inventory_suppliers s ON inv.supplier_id = s.id'
+    ),
+    'inventory_movements': ListResource(
+        'inventory_movements', 'm',
+        dict(_table_columns('m', INVENTORY_MOVEMENT_COLUMNS), item_name='inv.name'),
+        NEWEST_FIRST,
+        joins='LEFT JOIN inventory inv ON m.inventory_id = inv.id',
+        changed_column='created_at'
+    ),
+    'inventory_categories': ListResource(
+        'inventory_categories', 'c',
+        dict(
+            _table_columns('c', INVENTORY_CATEGORY_COLUMNS),
+            item_count='(SELECT COUNT(*) FROM inventory inv WHERE inv.category_id = c.id)'
+        ),
+        [('name', 'ASC'), ('id', 'ASC')]
+    ),
+    'inventory_suppliers': ListResource(
+        'inventory_suppliers', 's', _table_columns('s', INVENTORY_SUPPLIER_COLUMNS),
+        [('name', 'ASC'), ('id', 'ASC')]
+    ),
+    'exams': ListResource(
+        'exams', 'e',
+        dict(_table_columns('e', EXAM_COLUMNS), patient_name='p.name'),
+        NEWEST_FIRST,
+        joins='JOIN patients p ON e.patient_id = p.id'
+    ),
+    'reports': ListResource(
+        'reports', 'r', _table_columns('r', REPORT_COLUMNS),
+        NEWEST_FIRST,
+        changed_column='created_at'
+    ),
+    'report_jobs': ListResource(
+        'report_jobs', 'j', _table_columns('j', REPORT_JOB_COLUMNS),
+        NEWEST_FIRST,
+        changed_column='created_at'
+    ),
+}
+
+
+def encode_cursor(values):
+    """Codifica la clave de orden de la última fila como cursor opaco"""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Decodifica un cursor generado por encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise QueryError('Cursor "after" inválido')
+    if not isinstance(values, list) or len(values) != size:
+        raise QueryError('Cursor "after" inválido')
+    return values
+
+
+class ListQuery:
+    """Consulta de listado ya resuelta a partir de los parámetros de la petición"""
+
+    def __init__(self, sql, params, columns, key_columns, limit):
+        self.sql = sql
+        self.params = params
+        # Columnas que se devuelven al cliente, en orden
+        self.columns = columns
+        # Columnas de la clave de orden (pueden no estar en columns)
+        self.key_columns = key_columns
+        # None = listado completo (comportamiento histórico)
+        self.limit = limit
+
+    @property
+    def paginated(self):
+        return self.limit is not None
+
+    def next_cursor(self, last_row):
+        """Cursor para la página siguiente a partir de la última fila leída"""
+        offset = len(self.columns)
+        return encode_cursor(last_row[offset + i] for i in range(len(self.key_columns)))
+
+
+def _parse_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise QueryError('El parámetro "limit" debe ser un entero')
+    if limit < 1:
+        raise QueryError('El parámetro "limit" debe ser mayor que cero')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def build_list_query(name, args, where=None, where_params=()):
+    """
+    Construye la consulta de listado para un recurso.
+
+    Parámetros soportados en args:
+      fields  lista separada por comas de columnas a devolver
+      since   solo filas modificadas desde esa fecha (updated_at o created_at)
+      after   cursor devuelto por la página anterior
+      limit   tamaño de página (activa la paginación)
+    """
+    resource = LIST_RESOURCES[name]
+
+    fields = args.get('fields')
+    if fields:
+        columns = []
+        for field in fields.split(','):
+            field = field.strip()
+            if not field:
+                continue
+            if field not in resource.columns:
+                raise QueryError(f'Campo desconocido: {field}')
+            if field not in columns:
+                columns.append(field)
+        if not columns:
+            raise QueryError('El parámetro "fields" está vacío')
+    else:
+        columns = resource.column_names()
+
+    key_columns = [column for column, _ in resource.order]
+    select = [f'{resource.columns[c]} AS {c}' for c in columns]
+    # La clave de orden se selecciona aparte para poder generar el cursor
+    select += [f'{resource.columns[c]} AS _key_{c}' for c in key_columns]
+
+    conditions = []
+    params = []
+    if where:
+        conditions.append(where)
+        params.extend(where_params)
+
+    since = args.get('since')
+    # Con since manda el índice de changed_column: las filas modificadas suelen ser pocas y se ordenan
+    # en memoria. El + impide que SQLite recorra en su lugar el índice del orden (toda la tabla)
+    by_changes = bool(since) and key_columns[0] != resource.changed_column
+    key_expression = (lambda c: '+' + resource.columns[c]) if by_changes else resource.columns.__getitem__
+    if since:
+        conditions.append(f'{resource.alias}.{resource.changed_column} >= ?')
+        params.append(since)
+
+    after = args.get('after')
+    limit = args.get('limit')
+    if after is not None or limit is not None:
+        limit = _parse_limit(limit) if limit is not None else DEFAULT_PAGE_SIZE
+    if after:
+        values = decode_cursor(after, len(key_columns))
+        direction = resource.order[0][1]
+        operator = '>' if direction == 'ASC' else '<'
+        lhs = ', '.join(key_expression(c) for c in key_columns)
+        rhs = ', '.join('?' for _ in key_columns)
+        conditions.append(f'({lhs}) {operator} ({rhs})')
+        params.extend(values)
+
+    sql = f'SELECT {", ".join(select)} FROM {resource.table} {resource.alias}'
+    if resource.joins:
+        sql += f' {resource.joins}'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY ' + ', '.join(f'{key_expression(c)} {d}' for c, d in resource.order)
+    if limit is not None:
+        # Se pide una fila extra para saber si hay página siguiente
+        sql += ' LIMIT ?'
+        params.append(limit + 1)
+
+    return ListQuery(sql, params, columns, key_columns, limit)
@@ -0,0 +1,231 @@
+"""
+Agregaciones para reportes del API de DoctoClique
+Conteos y sumas agrupados por periodo (día/semana/mes), estado y tipo, calculados en SQL
+"""
+
+from datetime import datetime
+
+from query_builder import QueryError
+
+# Expresiones de agrupación temporal (se aplican sobre la columna de fecha)
+BUCKETS = {
+    'day': "DATE({column})",
+    'week': "STRFTIME('%Y-W%W', {column})",
+    'month': "STRFTIME('%Y-%m', {column})",
+    'year': "STRFTIME('%Y', {column})",
+}
+
+
+class Aggregate:
+    """Describe qué se puede agregar sobre una tabla"""
+
+    def __init__(self, table, date_column, groups, measures, timestamp=True):
+        self.table = table
+        self.date_column = date_column
+        # Nombre expuesto -> columna por la que se puede agrupar
+        self.groups = groups
+        # Nombre expuesto -> expresión agregada
+        self.measures = measures
+        # True si date_column es TIMESTAMP (created_at), False si es DATE
+        self.timestamp = timestamp
+
+
+COUNT = {'count': 'COUNT(*)'}
+
+AGGREGATES = {
+    'patients': Aggregate(
+        'patients', 'created_at',
+        {'gender': 'gender', 'blood_type': 'blood_type'},
+        COUNT
+    ),
+    'appointments': Aggregate(
+        'appointments', 'date',
+        {'status': 'status', 'type': 'type'},
+        COUNT,
+        timestamp=False
+    ),
+    'clinical-histories': Aggregate(
+        'clinical_histories', 'created_at',
+        {'treatment': 'treatment', 'diagnosis': 'diagnosis', 'reason': 'reason'},
+        COUNT
+    ),
+    'invoices': Aggregate(
+        'invoices', 'created_at',
+        {'status': 'status'},
+        dict(COUNT, total_amount='COALESCE(SUM(total_amount), 0)')
+    ),
+    'payments': Aggregate(
+        'payments', 'created_at',
+        {'status': 'status', 'payment_method': 'payment_method'},
+        dict(COUNT, amount='COALESCE(SUM(amount), 0)')
+    ),
+    'exams': Aggregate(
+        'exams', 'created_at',
+        {'status': 'status', 'exam_type': 'exam_type', 'laboratory': 'laboratory'},
+        COUNT
+    ),
+    'inventory-movements': Aggregate(
+        'inventory_movements', 'movement_date',
+        {'movement_type': 'movement_type', 'inventory_id': 'inventory_id'},
+        dict(
+            COUNT,
+            quantity='COALESCE(SUM(quantity), 0)',
+            # Variación neta del stock: las salidas se guardan en positivo, los ajustes con signo
+            net_change="COALESCE(SUM(CASE movement_type WHEN 'salida' THEN -quantity ELSE quantity END), 0)"
+        ),
+        timestamp=False
+    ),
+}
+
+# Tablas que leen las agregaciones (y el resumen): de ellas depende la caché de respuestas
+SOURCE_TABLES = tuple(sorted({aggregate.table for aggregate in AGGREGATES.values()}))
+
+
+def parse_date(value, name):
+    """Valida una fecha YYYY-MM-DD de los parámetros"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+    except (TypeError, ValueError):
+        raise QueryError(f'El parámetro "{name}" debe tener formato YYYY-MM-DD')
+
+
+def parse_spec(name, args):
+    """Normaliza los parámetros de una agregación (from, to, bucket, group_by)"""
+    if name not in AGGREGATES:
+        raise QueryError(f'Agregación desconocida: {name}')
+    aggregate = AGGREGATES[name]
+
+    spec = {'resource': name, 'from': None, 'to': None, 'bucket': None, 'group_by': []}
+    if args.get('from'):
+        spec['from'] = parse_date(args.get('from'), 'from')
+    if args.get('to'):
+        spec['to'] = parse_date(args.get('to'), 'to')
+
+    bucket = args.get('bucket')
+    if bucket:
+        if bucket not in BUCKETS:
+            raise QueryError(f'Periodo desconocido: {bucket} (day, week, month, year)')
+        spec['bucket'] = bucket
+
+    group_by = args.get('group_by') or ''
+    if isinstance(group_by, str):
+        group_by = [g.strip() for g in group_by.split(',') if g.strip()]
+    for group in group_by:
+        if group not in aggregate.groups:
+            raise QueryError(f'No se puede agrupar {name} por {group}')
+        if group not in spec['group_by']:
+            spec['group_by'].append(group)
+    return spec
+
+
+def date_range_condition(aggregate, spec):
+    """Condición WHERE para el rango de fechas, usable por el índice de la columna"""
+    conditions = []
+    params = []
+    column = aggregate.date_column
+    if spec['from']:
+        conditions.append(f'{column} >= ?')
+        params.append(spec['from'])
+    if spec['to']:
+        if aggregate.timestamp:
+            conditions.append(f"{column} < DATE(?, '+1 day')")
+        else:
+            conditions.append(f'{column} <= ?')
+        params.append(spec['to'])
+    return conditions, params
+
+
+def run_aggregate(conn, spec):
+    """Ejecuta la agregación y devuelve una lista de filas con periodo, grupos y medidas"""
+    aggregate = AGGREGATES[spec['resource']]
+
+    keys = []
+    if spec['bucket']:
+        keys.append(('bucket', BUCKETS[spec['bucket']].format(column=aggregate.date_column)))
+    keys += [(group, aggregate.groups[group]) for group in spec['group_by']]
+
+    select = [f'{expr} AS {name}' for name, expr in keys]
+    select += [f'{expr} AS {name}' for name, expr in aggregate.measures.items()]
+    sql = f'SELECT {", ".join(select)} FROM {aggregate.table}'
+
+    conditions, params = date_range_condition(aggregate, spec)
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    if keys:
+        positions = ', '.join(str(i + 1) for i in range(len(keys)))
+        sql += f' GROUP BY {positions} ORDER BY {positions}'
+
+    rows = []
+    for row in conn.execute(sql, params):
+        item = dict(row)
+        for measure in aggregate.measures:
+            if measure != 'count':
+                item[measure] = round(float(item[measure]), 2)
+        rows.append(item)
+    return rows
+
+
+def summary(conn, spec):
+    """Indicadores del panel de reportes para un rango de fechas en una sola llamada"""
+    result = {'from': spec['from'], 'to': spec['to']}
+
+    total_patients = conn.execute('SELECT COUNT(*) FROM patients').fetchone()[0]
+    new_patients = run_aggregate(conn, dict(spec, resource='patients', bucket=None, group_by=[]))
+    result['patients'] = {'total': total_patients, 'new': new_patients[0]['count']}
+
+    by_status = run_aggregate(conn, dict(spec, resource='appointments', bucket=None, group_by=['status']))
+    statuses = {row['status']: row['count'] for row in by_status}
+    result['appointments'] = {'total': sum(statuses.values()), 'by_status': statuses}
+
+    invoices = run_aggregate(conn, dict(spec, resource='invoices', bucket=None, group_by=[]))[0]
+    result['invoices'] = {
+        'total': invoices['count'],
+        'revenue': invoices['total_amount'],
+        'average': round(invoices['total_amount'] / invoices['count'], 2) if invoices['count'] else 0
+    }
+
+    treatments = run_aggregate(conn, dict(spec, resource='clinical-histories', bucket=None, group_by=['treatment']))
+    result['treatments'] = {
+        'total': sum(row['count'] for row in treatments),
+        'by_treatment': {row['treatment'] or 'Sin especificar': row['count'] for row in treatments}
+    }
+
+    bucket = spec['bucket'] or 'month'
+    result['series'] = {
+        'bucket': bucket,
+        'appointments': run_aggregate(conn, dict(spec, resource='appointments', bucket=bucket, group_by=[])),
+        'revenue': run_aggregate(conn, dict(spec, resource='invoices', bucket=bucket, group_by=[]))
+    }
+    return result
+
+
+def parse(name, args):
+    """Valida los parámetros de una agregación por nombre ('summary' o un recurso) y devuelve su spec"""
+    if name == 'summary':
+        spec = parse_spec('appointments', {key: args.get(key) for key in ('from', 'to', 'bucket')})
+        spec['resource'] = 'summary'
+        return spec
+    return parse_spec(name, args)
+
+
+def run(conn, spec):
+    """Calcula una agregación ya validada con parse"""
+    if spec['resource'] == 'summary':
+        return summary(conn, spec)
+    return dict(spec, rows=run_aggregate(conn, spec))
+
+
+def compute(conn, name, args):
+    """Resuelve una agregación por nombre ('summary' o un recurso) y devuelve (spec, resultado)"""
+    spec = parse(name, args)
+    return spec, run(conn, spec)
+
+
+def describe():
+    """Agregaciones disponibles con sus agrupaciones y medidas"""
+    catalog = {
+        name: {'groups': list(aggregate.groups), 'measures': list(aggregate.measures)}
+        for name, aggregate in AGGREGATES.items()
+    }
+    catalog['summary'] = {'groups': [], 'measures': ['patients', 'appointments', 'invoices', 'treatments', 'series']}
+    return {'buckets': list(BUCKETS), 'aggregates': catalog}
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Cola persistente de reportes pesados del API de DoctoClique
+Los trabajos se guardan en la tabla report_jobs (migración 8), así que sobreviven a un reinicio.
+Un hilo despachador los toma de a uno y los calcula en un pool de procesos, con una conexión de
+solo lectura, fuera del worker web. El resultado queda en reports.data.
+
+Con gunicorn (wsgi.py) los workers solo encolan; los trabajos los calcula un despachador aparte:
+    python3 report_jobs.py --db agenda.db --workers 2
+"""
+
+import argparse
+import atexit
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+import report_aggregates
+from db_pool import connect, connect_readonly
+from query_builder import REPORT_JOB_COLUMNS, QueryError
+
+# Procesos de cálculo por despachador
+DEFAULT_WORKERS = max(1, min(2, os.cpu_count() or 1))
+WORKERS_ENV = 'DOCTOCLIQUE_REPORT_WORKERS'
+# '0' desactiva el despachador en este proceso (los trabajos solo se encolan)
+RUNNER_ENV = 'DOCTOCLIQUE_REPORT_RUNNER'
+
+# Cada cuánto se buscan trabajos nuevos si nadie avisó (encolados por otro proceso)
+POLL_INTERVAL = 1.0
+# Un trabajo 'running' sin latido por este tiempo quedó huérfano (proceso caído) y se reencola
+STALE_SECONDS = 60
+MAX_ATTEMPTS = 3
+# Partes (agregaciones) como máximo por trabajo
+MAX_PARTS = 20
+
+CLAIM_SQL = '''
+    UPDATE report_jobs SET status = 'running', claim = ?, attempts = attempts + 1, progress = 0,
+                           started_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+    WHERE id = (SELECT id FROM report_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+    RETURNING id, spec
+'''
+
+JOBS = 'doctoclique_report_jobs_total'
+QUEUED = 'doctoclique_report_jobs_queued'
+metrics.REGISTRY.counter(JOBS, 'Trabajos de reporte terminados por resultado (done, failed, requeued)')
+metrics.REGISTRY.gauge(QUEUED, 'Trabajos de reporte esperando en la cola')
+
+
+def build_job(data):
+    """
+    Valida el pedido de un reporte y devuelve (report_type, title, spec) para encolarlo.
+
+    data puede traer una agregación ("aggregate": "summary", "from", "to", ...) o varias
+    ("aggregates": [{"aggregate": "invoices", "bucket": "month"}, ...]); lanza QueryError
+    """
+    single = 'aggregates' not in data
+    parts = [data] if single else data['aggregates']
+    if not isinstance(parts, list) or not parts:
+        raise QueryError('"aggregates" debe ser una lista no vacía')
+    if len(parts) > MAX_PARTS:
+        raise QueryError(f'Máximo {MAX_PARTS} agregaciones por reporte')
+
+    specs = []
+    for part in parts:
+        if not isinstance(part, dict):
+            raise QueryError('Cada agregación debe ser un objeto JSON')
+        specs.append(report_aggregates.parse(part.get('aggregate') or part.get('name'), part))
+    names = [spec['resource'] for spec in specs]
+
+    if single:
+        spec = specs[0]
+        title = data.get('title') or f"Reporte {names[0]} {spec['from'] or ''} - {spec['to'] or ''}".strip()
+    else:
+        title = data.get('title') or f"Reporte {', '.join(names)}"
+    report_type = data.get('report_type') or (f'aggregate:{names[0]}' if single else 'aggregates')
+    return report_type, title, {'single': single, 'parts': specs}
+
+
+def enqueue(conn, report_type, title, spec):
+    """Guarda el trabajo en la cola (en la transacción de escritura del llamador); devuelve su id"""
+    cursor = conn.execute('''
+        INSERT INTO report_jobs (report_type, title, spec) VALUES (?, ?, ?)
+    ''', (report_type, title, json.dumps(spec)))
+    return cursor.lastrowid
+
+
+def get_job(conn, job_id):
+    """Estado de un trabajo o None"""
+    row = conn.execute(
+        f'SELECT {", ".join(REPORT_JOB_COLUMNS)} FROM report_jobs WHERE id = ?', (job_id,)
+    ).fetchone()
+    return dict(zip(REPORT_JOB_COLUMNS, tuple(row))) if row else None
+
+
+# === EJECUCIÓN (en el pool de procesos) ===
+def execute_job(database, job_id, claim, spec):
+    """Calcula el reporte con una conexión de solo lectura y guarda el resultado; corre en un proceso hijo"""
+    reader = connect_readonly(database)
+    writer = connect(database)
+    try:
+        parts = spec['parts']
+        results = []
+        # Todas las partes salen de la misma instantánea de la base
+        reader.execute('BEGIN')
+        for index, part in enumerate(parts):
+            results.append(report_aggregates.run(reader, part))
+            if index + 1 < len(parts):
+                writer.execute(
+                    'UPDATE report_jobs SET progress = ? WHERE id = ? AND claim = ?',
+                    ((index + 1) / len(parts), job_id, claim)
+                )
+                writer.commit()
+        reader.rollback()
+        data = json.dumps(results[0] if spec['single'] else results)
+
+        writer.execute('BEGIN IMMEDIATE')
+        # Si el trabajo se reencoló (latido vencido) otro proceso lo tiene: no se guarda dos veces
+        job = writer.execute(
+            "SELECT report_type, title FROM report_jobs WHERE id = ? AND claim = ? AND status = 'running'",
+            (job_id, claim)
+        ).fetchone()
+        if job is None:
+            writer.rollback()
+            return 'lost'
+        report_id = writer.execute(
+            'INSERT INTO reports (report_type, title, data) VALUES (?, ?, ?)', (job[0], job[1], data)
+        ).lastrowid
+        writer.execute('''
+            UPDATE report_jobs SET status = 'done', progress = 1, report_id = ?, error = NULL,
+                                   finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (report_id, job_id))
+        writer.commit()
+        return 'done'
+    finally:
+        reader.close()
+        writer.close()
+
+
+def _init_worker():
+    # Ctrl+C lo atiende el despachador, que espera a que termine el cálculo en curso
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def runner_enabled():
+    """False si este proceso solo encola (DOCTOCLIQUE_REPORT_RUNNER=0)"""
+    return os.environ.get(RUNNER_ENV) != '0'
+
+
+class JobRunner:
+    """Despachador de la cola: toma trabajos y los ejecuta en un pool de procesos"""
+
+    def __init__(self, workers=None):
+        self.workers = workers or int(os.environ.get(WORKERS_ENV, DEFAULT_WORKERS))
+        self.database = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._pool = None
+        self._pool_broken = False
+        self._conn = None
+        # id de trabajo -> claim de los que se están calculando en este proceso
+        self._running = {}
+
+    def ensure_running(self, database):
+        """Arranca el despachador en este proceso si no está corriendo (tras un fork se recrea)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.database = database
+            self._pid = os.getpid()
+            self._running = {}
+            self._stopping = False
+            self._conn = connect(database)
+            self._pool = self._new_pool()
+            threading.Thread(target=self._loop, name='report-jobs', daemon=True).start()
+            atexit.register(self.stop)
+
+    def _new_pool(self):
+        self._pool_broken = False
+        # spawn: el hijo no hereda hilos ni conexiones abiertas del proceso web
+        return ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context('spawn'), initializer=_init_worker
+        )
+
+    def notify(self):
+        """Avisa que hay un trabajo nuevo (evita esperar al próximo sondeo)"""
+        self._wakeup.set()
+
+    def stop(self):
+        """Deja de tomar trabajos y espera a que terminen los que están en curso"""
+        if self._pid != os.getpid() or self._stopping:
+            return
+        with self._lock:
+            self._stopping = True
+        self._wakeup.set()
+        # Un proceso que muere sin llegar aquí deja sus trabajos sin latido: otro los reencola
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _loop(self):
+        while not self._stopping:
+            try:
+                self._tick()
+            except Exception:
+                metrics.log_event('report_jobs_error', error=traceback.format_exc())
+            self._wakeup.wait(POLL_INTERVAL)
+            self._wakeup.clear()
+
+    def _tick(self):
+        conn = self._conn
+        with self._lock:
+            running = dict(self._running)
+        if running:
+            # Latido de los trabajos en curso: mientras este proceso viva nadie los reencola
+            conn.executemany(
+                'UPDATE report_jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE id = ? AND claim = ?',
+                list(running.items())
+            )
+        self._requeue_stale(conn)
+        conn.commit()
+
+        while True:
+            # El lock cubre tomar y enviar: stop no puede cerrar el pool entre medio
+            with self._lock:
+                if self._stopping or len(self._running) >= self.workers:
+                    break
+                if self._pool_broken:
+                    # Murió un proceso hijo: el pool ya no acepta trabajos y se reemplaza
+                    self._pool.shutdown(wait=False, cancel_futures=True)
+                    self._pool = self._new_pool()
+                claim = f'{os.getpid()}:{uuid.uuid4().hex}'
+                row = conn.execute(CLAIM_SQL, (claim,)).fetchall()
+                conn.commit()
+                if not row:
+                    break
+                job_id, spec = row[0]
+                self._running[job_id] = claim
+                try:
+                    future = self._pool.submit(execute_job, self.database, job_id, claim, json.loads(spec))
+                except Exception as error:
+                    # No llegó al pool: se devuelve a la cola (o falla si agotó los intentos)
+                    self._running.pop(job_id, None)
+                    self._pool_broken = isinstance(error, BrokenProcessPool)
+                    self._release(conn, job_id, claim, error)
+                    conn.commit()
+                    break
+            future.add_done_callback(lambda done, job_id=job_id, claim=claim: self._finished(job_id, claim, done))
+
+        queued = conn.execute("SELECT COUNT(*) FROM report_jobs WHERE status = 'queued'").fetchone()[0]
+        metrics.REGISTRY.set(QUEUED, {}, queued)
+
+    def _requeue_stale(self, conn):
+        stale = f'-{STALE_SECONDS} seconds'
+        requeued = conn.execute('''
+            UPDATE report_jobs SET status = 'queued', claim = NULL
+            WHERE status = 'running' AND heartbeat_at < DATETIME('now', ?) AND attempts < ?
+        ''', (stale, MAX_ATTEMPTS)).rowcount
+        failed = conn.execute('''
+            UPDATE report_jobs SET status = 'failed', claim = NULL, finished_at = CURRENT_TIMESTAMP,
+                                   error = 'El proceso que calculaba el reporte se detuvo'
+            WHERE status = 'running' AND heartbeat_at < DATETIME('now', ?)
+        ''', (stale,)).rowcount
+        if requeued:
+            metrics.REGISTRY.inc(JOBS, {'result': 'requeued'}, requeued)
+        if failed:
+            metrics.REGISTRY.inc(JOBS, {'result': 'failed'}, failed)
+
+    def _release(self, conn, job_id, claim, error):
+        """Devuelve a la cola un trabajo que no se pudo calcular por el pool; falla si agotó los intentos"""
+        requeued = conn.execute('''
+            UPDATE report_jobs SET status = 'queued', claim = NULL
+            WHERE id = ? AND claim = ? AND attempts < ?
+        ''', (job_id, claim, MAX_ATTEMPTS)).rowcount
+        if not requeued:
+            self._fail(conn, job_id, claim, error)
+            return
+        metrics.REGISTRY.inc(JOBS, {'result': 'requeued'})
+        metrics.log_event('report_job', job_id=job_id, result='requeued', error=str(error))
+
+    def _fail(self, conn, job_id, claim, error):
+        conn.execute('''
+            UPDATE report_jobs SET status = 'failed', error = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND claim = ?
+        ''', (f'{type(error).__name__}: {error}', job_id, claim))
+        metrics.REGISTRY.inc(JOBS, {'result': 'failed'})
+        metrics.log_event('report_job', job_id=job_id, result='failed', error=str(error))
+
+    def _finished(self, job_id, claim, future):
+        with self._lock:
+            self._running.pop(job_id, None)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            result = future.result()
+            metrics.REGISTRY.inc(JOBS, {'result': result})
+            metrics.log_event('report_job', job_id=job_id, result=result)
+        else:
+            conn = connect(self.database)
+            if isinstance(error, BrokenProcessPool):
+                # Murió el proceso hijo, no falló el cálculo: se reencola y el pool se recrea
+                with self._lock:
+                    self._pool_broken = True
+                self._release(conn, job_id, claim, error)
+            else:
+                # Error del cálculo: el trabajo queda fallido con el motivo
+                self._fail(conn, job_id, claim, error)
+            conn.commit()
+            conn.close()
+        self._wakeup.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Despachador de la cola de reportes')
+    parser.add_argument('--db', default='agenda.db', help='ruta de la base de datos')
+    parser.add_argument('--workers', type=int, default=None, help='procesos de cálculo')
+    options = parser.parse_args()
+
+    runner = JobRunner(options.workers)
+    runner.ensure_running(options.db)
+    print(f"📊 Despachando reportes de {options.db} con {runner.workers} procesos (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        runner.stop()
+
+
+if __name__ == '__main__':
+    main()
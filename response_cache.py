@@ -0,0 +1,140 @@
+"""
+Caché de respuestas GET del API de DoctoClique
+Cada tabla tiene una versión (el último id de change_events que la tocó). La ETag de una respuesta
+se deriva de la ruta, la query y las versiones de las tablas que lee: si nada cambió se responde
+304 o el cuerpo ya serializado sin ejecutar la consulta
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+import metrics
+from db_pool import connect
+from events import EVENT_TABLES
+
+# Tablas con triggers en change_events (migraciones 3, 6 y 7)
+VERSIONED_TABLES = EVENT_TABLES + ('reports',)
+
+# Límites del LRU de cuerpos serializados
+MAX_ENTRIES = 1024
+MAX_BYTES = 64 * 1024 * 1024
+# Un cuerpo más grande no se guarda (desplazaría a todos los demás), pero igual lleva ETag
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+VERSION_SQL = 'SELECT MAX(id) FROM change_events WHERE table_name = ?'
+
+CACHE_RESULTS = 'doctoclique_response_cache_total'
+metrics.REGISTRY.counter(CACHE_RESULTS, 'Respuestas GET por resultado de la caché (hit, miss, not_modified)')
+
+
+class TableVersions:
+    """Versión de cada tabla; solo se relee de la base cuando alguna conexión confirmó cambios"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self._database = None
+        self._pid = None
+        self._data_version = None
+        self._versions = {}
+
+    def current(self, database, tables):
+        """Tupla con la versión de cada tabla pedida"""
+        with self._lock:
+            if self._conn is None or self._database != database or self._pid != os.getpid():
+                # Conexión propia: data_version solo cambia por commits de otras conexiones
+                self._conn = connect(database)
+                self._database = database
+                self._pid = os.getpid()
+                self._data_version = None
+            data_version = self._conn.execute('PRAGMA data_version').fetchall()[0][0]
+            if data_version != self._data_version:
+                self._versions = {
+                    table: self._conn.execute(VERSION_SQL, (table,)).fetchall()[0][0] or 0
+                    for table in VERSIONED_TABLES
+                }
+                self._data_version = data_version
+            return tuple(self._versions.get(table, 0) for table in tables)
+
+
+class CachedResponse:
+    __slots__ = ('etag', 'body', 'mimetype')
+
+    def __init__(self, etag, body, mimetype):
+        self.etag = etag
+        self.body = body
+        self.mimetype = mimetype
+
+
+class ResponseCache:
+    """LRU de cuerpos ya serializados, acotado por cantidad y por bytes"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key, etag):
+        """Entrada vigente para la clave (None si no hay o quedó de una versión anterior)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.etag != etag:
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag, body, mimetype):
+        entry = CachedResponse(etag, body, mimetype)
+        if len(body) > MAX_BODY_BYTES:
+            return entry
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._discard(next(iter(self._entries)))
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def request_key(path, args):
+    """Clave estable de la petición: ruta y query con los parámetros ordenados"""
+    return f'{path}?{urlencode(sorted(args.items(multi=True)))}'
+
+
+def make_etag(key, versions):
+    """ETag fuerte: misma petición y mismas versiones producen exactamente el mismo cuerpo"""
+    digest = hashlib.sha1(f'{key}|{versions}'.encode('utf-8')).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return etag in {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+
+
+def record(result):
+    metrics.REGISTRY.inc(CACHE_RESULTS, {'result': result})
@@ -0,0 +1,216 @@
+"""
+Serialización JSON del API de DoctoClique
+Usa orjson si está instalado (pip3 install orjson) y si no el módulo json de la biblioteca
+estándar. Los dos escriben los mismos bytes que el proveedor por defecto de Flask (claves ordenadas,
+separadores compactos, ensure_ascii): la salida de orjson se escapa y, si trae floats con exponente,
+ese cuerpo lo escribe json. NaN e infinito se escriben como null en ambos, no como el NaN inválido
+de json. Las filas de SQLite se codifican directamente desde el cursor, con las claves ya ordenadas
+"""
+
+import codecs
+import dataclasses
+import decimal
+import json
+import operator
+import math
+import os
+import re
+import uuid
+from datetime import date
+
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa json
+    orjson = None
+
+# Fuerza un serializador ('json' u 'orjson'); por defecto el más rápido disponible
+SERIALIZER_ENV = 'DOCTOCLIQUE_JSON'
+
+
+def default(value):
+    """Tipos que no son JSON nativo, con los mismos criterios que el proveedor de Flask"""
+    if isinstance(value, date):
+        return http_date(value)
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _finite(value):
+    """Copia de value con NaN e infinito reemplazados por None (solo si json los rechazó)"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    if value is None or isinstance(value, (str, int)):
+        return value
+    return _finite(default(value))
+
+
+# Los tramos no ASCII se escapan con este manejador de errores de codificación (ver _escape_run)
+ESCAPE_ERRORS = 'doctoclique_json_ascii'
+# Tramos distintos que se recuerdan ya escapados (al llenarse se vacía)
+ESCAPE_CACHE_SIZE = 4096
+# orjson escribe 1e16, 1e-7 y 0.0000367 donde json escribe 1e+16, 1e-07 y 3.67e-05. El exponente
+# termina donde termina el número; un string que lo parezca solo hace que el cuerpo lo escriba json
+_EXPONENT = re.compile(rb'e-?[0-9]+[,}\]\n]')
+
+_escaped_runs = {}
+
+
+def _escape_run(error):
+    """Manejador de UnicodeEncodeError: el tramo no ASCII como \\uXXXX, igual que ensure_ascii"""
+    run = error.object[error.start:error.end]
+    escaped = _escaped_runs.get(run)
+    if escaped is None:
+        if len(_escaped_runs) >= ESCAPE_CACHE_SIZE:
+            _escaped_runs.clear()
+        escaped = _escaped_runs[run] = json.encoder.encode_basestring_ascii(run)[1:-1]
+    return escaped, error.end
+
+
+codecs.register_error(ESCAPE_ERRORS, _escape_run)
+
+
+def _odd_floats(body):
+    """True si orjson pudo escribir algún float distinto que json"""
+    return b'0.0000' in body or _EXPONENT.search(body) is not None
+
+
+def _ascii(body):
+    """Escapa como ensure_ascii lo que orjson deja sin escapar (solo aparece dentro de strings)"""
+    if not body.isascii():
+        body = body.decode('utf-8').encode('ascii', ESCAPE_ERRORS)
+    if b'\x7f' in body:
+        body = body.replace(b'\x7f', b'\\u007f')
+    return body
+
+
+class RowLayout:
+    """Columnas de una consulta en orden alfabético (el orden de sort_keys) y cómo tomarlas de la fila"""
+
+    def __init__(self, columns):
+        order = sorted(range(len(columns)), key=columns.__getitem__)
+        self.keys = tuple(columns[i] for i in order)
+        if len(order) == 1:
+            index = order[0]
+            self.pick = lambda row: (row[index],)
+        else:
+            # Las columnas extra de la fila (claves del cursor) quedan afuera
+            self.pick = operator.itemgetter(*order)
+
+
+class StdlibSerializer:
+    """Serializador con el módulo json; todo devuelve bytes UTF-8"""
+
+    name = 'json'
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(
+            sort_keys=True, separators=(',', ':'), allow_nan=False, default=default
+        )
+        encode_string = json.encoder.encode_basestring_ascii
+        # Mismo formato que el encoder para los tipos que devuelve SQLite
+        self._value_encoders = {
+            str: encode_string,
+            int: int.__repr__,
+            float: self._encode_float,
+            type(None): lambda value: 'null',
+            bool: lambda value: 'true' if value else 'false',
+        }
+
+    def _encode_float(self, value):
+        if not math.isfinite(value):
+            return 'null'
+        return float.__repr__(value)
+
+    def _encode_value(self, value):
+        encode = self._value_encoders.get(type(value))
+        return encode(value) if encode else self._encoder.encode(value)
+
+    def _objects(self, layout, rows):
+        # Las claves codificadas se calculan una vez por consulta, no por fila
+        keys = [json.encoder.encode_basestring_ascii(key) + ':' for key in layout.keys]
+        encoders = self._value_encoders
+        encode_value = self._encode_value
+        pick = layout.pick
+        for row in rows:
+            yield '{' + ','.join([
+                key + (encoders.get(type(value)) or encode_value)(value)
+                for key, value in zip(keys, pick(row))
+            ]) + '}'
+
+    def dumps(self, obj):
+        try:
+            text = self._encoder.encode(obj)
+        except ValueError:
+            # allow_nan=False: hay NaN o infinito, se vuelve a codificar con null en su lugar
+            text = self._encoder.encode(_finite(obj))
+        return text.encode('ascii')
+
+    def encode_rows(self, layout, rows):
+        """Array JSON con un objeto por fila"""
+        return ('[' + ','.join(self._objects(layout, rows)) + ']').encode('ascii')
+
+    def encode_lines(self, layout, rows):
+        """NDJSON: un objeto por fila, cada uno terminado en salto de línea"""
+        return ''.join(line + '\n' for line in self._objects(layout, rows)).encode('ascii')
+
+
+class OrjsonSerializer:
+    """Mismos métodos que StdlibSerializer, con orjson"""
+
+    name = 'orjson'
+
+    def __init__(self):
+        # Fechas y dataclasses pasan por default para formatearse igual que con json
+        self._options = (
+            orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        )
+        # Con las claves ya ordenadas por RowLayout no hace falta ordenar cada objeto
+        self._row_options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        # Para los cuerpos con floats que orjson escribe distinto
+        self._stdlib = StdlibSerializer()
+
+    def dumps(self, obj):
+        body = orjson.dumps(obj, default=default, option=self._options)
+        if _odd_floats(body):
+            return self._stdlib.dumps(obj)
+        return _ascii(body)
+
+    def encode_rows(self, layout, rows):
+        keys, pick = layout.keys, layout.pick
+        body = orjson.dumps([dict(zip(keys, pick(row))) for row in rows], default=default, option=self._row_options)
+        if _odd_floats(body):
+            return self._stdlib.encode_rows(layout, rows)
+        return _ascii(body)
+
+    def encode_lines(self, layout, rows):
+        keys, pick = layout.keys, layout.pick
+        options = self._row_options | orjson.OPT_APPEND_NEWLINE
+        body = b''.join(orjson.dumps(dict(zip(keys, pick(row))), default=default, option=options) for row in rows)
+        if _odd_floats(body):
+            return self._stdlib.encode_lines(layout, rows)
+        return _ascii(body)
+
+
+SERIALIZERS = {'json': StdlibSerializer, 'orjson': OrjsonSerializer}
+
+
+def get_serializer(name=None):
+    """Serializador pedido (o el de DOCTOCLIQUE_JSON, o el más rápido instalado)"""
+    name = name or os.environ.get(SERIALIZER_ENV) or ('orjson' if orjson is not None else 'json')
+    if name not in SERIALIZERS:
+        raise ValueError(f'Serializador desconocido: {name}')
+    if name == 'orjson' and orjson is None:
+        raise ValueError('orjson no está instalado (pip3 install orjson)')
+    return SERIALIZERS[name]()
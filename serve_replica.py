@@ -5,195 +5,180 @@ Sistema de Gestión Odontológica DoctoClique
 """
 
 import http.server
-import socketserver
+import logging
 import os
 import sys
-from urllib.parse import urlparse, parse_qs
+import threading
+import time
+from urllib.parse import urlparse, parse_qs, unquote
+
+import metrics
+import static_assets
 
 PORT = 8001
 
+# Recursos precomprimidos: ruta del archivo -> static_assets.Asset (se carga en main)
+ASSETS = {}
+
+# Rutas fijas: redirecciones y páginas (ruta -> (archivo, nombre para el 404))
+REDIRECTS = {
+    '/': '/index.html',
+    '/agenda': '/panel-control/agenda_original',
+}
+PAGES = {
+    '/index.html': ('index.html', 'Dashboard'),
+    '/panel-control/agenda_original': ('panel-control/agenda_original.html', 'Agenda'),
+    '/panel-control/pacientes': ('panel-control/pacientes.html', 'Pacientes'),
+    '/panel-control/historias': ('panel-control/historias.html', 'Historias'),
+    '/panel-control/facturacion': ('panel-control/facturacion.html', 'Facturacion'),
+    '/panel-control/inventario': ('panel-control/inventario.html', 'Inventario'),
+    '/panel-control/examenes': ('panel-control/examenes.html', 'Examenes'),
+    '/panel-control/reportes': ('panel-control/reportes.html', 'Reportes'),
+}
+
+# Segundos entre revisiones del mtime de un recurso (evita un stat por petición)
+MTIME_CHECK_INTERVAL = 1.0
+# Segundos que una conexión keep-alive puede quedar inactiva
+KEEP_ALIVE_TIMEOUT = 15
+
+_assets_lock = threading.Lock()
+# ruta del archivo -> momento de la última revisión del mtime
+_checked_at = {}
+
+
+def load_asset(file_path):
+    """Recurso vigente en memoria: lo construye la primera vez y lo recarga si cambió el archivo"""
+    asset = ASSETS.get(file_path)
+    now = time.monotonic()
+    if asset is not None and now - _checked_at.get(file_path, 0) < MTIME_CHECK_INTERVAL:
+        return asset
+    if asset is None and file_path not in static_assets.ASSET_PAGES:
+        return None
+    
+    with _assets_lock:
+        asset = ASSETS.get(file_path)
+        try:
+            mtime = os.path.getmtime(file_path)
+        except OSError:
+            ASSETS.pop(file_path, None)
+            return None
+        if asset is None or mtime != asset.mtime or not asset.sizes:
+            asset = static_assets.build_asset(file_path, asset).preload()
+            ASSETS[file_path] = asset
+        _checked_at[file_path] = now
+        return asset
+
+
 class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # HTTP/1.1: el navegador reutiliza la conexión para los recursos de cada página
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEP_ALIVE_TIMEOUT
+    
     def do_GET(self):
         # Parse the URL
         parsed_path = urlparse(self.path)
         path = parsed_path.path
         
-        print(f"🔍 Ruta solicitada: {path}")
-        
-        # Routes mapping
-        if path == '/':
-            # Página principal - redirigir al dashboard
-            print("✅ Redirigiendo a dashboard")
-            self.send_response(302)
-            self.send_header('Location', '/index.html')
+        self.status = None
+        self.route = None
+        token = metrics.begin_request()
+        try:
+            self.route_request(path)
+        finally:
+            metrics.end_request(token, self.route or 'file', 'GET', self.status, path)
+
+    def route_request(self, path):
+        if path == '/metrics':
+            self.route = path
+            body = metrics.REGISTRY.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-type', metrics.METRICS_CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
             self.end_headers()
+            self.wfile.write(body)
             return
-            
-        elif path == '/index.html':
-            # Dashboard principal
-            print("✅ Sirviendo dashboard")
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
+        
+        if path in REDIRECTS:
+            self.route = path
+            self.send_response(302)
+            self.send_header('Location', REDIRECTS[path])
+            self.send_header('Content-Length', '0')
             self.end_headers()
-            with open('index.html', 'rb') as f:
-                self.wfile.write(f.read())
             return
-            
-        elif path == '/panel-control/agenda_original':
-            # Página de agenda
-            print("✅ Ruta de agenda detectada")
-            agenda_file = 'panel-control/agenda_original.html'
-            if os.path.exists(agenda_file):
-                print("✅ Archivo de agenda encontrado")
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                with open(agenda_file, 'rb') as f:
-                    self.wfile.write(f.read())
-                return
-            else:
-                print("❌ Archivo de agenda no encontrado")
-                self.send_response(404)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                self.wfile.write(b'<h1>404 - Agenda page not found</h1>')
-                return
-                
-        elif path == '/panel-control/pacientes':
-            # Página de pacientes
-            print("✅ Ruta de pacientes detectada")
-            pacientes_file = 'panel-control/pacientes.html'
-            if os.path.exists(pacientes_file):
-                print("✅ Archivo de pacientes encontrado")
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                with open(pacientes_file, 'rb') as f:
-                    self.wfile.write(f.read())
-                return
-            else:
-                print("❌ Archivo de pacientes no encontrado")
-                self.send_response(404)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                self.wfile.write(b'<h1>404 - Pacientes page not found</h1>')
-                return
-                
-        elif path == '/panel-control/historias':
-            # Página de historias clínicas
-            print("✅ Ruta de historias detectada")
-            historias_file = 'panel-control/historias.html'
-            if os.path.exists(historias_file):
-                print("✅ Archivo de historias encontrado")
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                with open(historias_file, 'rb') as f:
-                    self.wfile.write(f.read())
-                return
-            else:
-                print("❌ Archivo de historias no encontrado")
-                self.send_response(404)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                self.wfile.write(b'<h1>404 - Historias page not found</h1>')
-                return
-                
-        elif path == '/panel-control/facturacion':
-            # Página de facturación
-            print("✅ Ruta de facturación detectada")
-            facturacion_file = 'panel-control/facturacion.html'
-            if os.path.exists(facturacion_file):
-                print("✅ Archivo de facturación encontrado")
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                with open(facturacion_file, 'rb') as f:
-                    self.wfile.write(f.read())
-                return
-            else:
-                print("❌ Archivo de facturación no encontrado")
-                self.send_response(404)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                self.wfile.write(b'<h1>404 - Facturacion page not found</h1>')
-                return
-                
-        elif path == '/panel-control/inventario':
-            # Página de inventario
-            print("✅ Ruta de inventario detectada")
-            inventario_file = 'panel-control/inventario.html'
-            if os.path.exists(inventario_file):
-                print("✅ Archivo de inventario encontrado")
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                with open(inventario_file, 'rb') as f:
-                    self.wfile.write(f.read())
-                return
-            else:
-                print("❌ Archivo de inventario no encontrado")
-                self.send_response(404)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                self.wfile.write(b'<h1>404 - Inventario page not found</h1>')
-                return
-                
-        elif path == '/panel-control/examenes':
-            # Página de exámenes
-            print("✅ Ruta de exámenes detectada")
-            examenes_file = 'panel-control/examenes.html'
-            if os.path.exists(examenes_file):
-                print("✅ Archivo de exámenes encontrado")
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                with open(examenes_file, 'rb') as f:
-                    self.wfile.write(f.read())
-                return
-            else:
-                print("❌ Archivo de exámenes no encontrado")
-                self.send_response(404)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                self.wfile.write(b'<h1>404 - Examenes page not found</h1>')
-                return
-                
-        elif path == '/panel-control/reportes':
-            # Página de reportes
-            print("✅ Ruta de reportes detectada")
-            reportes_file = 'panel-control/reportes.html'
-            if os.path.exists(reportes_file):
-                print("✅ Archivo de reportes encontrado")
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                with open(reportes_file, 'rb') as f:
-                    self.wfile.write(f.read())
-                return
-            else:
-                print("❌ Archivo de reportes no encontrado")
+        
+        if path in PAGES:
+            self.route = path
+            file_path, label = PAGES[path]
+            if not self.send_asset(file_path):
+                body = f'<h1>404 - {label} page not found</h1>'.encode('utf-8')
                 self.send_response(404)
                 self.send_header('Content-type', 'text/html')
+                self.send_header('Content-Length', str(len(body)))
                 self.end_headers()
-                self.wfile.write(b'<h1>404 - Reportes page not found</h1>')
-                return
-                
-        elif path == '/agenda':
-            # Redirect /agenda to /panel-control/agenda_original
-            print("✅ Redirigiendo /agenda a agenda_original")
-            self.send_response(302)
-            self.send_header('Location', '/panel-control/agenda_original')
-            self.end_headers()
+                self.wfile.write(body)
             return
-            
+        
+        # Recurso precomprimido si está en el manifiesto; si no, servir el archivo normalmente
+        if self.send_asset(unquote(path).lstrip('/')):
+            # Una sola serie para todos los recursos (la ruta completa dispararía la cardinalidad)
+            self.route = 'asset'
+            return
+        return super().do_GET()
+
+    def send_response(self, code, message=None):
+        self.status = code
+        super().send_response(code, message)
+
+    def log_request(self, code='-', size='-'):
+        # Cada petición ya se registra en do_GET con su latencia
+        pass
+
+    def log_message(self, format, *args):
+        metrics.log_event('http_server', logging.WARNING, client=self.client_address[0], message=format % args)
+
+    def send_asset(self, file_path):
+        """Envía un recurso con ETag, Cache-Control y la variante comprimida que acepte el cliente"""
+        asset = load_asset(file_path)
+        if asset is None:
+            return False
+        
+        encoding = asset.choose(self.headers.get('Accept-Encoding'))
+        if asset.matches(self.headers.get('If-None-Match')):
+            self.send_response(304)
+            self.send_asset_headers(asset, encoding)
+            self.end_headers()
+            return True
+        
+        self.send_response(200)
+        self.send_header('Content-type', asset.content_type)
+        self.send_header('Content-Length', str(asset.sizes[encoding]))
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_asset_headers(asset, encoding)
+        self.end_headers()
+        body = asset.bodies.get(encoding)
+        if body is not None:
+            self.wfile.write(body)
         else:
-            # Try to serve the file normally
-            print(f"📁 Intentando servir archivo: {path}")
-            return super().do_GET()
+            # Variante grande: copia directa del archivo al socket (sendfile) sin pasar por Python
+            with open(asset.variants[encoding], 'rb') as f:
+                self.connection.sendfile(f)
+        return True
+
+    def send_asset_headers(self, asset, encoding):
+        self.send_header('ETag', asset.etag(encoding))
+        self.send_header('Cache-Control', asset.cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
 
 def main():
     """Función principal del servidor"""
+    print("🗜️  Precomprimiendo recursos estáticos...")
+    ASSETS.update({path: asset.preload() for path, asset in static_assets.build_all().items()})
+    compressed = sum(1 for asset in ASSETS.values() if len(asset.variants) > 1)
+    print(f"✅ {len(ASSETS)} recursos listos ({compressed} comprimidos en {static_assets.CACHE_DIR}/)")
+    if '--build' in sys.argv:
+        return
+    
     print("🚀 Iniciando servidor frontend para DoctoClique...")
     print(f"🌐 Servidor ejecutándose en http://localhost:{PORT}")
     print("📋 Rutas disponibles:")
@@ -207,11 +192,14 @@ def main():
     print("   /panel-control/examenes - Gestión de exámenes")
     print("   /panel-control/reportes - Reportes y analytics")
     print("   /agenda - Redirige a agenda_original")
+    print("   /metrics - Métricas en formato Prometheus")
     print("\n💡 Asegúrate de que el API server esté ejecutándose en el puerto 5001")
     print("   python3 api_server.py")
     
     try:
-        with socketserver.TCPServer(("", PORT), MyHTTPRequestHandler) as httpd:
+        # Un hilo por conexión: una descarga lenta no bloquea al resto de los puestos
+        with http.server.ThreadingHTTPServer(("", PORT), MyHTTPRequestHandler) as httpd:
+            httpd.daemon_threads = True
             print(f"\n✅ Servidor iniciado exitosamente en puerto {PORT}")
             print("⏹️  Presiona Ctrl+C para detener el servidor")
             httpd.serve_forever()
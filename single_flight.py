@@ -0,0 +1,60 @@
+"""
+Coalescencia de lecturas idénticas concurrentes (single-flight)
+Si llegan a la vez varias peticiones con la misma clave (ruta, query y versiones de las tablas), solo
+la primera ejecuta la consulta y serializa; las demás esperan y reciben el mismo resultado. Como la
+clave incluye las versiones, el resultado compartido es exactamente el que cada una habría calculado
+"""
+
+import threading
+
+import metrics
+
+COALESCED = 'doctoclique_coalesced_requests_total'
+metrics.REGISTRY.counter(COALESCED, 'Peticiones que esperaron el resultado de otra idéntica en curso')
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Cálculos en curso por clave; cada clave se calcula una sola vez a la vez"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, compute, route=''):
+        """Resultado de compute() para la clave, calculado por esta petición o por otra en curso"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.REGISTRY.inc(COALESCED, {'route': route})
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = compute()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            # Quien llegue después de este punto calcula de nuevo (ya no comparte un resultado viejo)
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def __len__(self):
+        return len(self._calls)
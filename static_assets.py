@@ -0,0 +1,214 @@
+"""
+Recursos estáticos precomprimidos para serve_replica.py
+Cada archivo se comprime una sola vez (gzip y, si está instalado, brotli) en .asset-cache/
+y se sirve con ETag fuerte, Cache-Control según si el nombre lleva hash y la variante
+que acepte el navegador
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se ofrece gzip
+    brotli = None
+
+# Directorios y páginas que se procesan
+ASSET_DIRS = ['panel-control/agenda_original_files']
+ASSET_PAGES = ['index.html'] + [
+    f'panel-control/{name}.html'
+    for name in ('agenda_original', 'pacientes', 'historias', 'facturacion',
+                 'inventario', 'examenes', 'reportes')
+] + ['panel-control/batch.js']  # script compartido de los paneles (fetchBatch)
+
+CACHE_DIR = '.asset-cache'
+MANIFEST = os.path.join(CACHE_DIR, 'manifest.json')
+
+# Los archivos más chicos no se comprimen (el ahorro no compensa)
+MIN_COMPRESS_SIZE = 512
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+# Nombres con hash de contenido (vendor.862630a2....js, styles.395a4e194288.css)
+HASHED_NAME = re.compile(r'[.~-][0-9a-f]{8,}\.[A-Za-z0-9]+$')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Las variantes hasta este tamaño se sirven desde memoria; las mayores, con sendfile desde disco
+MEMORY_LIMIT = 256 * 1024
+
+
+def guess_content_type(path, head):
+    """Tipo MIME del archivo; considera los .js.gz guardados sin comprimir y el CSS sin extensión"""
+    name = path
+    if name.endswith('.gz') and not head.startswith(GZIP_MAGIC):
+        # El navegador guardó el contenido ya descomprimido: es el JS original
+        name = name[:-3]
+    content_type, _ = mimetypes.guess_type(name)
+    if content_type is None and not os.path.splitext(name)[1]:
+        stripped = head.lstrip()
+        if stripped.startswith((b'/*', b'@')):
+            content_type = 'text/css'
+        elif stripped.startswith((b'<svg', b'<?xml')):
+            content_type = 'image/svg+xml'
+    content_type = content_type or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type == 'application/javascript':
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+def is_compressible(content_type, size):
+    return size >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class Asset:
+    """Un archivo servible con sus variantes comprimidas"""
+
+    def __init__(self, path, content_type, digest, immutable, variants, mtime):
+        self.path = path
+        self.content_type = content_type
+        self.digest = digest
+        self.immutable = immutable
+        # codificación ('br', 'gzip', 'identity') -> ruta en disco
+        self.variants = variants
+        self.mtime = mtime
+        # codificación -> bytes de las variantes chicas (se completa con preload)
+        self.bodies = {}
+        self.sizes = {}
+
+    def preload(self, limit=MEMORY_LIMIT):
+        """Lee a memoria las variantes que no superan el límite y guarda el tamaño de todas"""
+        for encoding, variant in self.variants.items():
+            size = os.path.getsize(variant)
+            self.sizes[encoding] = size
+            if size <= limit:
+                with open(variant, 'rb') as f:
+                    self.bodies[encoding] = f.read()
+        return self
+
+    def etag(self, encoding):
+        """ETag fuerte de una variante (cada codificación es una representación distinta)"""
+        if encoding == 'identity':
+            return f'"{self.digest}"'
+        return f'"{self.digest}-{encoding}"'
+
+    def matches(self, if_none_match):
+        """True si If-None-Match contiene alguna de las ETags del recurso"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return any(self.etag(encoding) in tags for encoding in self.variants)
+
+    @property
+    def cache_control(self):
+        return IMMUTABLE_CACHE if self.immutable else REVALIDATE_CACHE
+
+    def choose(self, accept_encoding):
+        """Elige la variante según Accept-Encoding: brotli, luego gzip, si no el original"""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accepted.get(encoding, 0) > 0:
+                return encoding
+        return 'identity'
+
+    def to_json(self):
+        return {
+            'content_type': self.content_type, 'digest': self.digest,
+            'immutable': self.immutable, 'variants': self.variants, 'mtime': self.mtime
+        }
+
+
+def parse_accept_encoding(header):
+    """'gzip, br;q=0.8' -> {'gzip': 1.0, 'br': 0.8}"""
+    accepted = {}
+    for part in (header or '').split(','):
+        pieces = part.strip().split(';')
+        if not pieces[0]:
+            continue
+        quality = 1.0
+        for param in pieces[1:]:
+            param = param.strip()
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[pieces[0].strip().lower()] = quality
+    if '*' in accepted:
+        for encoding in ('br', 'gzip'):
+            accepted.setdefault(encoding, accepted['*'])
+    return accepted
+
+
+def _compress(source, target, data, encoding):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if encoding == 'gzip':
+        # mtime=0 para que la salida sea idéntica en cada build
+        payload = gzip.compress(data, compresslevel=9, mtime=0)
+    else:
+        payload = brotli.compress(data, quality=11)
+    if len(payload) >= len(data):
+        return False
+    with open(target, 'wb') as f:
+        f.write(payload)
+    return True
+
+
+def build_asset(path, previous=None):
+    """Calcula hash, tipo y variantes comprimidas de un archivo (reutiliza las vigentes)"""
+    mtime = os.path.getmtime(path)
+    if previous and previous.mtime == mtime and all(os.path.exists(p) for p in previous.variants.values()):
+        return previous
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    content_type = guess_content_type(path, data[:64])
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    variants = {'identity': path}
+    if is_compressible(content_type, len(data)):
+        for encoding, suffix in (('gzip', '.gz'), ('br', '.br')):
+            if encoding == 'br' and brotli is None:
+                continue
+            target = os.path.join(CACHE_DIR, path + suffix)
+            if _compress(path, target, data, encoding):
+                variants[encoding] = target
+    immutable = bool(HASHED_NAME.search(os.path.basename(path)))
+    return Asset(path, content_type, digest, immutable, variants, mtime)
+
+
+def iter_asset_paths():
+    for page in ASSET_PAGES:
+        if os.path.isfile(page):
+            yield page
+    for directory in ASSET_DIRS:
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                yield os.path.join(root, name).replace(os.sep, '/')
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST) as f:
+            raw = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {path: Asset(path, **data) for path, data in raw.items()}
+
+
+def build_all():
+    """Precomprime todos los recursos y guarda el manifiesto; devuelve {ruta: Asset}"""
+    previous = load_manifest()
+    assets = {}
+    for path in iter_asset_paths():
+        assets[path] = build_asset(path, previous.get(path))
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(MANIFEST, 'w') as f:
+        json.dump({path: asset.to_json() for path, asset in assets.items()}, f, indent=1)
+    return assets
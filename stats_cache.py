@@ -0,0 +1,77 @@
+"""
+Estadísticas del dashboard de DoctoClique
+Se leen de los contadores mantenidos por triggers (migración 2) y se guardan en una caché con TTL
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from single_flight import SingleFlight
+
+# Segundos que se sirve la misma lectura antes de volver a consultar los contadores
+STATS_TTL = 5
+
+COUNTERS_SQL = 'SELECT name, value FROM stats_counters'
+TODAY_SQL = "SELECT count FROM stats_appointments_by_date WHERE date = DATE('now')"
+
+
+def read_stats(conn):
+    """Arma la respuesta de /api/stats a partir de las tablas de contadores"""
+    counters = {row[0]: row[1] for row in conn.execute(COUNTERS_SQL)}
+    today = conn.execute(TODAY_SQL).fetchone()
+    return {
+        'patients': {
+            'total': int(counters.get('patients', 0))
+        },
+        'appointments': {
+            'total': int(counters.get('appointments', 0)),
+            'today': today[0] if today else 0
+        },
+        'invoices': {
+            'total': int(counters.get('invoices', 0)),
+            'revenue': round(float(counters.get('revenue', 0)), 2)
+        }
+    }
+
+
+class StatsCache:
+    """Última lectura de estadísticas con su ETag y su vencimiento"""
+
+    def __init__(self, ttl=STATS_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entry = None
+        # Sube con cada invalidate: una lectura empezada antes de una escritura no se comparte después
+        self._generation = 0
+        self._flights = SingleFlight()
+
+    def get(self, conn):
+        """Devuelve (estadísticas, etag), consultando la base solo si venció el TTL"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entry
+            generation = self._generation
+        if entry is not None and entry[2] > now:
+            return entry[0], entry[1]
+
+        # Al vencer el TTL las peticiones simultáneas comparten una sola lectura
+        entry = self._flights.do(generation, lambda: self._refresh(conn, generation), '/api/stats')
+        return entry[0], entry[1]
+
+    def _refresh(self, conn, generation):
+        stats = read_stats(conn)
+        body = json.dumps(stats, sort_keys=True).encode('utf-8')
+        etag = hashlib.sha1(body).hexdigest()
+        entry = (stats, etag, time.monotonic() + self.ttl)
+        with self._lock:
+            if self._generation == generation:
+                self._entry = entry
+        return entry
+
+    def invalidate(self):
+        """Descarta la lectura actual (tras una escritura en este proceso)"""
+        with self._lock:
+            self._entry = None
+            self._generation += 1
@@ -0,0 +1,133 @@
+"""
+Sincronización incremental para réplicas locales de los paneles (/api/sync)
+El registro de cambios es change_events (migración 3): su id es la secuencia, creciente en el orden
+de los commits porque SQLite tiene un solo escritor. Un cliente guarda el último seq recibido y pide
+solo lo posterior: filas nuevas o modificadas (upserts) e ids borrados (tombstones).
+"""
+
+from db_pool import read_snapshot
+from events import EVENT_TABLES
+from query_builder import LIST_RESOURCES, QueryError, build_list_query
+
+# Eventos leídos por respuesta (has_more indica que hay que volver a pedir desde seq)
+DEFAULT_SYNC_LIMIT = 1000
+MAX_SYNC_LIMIT = 5000
+# Ids por consulta al leer el estado actual de las filas
+ROWS_CHUNK = 500
+
+# +table_name: se recorre el rango de ids posterior a since (ya ordenado) y no idx_change_events_table,
+# que con varias tablas obliga a ordenar en memoria
+CHANGES_SQL = '''
+    SELECT id, table_name, operation, row_id
+    FROM change_events
+    WHERE id > ? AND +table_name IN ({placeholders})
+    ORDER BY id
+    LIMIT ?
+'''
+
+
+class HistoryPruned(Exception):
+    """El cliente está más atrás que la retención de change_events: debe recargar todo"""
+
+    def __init__(self, pruned_through):
+        super().__init__(pruned_through)
+        self.pruned_through = pruned_through
+
+
+def parse_tables(value):
+    """'patients,appointments' -> tupla de tablas (todas las del feed si no se indica)"""
+    if not value:
+        return EVENT_TABLES
+    tables = tuple(dict.fromkeys(t.strip() for t in value.split(',') if t.strip()))
+    unknown = [t for t in tables if t not in EVENT_TABLES]
+    if unknown:
+        raise QueryError(f'Tabla desconocida: {unknown[0]}')
+    if not tables:
+        raise QueryError('El parámetro "tables" está vacío')
+    return tables
+
+
+def parse_seq(value, name='since'):
+    """Número de secuencia no negativo; lanza QueryError"""
+    try:
+        seq = int(value)
+    except (TypeError, ValueError):
+        raise QueryError(f'El parámetro "{name}" debe ser un entero') from None
+    if seq < 0:
+        raise QueryError(f'El parámetro "{name}" debe ser mayor o igual a 0')
+    return seq
+
+
+def _parse_limit(value):
+    if value is None:
+        return DEFAULT_SYNC_LIMIT
+    limit = parse_seq(value, 'limit')
+    if limit == 0:
+        raise QueryError('El parámetro "limit" debe ser mayor a 0')
+    return min(limit, MAX_SYNC_LIMIT)
+
+
+def current_seq(conn):
+    """Última secuencia confirmada (punto de partida de un cliente recién cargado)"""
+    return conn.execute('SELECT COALESCE(MAX(id), 0) FROM change_events').fetchone()[0]
+
+
+def pruned_through(conn):
+    """Secuencia más alta que ya borró la retención (events.prune)"""
+    row = conn.execute("SELECT value FROM change_log_state WHERE name = 'pruned_through'").fetchone()
+    return row[0] if row else 0
+
+
+def _current_rows(conn, table, row_ids):
+    """Columnas del listado y filas actuales (como listas) de los ids que aún existen"""
+    resource = LIST_RESOURCES[table]
+    rows = []
+    columns = None
+    for start in range(0, len(row_ids), ROWS_CHUNK):
+        chunk = row_ids[start:start + ROWS_CHUNK]
+        placeholders = ', '.join('?' for _ in chunk)
+        query = build_list_query(table, {}, f'{resource.alias}.id IN ({placeholders})', chunk)
+        columns = query.columns
+        rows.extend(list(row)[:len(columns)] for row in conn.execute(query.sql, query.params).fetchall())
+    return columns, rows
+
+
+def load_changes(conn, since, tables=EVENT_TABLES, limit=None):
+    """
+    Cambios posteriores a since en las tablas pedidas; lanza HistoryPruned si ya no están.
+
+    Varias escrituras sobre la misma fila se resumen en su estado actual: un upsert con la fila
+    completa (mismas columnas que su listado) o su id en deletes si ya no existe.
+    """
+    limit = _parse_limit(limit)
+    # El seq devuelto y las filas salen de la misma instantánea
+    with read_snapshot(conn):
+        horizon = pruned_through(conn)
+        if since < horizon:
+            raise HistoryPruned(horizon)
+
+        sql = CHANGES_SQL.format(placeholders=', '.join('?' for _ in tables))
+        events = conn.execute(sql, (since, *tables, limit + 1)).fetchall()
+        has_more = len(events) > limit
+        events = events[:limit]
+        # Sin más eventos pendientes el cliente queda al día con todas las tablas
+        seq = events[-1][0] if has_more else max(since, current_seq(conn))
+
+        touched = {}
+        for _, table, _, row_id in events:
+            touched.setdefault(table, {})[row_id] = None
+
+        changes = {}
+        for table in tables:
+            if table not in touched:
+                continue
+            row_ids = list(touched[table])
+            columns, rows = _current_rows(conn, table, row_ids)
+            id_index = columns.index('id')
+            present = {row[id_index] for row in rows}
+            changes[table] = {
+                'columns': columns,
+                'upserts': rows,
+                'deletes': sorted(row_id for row_id in row_ids if row_id not in present),
+            }
+        return {'since': since, 'seq': seq, 'has_more': has_more, 'changes': changes}
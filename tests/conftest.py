@@ -0,0 +1,23 @@
+"""Los módulos del API están en la raíz del repositorio; client levanta el API sobre una base temporal"""
+
+import pathlib
+import sys
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Cliente del API sobre una base nueva, sin despachador de reportes"""
+    import api_server
+    import availability
+
+    monkeypatch.setenv('DOCTOCLIQUE_REPORT_RUNNER', '0')
+    monkeypatch.setattr(api_server, 'DATABASE', str(tmp_path / 'agenda.db'))
+    # Las cachés de proceso no deben servir datos de la base de otra prueba
+    monkeypatch.setattr(api_server, 'availability_index', availability.AvailabilityIndex())
+    api_server.response_store.clear()
+    api_server.init_database()
+    return api_server.app.test_client()
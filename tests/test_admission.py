@@ -0,0 +1,124 @@
+"""Pruebas del control de admisión (admission.py)"""
+
+import threading
+import time
+
+import pytest
+
+import admission
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_queue_full_is_rejected_immediately():
+    pool = admission.AdmissionPool('test-full', 1, 1, 2.5)
+    pool.acquire()
+    waiter = threading.Thread(target=lambda: pool.acquire() or pool.release())
+    waiter.start()
+    wait_until(lambda: pool.waiting == 1)
+
+    started = time.monotonic()
+    with pytest.raises(admission.Rejected) as rejected:
+        pool.acquire()
+    assert time.monotonic() - started < 0.5
+    assert rejected.value.reason == 'queue_full'
+    assert rejected.value.retry_after == 3
+
+    pool.release()
+    waiter.join()
+    assert (pool.active, pool.waiting) == (0, 0)
+
+
+def test_wait_past_the_timeout_is_rejected():
+    pool = admission.AdmissionPool('test-timeout', 1, 4, 0.2)
+    pool.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(admission.Rejected) as rejected:
+        pool.acquire()
+    assert time.monotonic() - started >= 0.2
+    assert rejected.value.reason == 'timeout'
+    # Retry-After es al menos 1 segundo
+    assert rejected.value.retry_after == 1
+    assert pool.waiting == 0
+
+    pool.release()
+    assert pool.active == 0
+
+
+def test_no_queue_rejects_when_busy():
+    pool = admission.AdmissionPool('test-export', 1, 0, 5.0)
+    with pool:
+        with pytest.raises(admission.Rejected) as rejected:
+            pool.acquire()
+        assert rejected.value.reason == 'queue_full'
+        assert rejected.value.retry_after == 5
+    assert pool.active == 0
+
+
+def test_waiters_are_admitted_in_order():
+    pool = admission.AdmissionPool('test-fifo', 1, 3, 5.0)
+    pool.acquire()
+    admitted = []
+
+    def wait(name):
+        with pool:
+            admitted.append(name)
+
+    threads = []
+    for name in ('a', 'b', 'c'):
+        thread = threading.Thread(target=wait, args=(name,))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: pool.waiting == len(threads))
+    pool.release()
+    for thread in threads:
+        thread.join()
+    assert admitted == ['a', 'b', 'c']
+
+
+def test_pools_from_environment(monkeypatch):
+    monkeypatch.setenv('DOCTOCLIQUE_ADMISSION_LIST', '4:8:2.5')
+    pools = admission.build_pools()
+    assert set(pools) == set(admission.DEFAULT_POOLS)
+    assert (pools['list'].limit, pools['list'].queue_size, pools['list'].timeout) == (4, 8, 2.5)
+
+
+def test_saturated_class_answers_503_with_retry_after(tmp_path, monkeypatch):
+    import api_server
+
+    monkeypatch.setenv('DOCTOCLIQUE_REPORT_RUNNER', '0')
+    monkeypatch.setattr(api_server, 'DATABASE', str(tmp_path / 'admission.db'))
+    api_server.init_database()
+    client = api_server.app.test_client()
+    pool = api_server.admission_pools['list']
+    monkeypatch.setattr(pool, 'queue_size', 0)
+
+    for _ in range(pool.limit):
+        pool.acquire()
+    try:
+        response = client.get('/api/patients')
+        # Las búsquedas puntuales tienen su propio cupo
+        assert client.get('/api/patients/1').status_code == 404
+    finally:
+        for _ in range(pool.limit):
+            pool.release()
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(admission.Rejected(pool, 'queue_full').retry_after)
+    assert response.get_json()['pool'] == 'list'
+    assert client.get('/api/patients').status_code == 200
+
+
+@pytest.mark.parametrize('value', ['4:8', 'cuatro:8:2.5', '0:8:2.5', '4:-1:2.5', '4:8:0', '4:8:inf'])
+def test_malformed_pool_from_environment_keeps_the_default(monkeypatch, value):
+    monkeypatch.setenv('DOCTOCLIQUE_ADMISSION_LIST', value)
+    pools = admission.build_pools()
+    limit, queue_size, timeout = admission.DEFAULT_POOLS['list']
+    assert (pools['list'].limit, pools['list'].queue_size, pools['list'].timeout) == (limit, queue_size, timeout)
+    with pytest.raises(ValueError):
+        admission.parse_pool_config(value)
@@ -0,0 +1,119 @@
+"""Superposición de citas (409), horas inválidas (400) e índice de disponibilidad"""
+
+from datetime import date, timedelta
+
+import pytest
+
+import api_server
+import availability
+
+DAY = (date.today() + timedelta(days=3)).isoformat()
+
+
+@pytest.fixture
+def agenda(client):
+    assert client.post('/api/patients', json={'name': 'Paciente'}).status_code == 201
+    return client
+
+
+def book(client, time_value, duration=None, status='pending', day=DAY):
+    data = {'patient_id': 1, 'date': day, 'time': time_value, 'type': 'consulta', 'status': status}
+    if duration:
+        data['duration'] = duration
+    return client.post('/api/appointments', json=data)
+
+
+def test_overlapping_appointment_is_rejected(agenda):
+    first = book(agenda, '09:00', 60)
+    assert first.status_code == 201
+
+    conflict = book(agenda, '09:30')
+    assert conflict.status_code == 409
+    assert conflict.get_json()['conflict_id'] == first.get_json()['id']
+    # Termina justo cuando empieza la otra: no se superponen
+    assert book(agenda, '08:30').status_code == 201
+    assert book(agenda, '10:00').status_code == 201
+
+
+def test_cancelled_appointments_do_not_block(agenda):
+    assert book(agenda, '11:00', status='cancelled').status_code == 201
+    assert book(agenda, '11:00').status_code == 201
+    # Y una cancelada puede guardarse encima de otra
+    assert book(agenda, '11:00', status='cancelled').status_code == 201
+
+
+def test_update_checks_against_other_appointments(agenda):
+    first_id = book(agenda, '09:00').get_json()['id']
+    second_id = book(agenda, '10:00').get_json()['id']
+    data = {'patient_id': 1, 'date': DAY, 'type': 'consulta', 'status': 'pending'}
+
+    # Moverse dentro de su propio horario no choca consigo misma
+    assert agenda.put(f'/api/appointments/{first_id}', json=dict(data, time='09:10')).status_code == 200
+    moved = agenda.put(f'/api/appointments/{second_id}', json=dict(data, time='09:20'))
+    assert moved.status_code == 409
+    assert moved.get_json()['conflict_id'] == first_id
+
+
+@pytest.mark.parametrize('time_value', ['9h', '25:00', '09:60', '', None])
+def test_unparseable_time_is_rejected(agenda, time_value):
+    response = book(agenda, time_value)
+    assert response.status_code == 400
+    assert 'HH:MM' in response.get_json()['error']
+
+
+def test_invalid_duration_is_rejected(agenda):
+    assert book(agenda, '09:00', duration='media hora').status_code == 400
+
+
+def test_batch_applies_the_same_rules(agenda):
+    rows = [
+        {'patient_id': 1, 'date': DAY, 'time': '09:00', 'type': 'consulta'},
+        {'patient_id': 1, 'date': DAY, 'time': '09:15', 'type': 'consulta'},
+        {'patient_id': 1, 'date': DAY, 'time': 'mañana', 'type': 'consulta', 'status': 'cancelled'},
+    ]
+    results = agenda.post('/api/appointments/batch', json=rows).get_json()['results']
+    assert 'id' in results[0]
+    assert results[1]['conflict_id'] == results[0]['id']
+    assert 'HH:MM' in results[2]['error']
+
+
+def test_free_slots_follow_new_appointments(agenda):
+    def slots():
+        body = agenda.get(f'/api/appointments/availability?from={DAY}&duration=30&open=09:00&close=11:00').get_json()
+        return body['days'][0]['slots']
+
+    assert slots() == ['09:00', '09:15', '09:30', '09:45', '10:00', '10:15', '10:30']
+    book(agenda, '09:30', 45)
+    # El índice se pone al día con change_events antes de responder
+    assert slots() == ['09:00', '10:15', '10:30']
+
+
+def test_find_conflict_direct(agenda):
+    book(agenda, '14:00', 30)
+    conn = api_server.get_db_connection()
+    try:
+        assert availability.find_conflict(conn, DAY, '14:29', 5) == 1
+        assert availability.find_conflict(conn, DAY, '14:30', 5) is None
+        assert availability.find_conflict(conn, DAY, '14:00', 30, exclude_id=1) is None
+        with pytest.raises(ValueError):
+            availability.find_conflict(conn, DAY, '2 PM', 30)
+    finally:
+        conn.close()
+
+
+def test_index_drops_past_days_and_caps_future_ones(agenda, monkeypatch):
+    monkeypatch.setattr(availability, 'MAX_CACHED_DAYS', 10)
+    index = availability.AvailabilityIndex()
+    conn = api_server.get_db_connection()
+    try:
+        index.rebuild(conn, days=5)
+        past = (date.today() - timedelta(days=20)).isoformat()
+        far = (date.today() + timedelta(days=400)).isoformat()
+        index.busy(conn, past, (date.today() - timedelta(days=15)).isoformat())
+        assert min(index._days) >= date.today().isoformat()
+
+        requested = index.busy(conn, far, (date.today() + timedelta(days=409)).isoformat())
+        # Pasado el tope se descartan los días cargados antes; el rango pedido se conserva entero
+        assert sorted(index._days) == sorted(requested)
+    finally:
+        conn.close()
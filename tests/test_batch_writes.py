@@ -0,0 +1,115 @@
+"""Carga masiva /api/<recurso>/batch: validación por fila, errores parciales (207) y bloques"""
+
+import json
+
+import pytest
+
+import api_server
+import batch_writes
+from db_pool import write_transaction
+
+
+@pytest.fixture(params=['1', '0'], ids=['group-commit', 'transaction'])
+def client(request, client, monkeypatch):
+    # Los bloques pasan por run_write: con el escritor agrupado y con una transacción por petición
+    monkeypatch.setenv('DOCTOCLIQUE_GROUP_COMMIT', request.param)
+    monkeypatch.setattr(batch_writes, 'BATCH_CHUNK_SIZE', 2)
+    return client
+
+
+def post_json(client, resource, rows):
+    return client.post(f'/api/{resource}/batch', data=json.dumps(rows), content_type='application/json')
+
+
+def count(table):
+    conn = api_server.get_db_connection()
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_valid_rows_are_inserted(client):
+    response = post_json(client, 'patients', [{'name': f'Paciente {i}'} for i in range(5)])
+    assert response.status_code == 201
+    body = response.get_json()
+    assert (body['inserted'], body['failed']) == (5, 0)
+    assert [result['index'] for result in body['results']] == [0, 1, 2, 3, 4]
+    assert len({result['id'] for result in body['results']}) == 5
+    assert count('patients') == 5
+
+
+def test_each_failing_row_reports_its_own_error(client):
+    rows = [
+        {'name': 'Ana', 'dni': '1'},
+        {'dni': '2'},                       # falta name
+        {'name': 'Bruno', 'dni': '1'},      # DNI repetido (UNIQUE)
+        {'name': {'first': 'Carla'}},       # objeto en vez de texto
+        {'name': 'Dora', 'dni': 2 ** 64},   # fuera del rango de INTEGER
+        'no es un objeto',
+        {'name': 'Eva'},
+    ]
+    response = post_json(client, 'patients', rows)
+    assert response.status_code == 207
+    results = response.get_json()['results']
+    assert [result['index'] for result in results] == list(range(len(rows)))
+    failed = [result['index'] for result in results if 'error' in result]
+    assert failed == [1, 2, 3, 4, 5]
+    assert 'name' in results[1]['error']
+    assert 'UNIQUE' in results[2]['error']
+    # Las filas válidas del mismo bloque que la repetida se insertaron igual
+    assert count('patients') == 2
+
+
+def test_ndjson_reports_invalid_lines(client):
+    body = '{"name": "Ana"}\n{roto\n\n{"name": "Bruno"}\n'
+    response = client.post('/api/patients/batch', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 207
+    results = response.get_json()['results']
+    assert results[1] == {'index': 1, 'error': 'JSON inválido'}
+    assert [result.get('id') is not None for result in results] == [True, False, True]
+
+
+def test_inventory_rows_go_through_the_ledger(client):
+    response = post_json(client, 'inventory', [
+        {'code': 'GAS-1', 'name': 'Gasas', 'current_stock': 10},
+        {'code': 'GAS-1', 'name': 'Gasas repetidas'},
+    ])
+    assert response.status_code == 207
+    first, second = response.get_json()['results']
+    assert 'id' in first and 'error' in second
+    movements = client.get('/api/inventory/movements').get_json()
+    assert [(m['movement_type'], m['quantity']) for m in movements] == [('entrada', 10)]
+
+
+@pytest.mark.parametrize('resource, body, status', [
+    ('unknown', [], 404),
+    ('patients', {'name': 'sin array'}, 400),
+])
+def test_request_level_errors(client, resource, body, status):
+    assert post_json(client, resource, body).status_code == status
+
+
+def test_json_batch_size_limit(client, monkeypatch):
+    monkeypatch.setattr(batch_writes, 'MAX_JSON_BATCH', 3)
+    assert post_json(client, 'patients', [{'name': 'x'}] * 4).status_code == 413
+    assert count('patients') == 0
+
+
+def test_failed_chunk_does_not_undo_other_writes(client):
+    conn = api_server.get_db_connection()
+    try:
+        def run_write(work):
+            with write_transaction(conn) as transaction:
+                transaction.execute("INSERT INTO patients (name) VALUES ('escritura previa')")
+                return work(transaction)
+
+        spec = batch_writes.WRITE_SPECS['patients']
+        items = [{'name': 'A', 'dni': 'x'}, {'name': 'B', 'dni': 'x'}, {'name': 'C'}]
+        inserted, failed, _ = batch_writes.insert_batch(run_write, spec, items, chunk_size=3)
+        names = [row[0] for row in conn.execute('SELECT name FROM patients ORDER BY id')]
+    finally:
+        conn.close()
+    assert (inserted, failed) == (2, 1)
+    # El SAVEPOINT del bloque deshace solo el executemany, no lo que la transacción traía antes
+    assert names == ['escritura previa', 'A', 'C']
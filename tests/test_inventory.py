@@ -0,0 +1,107 @@
+"""Stock de inventario: cada cambio pasa por un movimiento registrado, nunca queda negativo"""
+
+import threading
+
+import pytest
+
+import api_server
+
+
+@pytest.fixture
+def item(client):
+    response = client.post('/api/inventory', json={'code': 'GUA-1', 'name': 'Guantes', 'current_stock': 10, 'min_stock': 4})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def move(client, item_id, movement_type, quantity):
+    return client.post('/api/inventory/movements', json={
+        'item_id': item_id, 'movement_type': movement_type, 'quantity': quantity
+    })
+
+
+def stock(client, item_id):
+    items = client.get('/api/inventory').get_json()
+    return next(row['current_stock'] for row in items if row['id'] == item_id)
+
+
+def ledger(client, item_id):
+    movements = client.get(f'/api/inventory/movements?item_id={item_id}').get_json()
+    return sorted((m['id'], m['movement_type'], m['quantity'], m['stock_after']) for m in movements)
+
+
+def test_initial_stock_is_recorded_as_an_entry(client, item):
+    assert stock(client, item) == 10
+    assert [row[1:] for row in ledger(client, item)] == [('entrada', 10, 10)]
+
+
+def test_movements_update_stock_and_ledger(client, item):
+    assert move(client, item, 'salida', 3).get_json()['current_stock'] == 7
+    assert move(client, item, 'entrada', 5).get_json()['current_stock'] == 12
+    assert move(client, item, 'ajuste', -2).get_json()['current_stock'] == 10
+    assert stock(client, item) == 10
+    assert [row[1:] for row in ledger(client, item)] == [
+        ('entrada', 10, 10), ('salida', 3, 7), ('entrada', 5, 12), ('ajuste', -2, 10),
+    ]
+
+
+@pytest.mark.parametrize('movement_type, quantity', [('salida', 11), ('ajuste', -11)])
+def test_stock_never_goes_negative(client, item, movement_type, quantity):
+    response = move(client, item, movement_type, quantity)
+    assert response.status_code == 409
+    assert response.get_json()['current_stock'] == 10
+    assert stock(client, item) == 10
+    assert len(ledger(client, item)) == 1
+
+
+@pytest.mark.parametrize('movement_type, quantity, status', [
+    ('salida', 0, 400),
+    ('salida', 1.5, 400),
+    ('ajuste', 0, 400),
+    ('regalo', 1, 400),
+])
+def test_invalid_movements(client, item, movement_type, quantity, status):
+    assert move(client, item, movement_type, quantity).status_code == status
+
+
+def test_unknown_item_answers_404(client):
+    assert move(client, 999, 'entrada', 1).status_code == 404
+
+
+def test_stock_count_in_update_becomes_an_adjustment(client, item):
+    assert client.put(f'/api/inventory/{item}', json={'current_stock': 6}).status_code == 200
+    assert stock(client, item) == 6
+    assert ledger(client, item)[-1][1:] == ('ajuste', -4, 6)
+    # Mismo valor: no se anota nada
+    client.put(f'/api/inventory/{item}', json={'current_stock': 6, 'name': 'Guantes M'})
+    assert len(ledger(client, item)) == 2
+
+
+def test_low_stock_listing(client, item):
+    client.post('/api/inventory', json={'code': 'BAR-1', 'name': 'Barbijos', 'current_stock': 50, 'min_stock': 5})
+    assert client.get('/api/inventory/low-stock').get_json() == []
+    move(client, item, 'salida', 6)
+    assert [row['code'] for row in client.get('/api/inventory/low-stock').get_json()] == ['GUA-1']
+
+
+def test_concurrent_exits_do_not_oversell(client, item):
+    statuses = []
+
+    def take_one():
+        with api_server.app.test_client() as own:
+            statuses.append(move(own, item, 'salida', 1).status_code)
+
+    threads = [threading.Thread(target=take_one) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(statuses) == [201] * 10 + [409] * 6
+    assert stock(client, item) == 0
+    assert [row[3] for row in ledger(client, item)] == [10, 9, 8, 7, 6, 5, 4, 3, 2, 1, 0]
+
+
+def test_delete_removes_the_ledger(client, item):
+    assert client.delete(f'/api/inventory/{item}').status_code == 200
+    assert client.get('/api/inventory/movements').get_json() == []
+    assert client.delete(f'/api/inventory/{item}').status_code == 404
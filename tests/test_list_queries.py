@@ -0,0 +1,90 @@
+"""Listados con paginación por cursor (keyset), proyección de columnas y filtro since"""
+
+import pytest
+
+import api_server
+import query_builder
+
+
+def add_patients(rows):
+    conn = api_server.get_db_connection()
+    conn.executemany('INSERT INTO patients (name, dni, updated_at) VALUES (?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+
+def read_pages(client, path, **params):
+    """Recorre todas las páginas siguiendo next_after; devuelve las filas y la cantidad de páginas"""
+    items, pages, after = [], 0, None
+    while True:
+        query = dict(params, **({'after': after} if after else {}))
+        body = client.get(path, query_string=query).get_json()
+        items += body['items']
+        pages += 1
+        after = body['next_after']
+        if after is None:
+            return items, pages
+
+
+@pytest.fixture
+def patients(client):
+    # Nombres repetidos: el desempate por id es lo que mantiene el cursor estable
+    rows = [(f'Paciente {i % 7}', f'DNI-{i}', f'2025-01-{1 + i % 28:02d} 10:00:00') for i in range(40)]
+    add_patients(rows)
+    return client
+
+
+def test_pages_follow_the_full_listing_order(patients):
+    full = [patient['id'] for patient in patients.get('/api/patients').get_json()]
+    items, pages = read_pages(patients, '/api/patients', limit=6)
+    ids = [item['id'] for item in items]
+    assert ids == full
+    assert len(ids) == len(set(ids)) == 40
+    assert pages == 7
+
+
+def test_last_page_has_no_cursor(patients):
+    body = patients.get('/api/patients?limit=40').get_json()
+    assert len(body['items']) == 40
+    assert body['next_after'] is None
+
+
+def test_fields_projection(patients):
+    body = patients.get('/api/patients?fields=name,id&limit=2').get_json()
+    assert [sorted(item) for item in body['items']] == [['id', 'name'], ['id', 'name']]
+    # El cursor sigue funcionando aunque la clave de orden no esté entre los campos pedidos
+    items, _ = read_pages(patients, '/api/patients', fields='dni', limit=15)
+    assert all(list(item) == ['dni'] for item in items)
+    assert sorted(item['dni'] for item in items) == sorted(f'DNI-{i}' for i in range(40))
+
+
+def test_since_pages_only_return_changed_rows(patients):
+    full = patients.get('/api/patients').get_json()
+    expected = [patient['id'] for patient in full if patient['updated_at'] >= '2025-01-20']
+    items, _ = read_pages(patients, '/api/patients', since='2025-01-20', limit=4)
+    ids = [item['id'] for item in items]
+    assert ids == expected
+    assert 0 < len(ids) < 40
+
+
+@pytest.mark.parametrize('query', [
+    'fields=name,desconocido', 'fields=,', 'limit=0', 'limit=abc', 'after=%%%', 'after=WzFd',
+])
+def test_invalid_parameters_answer_400(patients, query):
+    response = patients.get(f'/api/patients?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_limit_is_capped():
+    query = query_builder.build_list_query('patients', {'limit': '100000'})
+    assert query.limit == query_builder.MAX_PAGE_SIZE
+    # Una fila extra para saber si hay página siguiente
+    assert query.params[-1] == query_builder.MAX_PAGE_SIZE + 1
+
+
+def test_cursor_round_trip():
+    cursor = query_builder.encode_cursor(['Ñandú', 7])
+    assert query_builder.decode_cursor(cursor, 2) == ['Ñandú', 7]
+    with pytest.raises(query_builder.QueryError):
+        query_builder.decode_cursor(cursor, 3)
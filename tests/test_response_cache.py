@@ -0,0 +1,95 @@
+"""Caché de GET: ETag por ruta, query y versión de tablas, 304 y LRU de cuerpos"""
+
+import pytest
+
+import api_server
+import response_cache
+
+
+@pytest.fixture
+def api(client):
+    for name in ('Ana', 'Bruno'):
+        client.post('/api/patients', json={'name': name})
+    return client
+
+
+def test_get_carries_etag_and_revalidation_header(api):
+    response = api.get('/api/patients')
+    assert response.status_code == 200
+    assert response.headers['ETag'].startswith('"')
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+
+def test_if_none_match_answers_304_without_body(api):
+    etag = api.get('/api/patients').headers['ETag']
+    for header in (etag, f'W/{etag}', f'"otra", {etag}', '*'):
+        response = api.get('/api/patients', headers={'If-None-Match': header})
+        assert response.status_code == 304
+        assert response.data == b''
+        assert response.headers['ETag'] == etag
+    assert api.get('/api/patients', headers={'If-None-Match': '"otra"'}).status_code == 200
+
+
+def test_repeated_get_serves_the_stored_body(api):
+    first = api.get('/api/patients?limit=1')
+    assert len(api_server.response_store) == 1
+    second = api.get('/api/patients?limit=1')
+    assert second.data == first.data
+    assert second.headers['ETag'] == first.headers['ETag']
+
+
+def test_writes_change_the_etag_of_tables_they_touch(api):
+    patients = api.get('/api/patients').headers['ETag']
+    suppliers = api.get('/api/inventory/suppliers').headers['ETag']
+
+    api.put('/api/patients/1', json={'name': 'Ana María'})
+    fresh = api.get('/api/patients', headers={'If-None-Match': patients})
+    assert fresh.status_code == 200
+    assert fresh.headers['ETag'] != patients
+    assert 'Ana Mar\\u00eda' in fresh.get_data(as_text=True)
+    # Proveedores no lee pacientes: su ETag sigue valiendo
+    assert api.get('/api/inventory/suppliers', headers={'If-None-Match': suppliers}).status_code == 304
+
+
+def test_writes_from_other_connections_are_seen(api):
+    etag = api.get('/api/patients').headers['ETag']
+    conn = api_server.get_db_connection()
+    try:
+        conn.execute("INSERT INTO patients (name) VALUES ('Carla')")
+        conn.commit()
+    finally:
+        conn.close()
+    response = api.get('/api/patients', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(response.get_json()) == 3
+
+
+def test_etag_depends_on_the_query_not_on_parameter_order(api):
+    def etag(path):
+        return api.get(path).headers['ETag']
+
+    assert etag('/api/patients?limit=1') != etag('/api/patients?limit=2')
+    assert etag('/api/patients?limit=1&fields=id') == etag('/api/patients?fields=id&limit=1')
+    assert etag('/api/patients/1') != etag('/api/patients/2')
+
+
+def test_errors_are_not_stored(api):
+    assert api.get('/api/patients?limit=abc').status_code == 400
+    assert api.get('/api/patients/99').status_code == 404
+    assert len(api_server.response_store) == 0
+
+
+def test_lru_is_bounded_by_entries_and_bytes():
+    store = response_cache.ResponseCache(max_entries=2, max_bytes=10)
+    store.put('a', '"1"', b'aaaa', 'application/json')
+    store.put('b', '"1"', b'bbbb', 'application/json')
+    assert store.get('a', '"1"') is not None
+    store.put('c', '"1"', b'cccc', 'application/json')
+    # Se descarta la menos usada
+    assert store.get('b', '"1"') is None
+    assert store.get('a', '"1"').body == b'aaaa'
+    store.put('d', '"1"', b'dddddddd', 'application/json')
+    assert len(store) == 1
+    # Una ETag vieja no sirve el cuerpo de otra versión
+    assert store.get('d', '"2"') is None
+    assert len(store) == 0
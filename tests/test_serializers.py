@@ -0,0 +1,84 @@
+"""Los dos serializadores (json y orjson) escriben los mismos bytes que el proveedor por defecto de Flask"""
+
+import json
+import math
+
+import pytest
+
+import serializers
+
+COLUMNS = ['name', 'id', 'amount', 'notes', 'active']
+ROWS = [
+    ('José Núñez', 1, 1250.5, None, True),
+    ('Zoë 😀 ünïcode', 2, 1e16, 'línea\nnueva\ttab "comillas" \\ barra', False),
+    ('control \x01 y DEL \x7f', 3, 3.67e-05, ' ', None),
+    ('enteros', 2 ** 63 - 1, -1e-07, '0.00001 y 1e16 dentro de un string', 1),
+    ('grandes', -(2 ** 63), 1.5e300, '', 0.1 + 0.2),
+    ('cero', 0, -0.0, 'ñ', 123456789.125),
+]
+
+BACKENDS = ['json'] + (['orjson'] if serializers.orjson is not None else [])
+
+
+def flask_default(obj):
+    """Lo que escribía DefaultJSONProvider de Flask (sin el salto de línea de response)"""
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), default=serializers.default).encode('ascii')
+
+
+def as_dicts(rows):
+    return [dict(zip(COLUMNS, row)) for row in rows]
+
+
+@pytest.fixture(params=BACKENDS)
+def serializer(request):
+    return serializers.get_serializer(request.param)
+
+
+def test_rows_match_flask_default(serializer):
+    layout = serializers.RowLayout(COLUMNS)
+    assert serializer.encode_rows(layout, ROWS) == flask_default(as_dicts(ROWS))
+    expected_lines = b''.join(flask_default(row) + b'\n' for row in as_dicts(ROWS))
+    assert serializer.encode_lines(layout, ROWS) == expected_lines
+
+
+def test_dumps_matches_flask_default(serializer):
+    obj = {'items': as_dicts(ROWS), 'next_after': 'abc', 'total': 6, 'ratio': 2.5e-05}
+    assert serializer.dumps(obj) == flask_default(obj)
+
+
+@pytest.mark.skipif(serializers.orjson is None, reason='orjson no está instalado')
+def test_backends_write_the_same_bytes():
+    layout = serializers.RowLayout(COLUMNS)
+    stdlib = serializers.get_serializer('json')
+    fast = serializers.get_serializer('orjson')
+    assert fast.encode_rows(layout, ROWS) == stdlib.encode_rows(layout, ROWS)
+    assert fast.encode_lines(layout, ROWS) == stdlib.encode_lines(layout, ROWS)
+    assert fast.dumps(as_dicts(ROWS)) == stdlib.dumps(as_dicts(ROWS))
+    # Floats de todas las magnitudes
+    values = [sign * 10.0 ** exponent * 1.234 for exponent in range(-12, 25) for sign in (1, -1)]
+    assert fast.dumps(values) == stdlib.dumps(values) == flask_default(values)
+
+
+def test_non_finite_floats_are_null(serializer):
+    layout = serializers.RowLayout(['id', 'value'])
+    rows = [(1, math.nan), (2, math.inf), (3, -math.inf)]
+    assert serializer.encode_rows(layout, rows) == b'[{"id":1,"value":null},{"id":2,"value":null},{"id":3,"value":null}]'
+    assert serializer.dumps({'values': [math.nan, 1.5, {'x': math.inf}]}) == b'{"values":[null,1.5,{"x":null}]}'
+
+
+def test_http_response_keeps_trailing_newline(tmp_path, monkeypatch):
+    import api_server
+
+    monkeypatch.setenv('DOCTOCLIQUE_REPORT_RUNNER', '0')
+    monkeypatch.setattr(api_server, 'DATABASE', str(tmp_path / 'serializers.db'))
+    api_server.init_database()
+    client = api_server.app.test_client()
+    assert client.post('/api/patients', json={'name': 'Inés Ñandú', 'dni': '1'}).status_code == 201
+
+    listing = client.get('/api/patients')
+    assert listing.get_data() == flask_default(listing.get_json()) + b'\n'
+    page = client.get('/api/patients?limit=1')
+    assert page.get_data() == flask_default(page.get_json()) + b'\n'
+    detail = client.get('/api/patients/1')
+    assert detail.get_data() == flask_default(detail.get_json()) + b'\n'
+    assert detail.get_data().isascii()
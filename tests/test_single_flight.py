@@ -0,0 +1,95 @@
+"""Pruebas de la coalescencia de lecturas (single_flight.py)"""
+
+import threading
+import time
+
+import pytest
+
+import metrics
+from single_flight import COALESCED, SingleFlight
+
+
+def coalesced(route):
+    return metrics.REGISTRY._series[COALESCED].get((('route', route),), 0)
+
+
+def run_followers(flights, key, count, compute, route):
+    """Lanza count peticiones con la misma clave y espera a que todas estén esperando al líder"""
+    outcomes = []
+
+    def follow():
+        try:
+            outcomes.append(flights.do(key, compute, route))
+        except Exception as error:
+            outcomes.append(error)
+
+    before = coalesced(route)
+    threads = [threading.Thread(target=follow) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while coalesced(route) - before < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return threads, outcomes
+
+
+def test_followers_share_the_leader_result():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 'cuerpo'
+
+    leader = threading.Thread(target=flights.do, args=('k', compute))
+    leader.start()
+    while len(flights) == 0:
+        time.sleep(0.01)
+    threads, outcomes = run_followers(flights, 'k', 4, compute, '/shared')
+    release.set()
+    for thread in [leader, *threads]:
+        thread.join()
+
+    assert calls == [1]
+    assert outcomes == ['cuerpo'] * 4
+    assert len(flights) == 0
+
+
+def test_leader_error_reaches_followers_and_releases_the_key():
+    flights = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        release.wait(5)
+        raise RuntimeError('la consulta falló')
+
+    def lead():
+        try:
+            flights.do('k', failing)
+        except RuntimeError as error:
+            errors.append(error)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    while len(flights) == 0:
+        time.sleep(0.01)
+    threads, outcomes = run_followers(flights, 'k', 3, failing, '/failing')
+    release.set()
+    for thread in [leader, *threads]:
+        thread.join()
+
+    assert len(errors) == 1
+    assert all(outcome is errors[0] for outcome in outcomes)
+    # La clave quedó libre: la próxima petición calcula de nuevo
+    assert len(flights) == 0
+    assert flights.do('k', lambda: 'de nuevo') == 'de nuevo'
+
+
+def test_leader_error_is_raised_to_the_leader():
+    flights = SingleFlight()
+    with pytest.raises(KeyError):
+        flights.do('k', lambda: {}['x'])
+    assert len(flights) == 0
@@ -0,0 +1,103 @@
+"""/api/sync: punto de partida, upserts y tombstones desde un seq, y 410 tras la retención"""
+
+import pytest
+
+import api_server
+import events
+
+
+def sync(client, **params):
+    response = client.get('/api/sync', query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def upserts(changes, table):
+    """Filas de la tabla como diccionarios {columna: valor}"""
+    table_changes = changes['changes'][table]
+    return [dict(zip(table_changes['columns'], row)) for row in table_changes['upserts']]
+
+
+@pytest.fixture
+def start(client):
+    client.post('/api/patients', json={'name': 'Ana'})
+    client.post('/api/patients', json={'name': 'Bruno'})
+    return sync(client)['seq']
+
+
+def test_without_since_only_the_starting_point(client, start):
+    assert start > 0
+    assert sync(client) == {'seq': start}
+
+
+def test_upserts_carry_the_current_row_and_deletes_are_tombstones(client, start):
+    client.put('/api/patients/1', json={'name': 'Ana María'})
+    client.put('/api/patients/1', json={'name': 'Ana María', 'phone': '555'})
+    client.delete('/api/patients/2')
+    created = client.post('/api/patients', json={'name': 'Carla'}).get_json()['id']
+    client.post('/api/patients', json={'name': 'Temporal'})
+    client.delete('/api/patients/4')
+
+    changes = sync(client, since=start)
+    assert changes['since'] == start and changes['has_more'] is False
+    patients = changes['changes']['patients']
+    listed = client.get('/api/patients').get_json()
+    assert sorted(patients['columns']) == sorted(listed[0])
+    # Varias escrituras sobre la misma fila llegan como un solo upsert con su estado actual
+    rows = {row['id']: row for row in upserts(changes, 'patients')}
+    assert sorted(rows) == [1, created]
+    assert (rows[1]['name'], rows[1]['phone']) == ('Ana María', '555')
+    assert patients['deletes'] == [2, 4]
+
+    # Al día: desde el seq devuelto no hay nada más
+    assert sync(client, since=changes['seq'])['changes'] == {}
+
+
+def test_tables_filter(client, start):
+    client.post('/api/appointments', json={'patient_id': 1, 'date': '2030-01-07', 'time': '09:00', 'type': 'control'})
+    client.post('/api/patients', json={'name': 'Dora'})
+    only = sync(client, since=start, tables='appointments')
+    assert list(only['changes']) == ['appointments']
+    # Sin tablas pendientes el seq avanza igual hasta el último cambio
+    assert only['seq'] == sync(client)['seq']
+    assert set(sync(client, since=start)['changes']) == {'appointments', 'patients'}
+
+
+def test_limit_pages_with_has_more(client, start):
+    for i in range(5):
+        client.post('/api/patients', json={'name': f'Paciente {i}'})
+    seen, seq, pages = set(), start, 0
+    while True:
+        changes = sync(client, since=seq, limit=2)
+        seen.update(row['id'] for row in upserts(changes, 'patients'))
+        seq, pages = changes['seq'], pages + 1
+        if not changes['has_more']:
+            break
+    assert seen == {3, 4, 5, 6, 7}
+    assert pages == 3
+
+
+@pytest.mark.parametrize('query', ['since=-1', 'since=x', 'since=0&limit=0', 'since=0&tables=usuarios'])
+def test_invalid_parameters(client, query):
+    response = client.get(f'/api/sync?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_client_behind_retention_gets_410(client, start):
+    client.put('/api/patients/1', json={'name': 'Ana María'})
+    conn = api_server.get_db_connection()
+    try:
+        conn.execute("UPDATE change_events SET created_at = DATETIME('now', '-90 days')")
+        conn.commit()
+        events.prune(conn, days=30)
+        horizon = conn.execute("SELECT value FROM change_log_state WHERE name = 'pruned_through'").fetchone()[0]
+    finally:
+        conn.close()
+    assert horizon >= 1
+
+    gone = client.get('/api/sync?since=0')
+    assert gone.status_code == 410
+    assert gone.get_json()['pruned_through'] == horizon
+    # Quien recargó los listados sigue desde el horizonte sin perder nada
+    assert sync(client, since=horizon)['seq'] == sync(client)['seq']
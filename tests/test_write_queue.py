@@ -0,0 +1,96 @@
+"""Pruebas del escritor con group commit (write_queue.py)"""
+
+import contextvars
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+import write_queue
+from db_pool import connect
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / 'writes.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT NOT NULL UNIQUE)')
+    conn.commit()
+    conn.close()
+    return path
+
+
+def bodies(database):
+    conn = sqlite3.connect(database)
+    try:
+        return sorted(row[0] for row in conn.execute('SELECT body FROM notes'))
+    finally:
+        conn.close()
+
+
+def insert(body):
+    return lambda conn: conn.execute('INSERT INTO notes (body) VALUES (?)', (body,)).lastrowid
+
+
+def test_failed_item_only_rolls_back_its_savepoint(database):
+    writes = write_queue.WriteQueue()
+    conn = connect(database)
+
+    def half_written(conn):
+        # Escribe y después falla: su fila no debe quedar confirmada
+        conn.execute("INSERT INTO notes (body) VALUES ('partial')")
+        raise ValueError('falla a mitad de la escritura')
+
+    batch = [
+        (contextvars.copy_context(), work, Future())
+        for work in (insert('first'), half_written, insert('first'), insert('last'))
+    ]
+    writes._commit(conn, batch, queue.SimpleQueue())
+    conn.close()
+
+    first, failed, duplicate, last = (future for _, _, future in batch)
+    assert isinstance(first.result(), int)
+    assert isinstance(failed.exception(), ValueError)
+    assert isinstance(duplicate.exception(), sqlite3.IntegrityError)
+    assert isinstance(last.result(), int)
+    assert bodies(database) == ['first', 'last']
+
+
+def test_concurrent_submits_commit_all_but_the_failing_one(database):
+    writes = write_queue.WriteQueue(window_ms=200)
+    writes.ensure_running(database)
+    results = []
+
+    def submit(body):
+        try:
+            results.append(writes.submit(insert(body)))
+        except sqlite3.IntegrityError as error:
+            results.append(error)
+
+    try:
+        threads = [threading.Thread(target=submit, args=(f'row-{i}',)) for i in range(8)]
+        threads.append(threading.Thread(target=submit, args=('row-0',)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        writes.stop()
+
+    # Una de las dos 'row-0' choca con UNIQUE; las demás quedan confirmadas
+    assert sum(isinstance(result, sqlite3.IntegrityError) for result in results) == 1
+    assert bodies(database) == sorted(f'row-{i}' for i in range(8))
+
+
+def test_submit_reraises_the_work_error(database):
+    writes = write_queue.WriteQueue()
+    writes.ensure_running(database)
+    try:
+        with pytest.raises(ZeroDivisionError):
+            writes.submit(lambda conn: 1 / 0)
+        assert writes.submit(insert('after')) > 0
+    finally:
+        writes.stop()
+    assert bodies(database) == ['after']
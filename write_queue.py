@@ -0,0 +1,164 @@
+"""
+Escritor único con group commit para el API de DoctoClique
+Los handlers de escritura no abren su propia transacción: envían una función work(conn) a la cola
+y esperan su resultado. Un solo hilo por proceso toma todo lo pendiente, lo ejecuta en una misma
+transacción (cada escritura en su SAVEPOINT, así un error solo deshace la suya) y confirma una vez.
+Con muchas escrituras concurrentes se paga un commit y una toma del lock por lote, no por petición
+"""
+
+import atexit
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+from db_pool import connect
+
+# Espera máxima (ms) por más escrituras antes de confirmar un lote. Con 0 se agrupa solo lo que se
+# encoló mientras se confirmaba el lote anterior y una escritura aislada no espera nada
+COMMIT_WINDOW_ENV = 'DOCTOCLIQUE_COMMIT_WINDOW_MS'
+DEFAULT_COMMIT_WINDOW_MS = 0
+# Escrituras como máximo por transacción (acota lo que tarda un lote)
+MAX_BATCH = 64
+# '0' desactiva el escritor: cada petición confirma su propia transacción
+GROUP_COMMIT_ENV = 'DOCTOCLIQUE_GROUP_COMMIT'
+
+BATCH_SIZE = 'doctoclique_write_batch_size'
+COMMIT_SECONDS = 'doctoclique_write_commit_seconds'
+QUEUE_DEPTH = 'doctoclique_write_queue_depth'
+metrics.REGISTRY.histogram(BATCH_SIZE, 'Escrituras confirmadas por transacción (group commit)',
+                           (1, 2, 4, 8, 16, 32, 64))
+metrics.REGISTRY.histogram(COMMIT_SECONDS, 'Duración de cada lote del escritor (ejecución y COMMIT)')
+metrics.REGISTRY.gauge(QUEUE_DEPTH, 'Escrituras esperando al hilo escritor')
+
+# Marca de fin para el hilo escritor
+_STOP = object()
+
+
+def group_commit_enabled():
+    """False si las escrituras se confirman en la petición (DOCTOCLIQUE_GROUP_COMMIT=0)"""
+    return os.environ.get(GROUP_COMMIT_ENV) != '0'
+
+
+class WriteQueue:
+    """Cola de escrituras de un proceso y el hilo que las confirma por lotes"""
+
+    def __init__(self, window_ms=None, max_batch=MAX_BATCH):
+        if window_ms is None:
+            window_ms = float(os.environ.get(COMMIT_WINDOW_ENV, DEFAULT_COMMIT_WINDOW_MS))
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.database = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+
+    def ensure_running(self, database):
+        """Arranca el hilo escritor en este proceso si no está corriendo (tras un fork se recrea)"""
+        if self._pid == os.getpid() and self.database == database:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self.database == database:
+                return
+            if self._pid == os.getpid():
+                # Cambió la base (scripts y pruebas): el escritor anterior termina lo pendiente
+                self._stop_thread()
+            self.database = database
+            self._pid = os.getpid()
+            self._queue = queue.SimpleQueue()
+            self._thread = threading.Thread(
+                target=self._run, args=(connect(database), self._queue), name='group-commit', daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def submit(self, work):
+        """Ejecuta work(conn) en la transacción del próximo lote; devuelve su resultado o relanza su error"""
+        future = Future()
+        # work corre con el contexto de la petición: su SQL se suma a las métricas de la petición
+        self._queue.put((contextvars.copy_context(), work, future))
+        return future.result()
+
+    def stop(self):
+        """Confirma lo pendiente y termina el hilo escritor"""
+        with self._lock:
+            if self._pid == os.getpid():
+                self._stop_thread()
+                self._pid = None
+
+    def _stop_thread(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self, conn, pending):
+        try:
+            while True:
+                batch, stop = self._collect(pending)
+                if batch:
+                    self._commit(conn, batch, pending)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _collect(self, pending):
+        """Espera la primera escritura y suma las que lleguen hasta llenar el lote o vencer la ventana"""
+        first = pending.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                timeout = deadline - time.monotonic()
+                item = pending.get(timeout=timeout) if timeout > 0 else pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _commit(self, conn, batch, pending):
+        started = time.perf_counter()
+        results = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for context, work, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute('SAVEPOINT write_item')
+                try:
+                    result = context.run(work, conn)
+                except BaseException as error:
+                    # Solo se deshace esta escritura; el resto del lote sigue
+                    conn.execute('ROLLBACK TO write_item')
+                    conn.execute('RELEASE write_item')
+                    results.append((future, None, error))
+                else:
+                    conn.execute('RELEASE write_item')
+                    results.append((future, result, None))
+            conn.commit()
+        except BaseException as error:
+            # Falló el BEGIN o el COMMIT: ninguna escritura del lote quedó confirmada
+            if conn.in_transaction:
+                conn.rollback()
+            for _, _, future in batch:
+                if future.running():
+                    future.set_exception(error)
+            return
+        finally:
+            metrics.REGISTRY.observe(COMMIT_SECONDS, {}, time.perf_counter() - started)
+            metrics.REGISTRY.observe(BATCH_SIZE, {}, len(batch))
+            metrics.REGISTRY.set(QUEUE_DEPTH, {}, pending.qsize())
+
+        # Los handlers despiertan recién cuando su escritura quedó confirmada
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
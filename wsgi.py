@@ -0,0 +1,21 @@
+"""
+Punto de entrada WSGI del API de DoctoClique para producción
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import os
+
+import api_server
+import report_jobs
+
+# Los workers solo encolan reportes: un despachador en cada worker levantaría un pool de procesos por
+# worker. Los calcula `python3 report_jobs.py` (o DOCTOCLIQUE_REPORT_RUNNER=1 para correrlo en el API)
+os.environ.setdefault(report_jobs.RUNNER_ENV, '0')
+
+# La base se puede indicar por entorno (ruta absoluta: no depende del directorio de trabajo)
+api_server.DATABASE = os.environ.get('DOCTOCLIQUE_DATABASE', api_server.DATABASE)
+
+# Con preload_app esto corre una sola vez en el master, antes de crear los workers
+api_server.startup()
+
+app = application = api_server.app